@@ -39,6 +39,7 @@ import time
 
 import appconsts
 import audiomonitoring
+import autosavejournal
 import audiowaveform
 import clipeffectseditor
 import clipmenuaction
@@ -53,6 +54,7 @@ import editorstate
 import editorwindow
 import gui
 import keyevents
+import mediacache
 import medialog
 import mlt
 import mltenv
@@ -286,7 +288,8 @@ def monkeypatch_callbacks():
 
     # Set callback for undo/redo ops, batcherrender app does not need this 
     undo.set_post_undo_redo_callback(editevent.set_post_undo_redo_edit_mode)
-    undo.repaint_tline = updater.repaint_tline
+    undo.repaint_tline = updater.repaint_tline_overlay # edit actions repaint areas they change on undo and redo
+    undo.edit_done_listener = autosavejournal.edit_done
 
     # # Drag'n'drop callbacks
     dnd.add_current_effect = clipeffectseditor.add_currently_selected_effect
@@ -467,6 +470,7 @@ def new_project(profile_index, v_tracks, a_tracks):
 def open_project(new_project):
     stop_autosave()
     audiomonitoring.close_audio_monitor()
+    audiowaveform.cancel_waveform_jobs()
 
     editorstate.project = new_project
 
@@ -491,7 +495,7 @@ def open_project(new_project):
     global loaded_autosave_file
     if loaded_autosave_file != None:
         print "Deleting", loaded_autosave_file
-        os.remove(loaded_autosave_file)
+        autosavejournal.delete_autosave(loaded_autosave_file)
         loaded_autosave_file = None
 
     editorstate.update_current_proxy_paths()
@@ -501,7 +505,21 @@ def open_project(new_project):
     start_autosave()
 
 def change_current_sequence(index):
+    """
+    Returns False if sequence could not be built and current sequence was kept.
+    """
     stop_autosave()
+    try:
+        persistance.build_sequence_mlt(editorstate.project.sequences[index]) # sequences other than current are not built on load
+    except persistance.FileProducerNotFoundError as e:
+        print "did not find file:", e
+        # Current sequence is still displayed and unbuilt sequence is left as it was
+        projectaction.missing_media_info(e.value, gui.editor_window.window)
+        gui.sequence_list_view.fill_data_model()
+        selection = gui.sequence_list_view.treeview.get_selection()
+        selection.select_path(str(editorstate.project.sequences.index(editorstate.current_sequence())))
+        start_autosave()
+        return False
     editorstate.project.c_seq = editorstate.project.sequences[index]
 
     # Inits widgets with current sequence data
@@ -522,6 +540,7 @@ def change_current_sequence(index):
     selected_index = editorstate.project.sequences.index(editorstate.current_sequence())
     selection.select_path(str(selected_index))
     start_autosave()
+    return True
 
 def display_current_sequence():
     # Get shorter alias.
@@ -547,9 +566,10 @@ def autosave_dialog_callback(dialog, response):
     if response == gtk.RESPONSE_OK:
         global loaded_autosave_file
         loaded_autosave_file = autosave_file
+        autosavejournal.replay_journal(autosave_file)
         projectaction.actually_load_project(autosave_file, True)
     else:
-        os.remove(autosave_file)
+        autosavejournal.delete_autosave(autosave_file)
         start_autosave()
 
 def autosaves_many_recovery_dialog():
@@ -574,6 +594,7 @@ def autosaves_many_dialog_callback(dialog, response, autosaves_view, autosaves):
         global loaded_autosave_file
         loaded_autosave_file = autosave_file
         dialog.destroy()
+        autosavejournal.replay_journal(autosave_file)
         projectaction.actually_load_project(autosave_file, True)
     else:
         dialog.destroy()
@@ -588,28 +609,31 @@ def get_instance_autosave_file():
 
 def start_autosave():
     global autosave_timeout_id
-    time_min = 1 # hard coded, probably no need to make configurable
+    time_min, desc = editorpersistance.prefs.AUTO_SAVE_OPTS[editorpersistance.prefs.auto_save_delay_value_index]
+    if time_min == -1:
+        print "Autosave disabled"
+        return
     autosave_delay_millis = time_min * 60 * 1000
 
     print "Autosave started..."
     autosave_timeout_id = gobject.timeout_add(autosave_delay_millis, do_autosave)
     autosave_file = utils.get_hidden_user_dir_path() + get_instance_autosave_file()
-    persistance.save_project(editorstate.PROJECT(), autosave_file)
+    autosavejournal.start(autosave_file) # edits are journaled between snapshots
 
 def get_autosave_files():
     autosave_dir = utils.get_hidden_user_dir_path() + AUTOSAVE_DIR
-    return os.listdir(autosave_dir)
+    return [f for f in os.listdir(autosave_dir) if autosavejournal.is_autosave_file(f)]
 
 def stop_autosave():
     global autosave_timeout_id
+    autosavejournal.stop()
     if autosave_timeout_id == -1:
         return
     gobject.source_remove(autosave_timeout_id)
     autosave_timeout_id = -1
 
 def do_autosave():
-    autosave_file = utils.get_hidden_user_dir_path() + get_instance_autosave_file()
-    persistance.save_project(editorstate.PROJECT(), autosave_file)
+    autosavejournal.write_snapshot()
     return True
 
 # ------------------------------------------------- splash screen
@@ -752,6 +776,8 @@ def _shutdown_dialog_callback(dialog, response_id):
     editorpersistance.prefs.mm_paned_position = gui.editor_window.mm_paned.get_position()
     editorpersistance.save()
 
+    mediacache.save()
+
     # Block reconnecting consumer before setting window not visible
     updater.player_refresh_enabled = False
     gui.editor_window.window.set_visible(False)
@@ -765,13 +791,14 @@ def _app_destroy():
     editorstate.player.shutdown() # has ticker thread and player threads running
     audiomonitoring.close()
     # Wait threads to stop
+    audiowaveform.cancel_waveform_jobs()
     while((editorstate.player.ticker.exited == False) and
          (audiomonitoring._update_ticker.exited == False) and
-         (audiowaveform.waveform_thread != None)):
+         (audiowaveform.waveform_queue.is_running())):
         pass
     # Delete autosave file
     try:
-        os.remove(utils.get_hidden_user_dir_path() + get_instance_autosave_file())
+        autosavejournal.delete_autosave(utils.get_hidden_user_dir_path() + get_instance_autosave_file())
     except:
         print "Delete autosave file FAILED"
 
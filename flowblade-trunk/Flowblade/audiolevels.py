@@ -0,0 +1,228 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module computes per frame audio levels for media files from raw PCM samples.
+
+Audio is rendered sequentially with video decoding turned off by an avformat consumer
+writing 16-bit PCM into a named pipe. Samples are read from the pipe in large blocks and
+peak and RMS levels are computed for every channel of every frame.
+
+Levels are given in the same IEC scale used by MLT "audiolevel" filter so that
+they can be displayed in place of levels from it.
+"""
+
+import array
+import audioop
+import fcntl
+import math
+import mlt
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import producerpool
+
+FREQUENCY = 48000
+CHANNELS = 2
+SAMPLE_WIDTH = 2 # bytes, 16-bit samples
+MAX_SAMPLE_VALUE = 32768.0
+
+READ_BLOCK_FRAMES = 250 # number of frames of audio read from pipe at a time
+PIPE_OPEN_WAIT = 0.05
+
+
+def iec_scale(db):
+    """
+    Maps dB value to 0.0 - 1.0 display range like MLT "audiolevel" filter.
+    """
+    if db < -70.0:
+        return 0.0
+    elif db < -60.0:
+        return (db + 70.0) * 0.0025
+    elif db < -50.0:
+        return (db + 60.0) * 0.005 + 0.025
+    elif db < -40.0:
+        return (db + 50.0) * 0.0075 + 0.075
+    elif db < -30.0:
+        return (db + 40.0) * 0.015 + 0.15
+    elif db < -20.0:
+        return (db + 30.0) * 0.02 + 0.3
+    elif db < -0.001 or db > 0.001:
+        return (db + 20.0) * 0.025 + 0.5
+    return 1.0
+
+def amplitude_level(amplitude):
+    """
+    Returns IEC scaled level for sample amplitude in range 0.0 - 1.0.
+    """
+    if amplitude <= 0.0:
+        return 0.0
+    level = iec_scale(20.0 * math.log10(amplitude))
+    if level > 1.0:
+        level = 1.0
+    return level
+
+def compute_frame_levels(pcm_data, channels):
+    """
+    Returns list of (peak, rms) tuples for every channel in interleaved 16-bit PCM data.
+    """
+    samples = array.array("h")
+    samples.fromstring(pcm_data)
+    if sys.byteorder == "big": # pipe data is little-endian
+        samples.byteswap()
+
+    levels = []
+    for c in range(0, channels):
+        channel_data = samples[c::channels].tostring()
+        if len(channel_data) == 0:
+            levels.append((0.0, 0.0))
+            continue
+        peak = audioop.max(channel_data, SAMPLE_WIDTH) / MAX_SAMPLE_VALUE
+        rms = audioop.rms(channel_data, SAMPLE_WIDTH) / MAX_SAMPLE_VALUE
+        levels.append((amplitude_level(peak), amplitude_level(rms)))
+    return levels
+
+
+class AudioLevelsExtractor:
+    """
+    Computes per frame peak and RMS levels for all channels of a media file.
+    """
+    def __init__(self, profile, clip, frame_count, channels=CHANNELS):
+        self.profile = profile
+        media_producer = producerpool.get_media_producer(clip)
+        self.service = media_producer.get("mlt_service")
+        self.resource = media_producer.get("resource")
+        self.frame_count = frame_count
+        self.channels = channels
+        self.frames_done = 0
+        self.aborted = False
+        self.consumer = None
+
+    def get_fraction(self):
+        if self.frame_count < 1:
+            return 1.0
+        return float(self.frames_done) / float(self.frame_count)
+
+    def abort(self):
+        self.aborted = True
+
+    def extract(self, progress_callback=None):
+        """
+        Returns list of channels with a list of (peak, rms) tuples for each frame,
+        or None if extraction was aborted.
+
+        progress_callback(fraction) is called after each block of audio read.
+        """
+        channel_levels = [[] for c in range(0, self.channels)]
+
+        pipe_dir = tempfile.mkdtemp(prefix="flowblade_levels")
+        pipe_path = pipe_dir + "/pcm"
+        os.mkfifo(pipe_path)
+
+        # Open read end without blocking so that open returns before writer connects,
+        # then switch to blocking reads.
+        fd = os.open(pipe_path, os.O_RDONLY | os.O_NONBLOCK)
+        flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+        fcntl.fcntl(fd, fcntl.F_SETFL, flags & ~os.O_NONBLOCK)
+
+        try:
+            producer = self._get_audio_producer()
+            self.consumer = self._get_pcm_consumer(pipe_path)
+            self.consumer.connect(producer)
+            producer.set_speed(1)
+            self.consumer.start()
+
+            self._read_levels(fd, channel_levels, progress_callback)
+        finally:
+            # Close read end first so that consumer blocked on a full pipe can exit.
+            os.close(fd)
+            if self.consumer != None:
+                self.consumer.stop()
+            shutil.rmtree(pipe_dir, True)
+
+        if self.aborted:
+            return None
+
+        # Media may report more frames than it has audio for
+        for levels in channel_levels:
+            levels.extend([(0.0, 0.0)] * (self.frame_count - len(levels)))
+        return channel_levels
+
+    def _read_levels(self, fd, channel_levels, progress_callback):
+        frame_bytes = SAMPLE_WIDTH * self.channels
+        fps_num = self.profile.frame_rate_num()
+        fps_den = self.profile.frame_rate_den()
+        read_size = READ_BLOCK_FRAMES * (FREQUENCY * fps_den / fps_num + 1) * frame_bytes
+
+        buf = ""
+        got_data = False
+        frame = 0
+        frame_start_sample = 0
+        while frame < self.frame_count and not self.aborted:
+            data = os.read(fd, read_size)
+            if len(data) == 0:
+                # Reads return nothing both before writer has opened pipe and after it has closed it
+                if got_data or self.consumer.is_stopped():
+                    break
+                time.sleep(PIPE_OPEN_WAIT)
+                continue
+            got_data = True
+            buf = buf + data
+
+            # Compute levels for all complete frames in buffer
+            consumed = 0
+            while frame < self.frame_count:
+                frame_end_sample = (frame + 1) * FREQUENCY * fps_den / fps_num
+                frame_size = (frame_end_sample - frame_start_sample) * frame_bytes
+                if len(buf) - consumed < frame_size:
+                    break
+                levels = compute_frame_levels(buf[consumed:consumed + frame_size], self.channels)
+                for c in range(0, self.channels):
+                    channel_levels[c].append(levels[c])
+                consumed += frame_size
+                frame_start_sample = frame_end_sample
+                frame += 1
+            buf = buf[consumed:]
+            self.frames_done = frame
+            if progress_callback != None:
+                progress_callback(self.get_fraction())
+
+    def _get_audio_producer(self):
+        service = self.service
+        if service.startswith("xml"):
+            service = "xml-nogl"
+        producer = mlt.Producer(self.profile, service.encode('utf-8'), self.resource)
+        producer.set("video_index", -1) # no video decoding
+        producer.set_in_and_out(0, self.frame_count - 1)
+        return producer
+
+    def _get_pcm_consumer(self, pipe_path):
+        consumer = mlt.Consumer(self.profile, "avformat", str(pipe_path))
+        consumer.set("real_time", -1)
+        consumer.set("terminate_on_pause", 1)
+        consumer.set("vn", 1)
+        consumer.set("f", "s16le")
+        consumer.set("acodec", "pcm_s16le")
+        consumer.set("ar", FREQUENCY)
+        consumer.set("ac", self.channels)
+        return consumer
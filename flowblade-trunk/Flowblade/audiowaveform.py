@@ -20,75 +20,89 @@
 
 """
 Modules handles creating and caching audio waveform images for clips.
+
+Audio levels are created in background by a prioritized job queue with several
+worker threads. Clips visible in timeline are processed first and waveforms are
+displayed as soon as levels for their media have been created.
 """
 
 import pygtk
 pygtk.require('2.0');
 import gtk
 
-import math
+import heapq
 import md5
-import mlt
+import multiprocessing
 import os
 import pickle
-import struct
 import threading
-import time
 
 import appconsts
-import dialogutils
+import audiolevels
+from editorstate import current_sequence
 from editorstate import PROJECT
-import gui
-import guiutils
+import tlinewidgets
 import updater
 import utils
+import waveformpyramid
 
 # Frame level value cache for audio levels
-# path -> list of frame levels
+# path -> waveformpyramid.WaveformPyramid
 frames_cache = {}
 
-waveform_thread = None
+PYRAMID_FILE_EXTENSION = ".wfp"
+
+try:
+    WORKERS_COUNT = max(1, min(multiprocessing.cpu_count() - 1, 4))
+except NotImplementedError:
+    WORKERS_COUNT = 2
+
+# Job priorities, lower values are processed first.
+# Priority of clips outside view is VIEW_PRIORITY + distance to view in frames.
+USER_PRIORITY = -1
+VIEW_PRIORITY = 0
 
-LEFT_CHANNEL = "_audio_level.0"
-RIGHT_CHANNEL = "_audio_level.1"
+waveform_queue = None # WaveformQueue, created at end of module
 
 # ------------------------------------------------- waveforms
 def set_waveform_displayer_clip_from_popup(data):
     clip, track, item_id, item_data = data
-
-    global frames_cache
-    if clip.path in frames_cache:
-        frame_levels = frames_cache[clip.path]
-        clip.waveform_data = frame_levels
+    if _set_waveform_from_cache(clip):
+        updater.repaint_tline()
         return
 
-    cache_file_path = utils.get_hidden_user_dir_path() + appconsts.AUDIO_LEVELS_DIR + _get_unique_name_for_media(clip.path)
-    if os.path.isfile(cache_file_path):
-        f = open(cache_file_path)
-        frame_levels = pickle.load(f)
-        frames_cache[clip.path] = frame_levels
-        clip.waveform_data = frame_levels
-        return
+    waveform_queue.add_clip(clip, USER_PRIORITY)
+
+def display_sequence_waveforms():
+    """
+    Creates audio levels for all clips with audio in current sequence in background,
+    clips in timeline view first.
+    """
+    view_start = tlinewidgets.pos
+    x, y, w, h = tlinewidgets.canvas_widget.widget.allocation
+    view_end = view_start + w / tlinewidgets.pix_per_frame
+
+    seq = current_sequence()
+    for i in range(1, len(seq.tracks) - 1): # black and hidden tracks are ignored
+        clip_start = 0
+        for clip in seq.tracks[i].clips:
+            clip_length = clip.clip_out - clip.clip_in + 1 # +1 because in and out both inclusive
+            clip_end = clip_start + clip_length
+            if _clip_has_audio(clip) and clip.waveform_data == None:
+                if not _set_waveform_from_cache(clip):
+                    if clip_end < view_start:
+                        priority = VIEW_PRIORITY + (view_start - clip_end)
+                    elif clip_start > view_end:
+                        priority = VIEW_PRIORITY + (clip_start - view_end)
+                    else:
+                        priority = VIEW_PRIORITY
+                    waveform_queue.add_clip(clip, priority)
+            clip_start = clip_end
 
-    progress_bar = gtk.ProgressBar()
-    title = _("Audio Levels Data Render")
-    text = "<b>Media File: </b>" + clip.path
-    dialog = _waveform_render_progress_dialog(_waveform_render_abort, title, text, progress_bar, gui.editor_window.window)
-    dialog.progress_bar = progress_bar
-    
-    global waveform_thread
-    waveform_thread = WaveformCreator(clip, track.height, dialog)
-    waveform_thread.start()
-
-def _waveform_render_abort(dialog, response_id):
-    if waveform_thread != None:
-        waveform_thread.abort_rendering()
-        
-def _waveform_render_stop(dialog, response_id):
-    global waveform_thread
-    waveform_thread = None
-    
-    dialogutils.delay_destroy_window(dialog, 1.6)
+    updater.repaint_tline()
+
+def cancel_waveform_jobs():
+    waveform_queue.cancel_all()
 
 def clear_waveform(data):
     # LOOK TO REMOVE; DOES NOT SEEMS CURRENT
@@ -97,127 +111,198 @@ def clear_waveform(data):
     clip.waveform_data_frame_height = -1
     updater.repaint_tline()
 
+def _clip_has_audio(clip):
+    if clip.is_blanck_clip:
+        return False
+    return (clip.media_type == appconsts.VIDEO or clip.media_type == appconsts.AUDIO)
+
+def _set_waveform_from_cache(clip):
+    """
+    Sets clip waveform from memory or disk cache and returns True if levels have been created.
+    """
+    global frames_cache
+    if clip.path in frames_cache:
+        clip.waveform_data = frames_cache[clip.path]
+        return True
+
+    pyramid = _load_cached_pyramid(clip.path)
+    if pyramid != None:
+        frames_cache[clip.path] = pyramid
+        clip.waveform_data = pyramid
+        return True
+    
+    return False
+
+def _levels_done(path, pyramid):
+    # Called from worker threads
+    global frames_cache
+    frames_cache[path] = pyramid
+
+    gtk.gdk.threads_enter()
+    try:
+        seq = current_sequence()
+        for i in range(1, len(seq.tracks) - 1):
+            for clip in seq.tracks[i].clips:
+                if clip.is_blanck_clip == False and clip.path == path:
+                    clip.waveform_data = pyramid
+        updater.repaint_tline()
+    finally:
+        gtk.gdk.threads_leave()
+
 def _get_unique_name_for_media(media_file_path):
     size_str = str(os.path.getsize(media_file_path))
     file_name = md5.new(media_file_path + size_str).hexdigest()
     return file_name
 
+def _get_pyramid_file_path(media_file_path):
+    return _get_levels_file_path(media_file_path) + PYRAMID_FILE_EXTENSION
+
+def _get_levels_file_path(media_file_path):
+    # Levels files of older versions were saved as pickled lists with this path.
+    return utils.get_hidden_user_dir_path() + appconsts.AUDIO_LEVELS_DIR + _get_unique_name_for_media(media_file_path)
+
+def _load_cached_pyramid(media_file_path):
+    """
+    Returns pyramid for media file from disk cache or None if levels have not been created.
+    """
+    pyramid_file_path = _get_pyramid_file_path(media_file_path)
+    if not os.path.isfile(pyramid_file_path):
+        # Convert levels file of older version if found
+        levels_file_path = _get_levels_file_path(media_file_path)
+        if not os.path.isfile(levels_file_path):
+            return None
+        f = open(levels_file_path)
+        frame_levels = pickle.load(f)
+        f.close()
+        waveformpyramid.write_pyramid(pyramid_file_path, [frame_levels])
+        os.remove(levels_file_path)
 
-class WaveformCreator(threading.Thread):    
-    def __init__(self, clip, track_height, dialog):
-        threading.Thread.__init__(self)
-        self.clip = clip
-        self.temp_clip = self._get_temp_producer(clip)
-        self.file_cache_path = utils.get_hidden_user_dir_path() + appconsts.AUDIO_LEVELS_DIR + _get_unique_name_for_media(clip.path)
-        self.track_height = track_height
-        self.abort = False
-        self.clip_media_length = PROJECT().get_media_file_for_path(self.clip.path).length
-        self.last_rendered_frame = 0
-        self.stopped = False
-        self.dialog = dialog
-        
-    def run(self):
-        global frames_cache
-        frame_levels = [None] * self.clip_media_length 
-        frames_cache[self.clip.path] = frame_levels
-
-        gtk.gdk.threads_enter()
-        self.dialog.progress_bar.set_fraction(0.0)
-        self.dialog.progress_bar.set_text(str(0) + "%")
-        while(gtk.events_pending()):
-            gtk.main_iteration()
-        gtk.gdk.threads_leave()
-        time.sleep(0.2)
+    try:
+        return waveformpyramid.WaveformPyramid(pyramid_file_path)
+    except waveformpyramid.PyramidFormatError:
+        return None
 
-        for frame in range(0, len(frame_levels)):
-            if self.abort:
-                break
-            self.temp_clip.seek(frame)
-            mlt.frame_get_waveform(self.temp_clip.get_frame(), 10, 50)
-            val = self.levels.get(RIGHT_CHANNEL)
-            if val == None:
-                val = 0.0
-            frame_levels[frame] = float(val)
-            self.last_rendered_frame = frame
-            if frame % 500 == 0:
-                render_fraction = float(self.last_rendered_frame) / float(self.clip_media_length)
-                gtk.gdk.threads_enter()
-                self.dialog.progress_bar.set_fraction(render_fraction)
-                pros = int(render_fraction * 100)
-                self.dialog.progress_bar.set_text(str(pros) + "%")
-                while(gtk.events_pending()):
-                    gtk.main_iteration()
-                gtk.gdk.threads_leave()
-                time.sleep(0.1)
-
-        if not self.abort:
-            self.clip.waveform_data = frame_levels
-            write_file = file(self.file_cache_path, "wb")
-            pickle.dump(frame_levels, write_file)
-
-            gtk.gdk.threads_enter()
-            self.dialog.progress_bar.set_fraction(1.0)
-            self.dialog.progress_bar.set_text(_("Saving to Hard Drive"))
-            gtk.gdk.threads_leave()
-        
-        else:
-            frames_cache.pop(self.clip.path, None)
 
-        updater.repaint_tline()
 
-        # Set thread ref to None to flag that no waveforms are being created
-        global waveform_thread
-        waveform_thread = None
-        
-        _waveform_render_stop(self.dialog, None)
-
-    def _get_temp_producer(self, clip):
-        service = clip.get("mlt_service")
-        if service.startswith("xml"):
-            service = "xml-nogl"
-        temp_producer = mlt.Producer(PROJECT().profile, service.encode('utf-8'), clip.get("resource"))
-        channels = mlt.Filter(PROJECT().profile, "audiochannels")
-        converter = mlt.Filter(PROJECT().profile, "audioconvert")
-        self.levels = mlt.Filter(PROJECT().profile, "audiolevel")
-        temp_producer.attach(channels)
-        temp_producer.attach(converter)
-        temp_producer.attach(self.levels)
-        temp_producer.path = clip.path
-        return temp_producer
-
-    def abort_rendering(self):
-        self.abort = True
-
-def _waveform_render_progress_dialog(callback, title, text, progress_bar, parent_window):
-    dialog = gtk.Dialog(title,
-                         parent_window,
-                         gtk.DIALOG_MODAL | gtk.DIALOG_DESTROY_WITH_PARENT,
-                         (_("Cancel").encode('utf-8'), gtk.RESPONSE_REJECT))
-
-    dialog.text_label = gtk.Label(text)
-    dialog.text_label.set_use_markup(True)
-    text_box = gtk.HBox(False, 2)
-    text_box.pack_start(dialog.text_label,False, False, 0)
-    text_box.pack_start(gtk.Label(), True, True, 0)
-
-    status_box = gtk.HBox(False, 2)
-    status_box.pack_start(text_box, False, False, 0)
-    status_box.pack_start(gtk.Label(), True, True, 0)
-
-    progress_vbox = gtk.VBox(False, 2)
-    progress_vbox.pack_start(status_box, False, False, 0)
-    progress_vbox.pack_start(guiutils.get_pad_label(10, 10), False, False, 0)
-    progress_vbox.pack_start(progress_bar, False, False, 0)
-
-    alignment = gtk.Alignment(0.5, 0.5, 1.0, 1.0)
-    alignment.set_padding(12, 12, 12, 12)
-    alignment.add(progress_vbox)
-
-    dialog.vbox.pack_start(alignment, True, True, 0)
-    dialog.set_default_size(500, 125)
-    alignment.show_all()
-    dialog.set_has_separator(False)
-    dialog.connect('response', callback)
-    dialog.show()
-    return dialog
+# ------------------------------------------------- background jobs
+class LevelsJob:
+    def __init__(self, clip, priority):
+        self.path = clip.path
+        self.clip = clip
+        self.priority = priority
+        self.extractor = None
+        self.cancelled = False
+
+
+class WaveformQueue:
+    """
+    Priority queue of audio level jobs, one job per media file.
+    Worker threads are started when jobs are added and exit when queue is empty.
+    """
+    def __init__(self, workers_count):
+        self.workers_count = workers_count
+        self.lock = threading.Lock()
+        self.heap = []
+        self.jobs = {} # path -> LevelsJob, waiting and running jobs
+        self.order = 0 # keeps jobs with same priority in insertion order
+        self.workers = []
+
+    def add_clip(self, clip, priority):
+        self.lock.acquire()
+        job = self.jobs.get(clip.path)
+        if job == None:
+            job = LevelsJob(clip, priority)
+            self.jobs[clip.path] = job
+            self._push(job)
+        elif job.extractor == None and priority < job.priority:
+            # Old heap entry is skipped when popped because its priority no longer matches
+            job.priority = priority
+            self._push(job)
+        self._start_workers()
+        self.lock.release()
+
+    def cancel_all(self):
+        self.lock.acquire()
+        for job in self.jobs.values():
+            job.cancelled = True
+            if job.extractor != None:
+                job.extractor.abort()
+        self.jobs = {}
+        self.heap = []
+        self.lock.release()
+
+    def is_running(self):
+        self.lock.acquire()
+        running = len([w for w in self.workers if w.isAlive()]) > 0
+        self.lock.release()
+        return running
+
+    def get_next_job(self):
+        """
+        Returns next job to process or None if queue is empty. Called from worker threads.
+        """
+        self.lock.acquire()
+        job = None
+        try:
+            while len(self.heap) > 0:
+                priority, order, candidate = heapq.heappop(self.heap)
+                if candidate.cancelled or candidate.extractor != None or priority != candidate.priority:
+                    continue
+                media_file = PROJECT().get_media_file_for_path(candidate.path)
+                if media_file == None:
+                    self.jobs.pop(candidate.path, None)
+                    continue
+                try:
+                    candidate.extractor = audiolevels.AudioLevelsExtractor(PROJECT().profile, candidate.clip, media_file.length)
+                except Exception as e:
+                    print "audio levels extractor could not be created for " + candidate.path + ":", e
+                    self.jobs.pop(candidate.path, None)
+                    continue
+                job = candidate
+                break
+        finally:
+            if job == None:
+                self.workers.remove(threading.currentThread())
+            self.lock.release()
+        return job
+
+    def job_done(self, job):
+        self.lock.acquire()
+        if self.jobs.get(job.path) == job:
+            self.jobs.pop(job.path)
+        self.lock.release()
+
+    def _push(self, job):
+        heapq.heappush(self.heap, (job.priority, self.order, job))
+        self.order += 1
+
+    def _start_workers(self):
+        while len(self.workers) < self.workers_count and len(self.workers) < len(self.jobs):
+            worker = WaveformWorker(self)
+            self.workers.append(worker)
+            worker.start()
+
+
+class WaveformWorker(threading.Thread):
+    def __init__(self, queue):
+        threading.Thread.__init__(self)
+        self.queue = queue
 
+    def run(self):
+        job = self.queue.get_next_job()
+        while job != None:
+            try:
+                channel_levels = job.extractor.extract()
+                if channel_levels != None and not job.cancelled:
+                    file_path = _get_pyramid_file_path(job.path)
+                    waveformpyramid.write_pyramid(file_path, channel_levels)
+                    _levels_done(job.path, waveformpyramid.WaveformPyramid(file_path))
+            except Exception as e:
+                # Failed file is not retried until it is added again, other jobs continue
+                print "audio levels extraction failed for " + job.path + ":", e
+            finally:
+                self.queue.job_done(job)
+            job = self.queue.get_next_job()
+
+
+waveform_queue = WaveformQueue(WORKERS_COUNT)
@@ -0,0 +1,255 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module handles writing autosave files and recovering projects from them.
+
+Autosave is a full project snapshot file and a journal file next to it. Every
+done, undone or redone edit appends pickleable copies of the tracks it changed
+to journal, or the whole sequence if edit changed more than clips on tracks.
+Snapshot is rewritten from current project and journal emptied at autosave interval
+and when journal grows too large.
+
+Pickleable copies share bins, media log and clip attribute objects with the project,
+so they are pickled in GTK thread before the project can change. Sequences other than
+current one can't be edited, so their pickled data is kept from previous snapshot and
+only current sequence is pickled again. All file writing is done in a writer thread
+in the order jobs were added.
+
+Crash recovery replaces tracks and sequences in snapshot with journaled ones
+and writes result as the autosave file that is then loaded as a normal project.
+"""
+
+import os
+import pickle
+import Queue
+import threading
+
+import editorstate
+import persistance
+import projectfile
+
+JOURNAL_EXTENSION = ".journal"
+TEMP_EXTENSION = projectfile.TEMP_EXTENSION
+
+MAX_JOURNAL_ENTRIES = 100 # snapshot is rewritten after this many journaled edits
+MAX_JOURNAL_BYTES = 16 * 1024 * 1024 # or when journal grows larger than this
+
+_autosave_path = None # None when autosave is not running
+_entries_count = 0
+_journal_bytes = 0
+_pickled_sequences = {} # id(sequence) -> (sequence, projectfile.PickledSection) from previous snapshot
+_pickled_proxy_mode = None
+_writer = None
+
+
+# --------------------------------------------------- journal entries
+class JournalEntry:
+    """
+    State of edited sequence or tracks after an edit.
+    """
+    def __init__(self, seq_index):
+        self.seq_index = seq_index
+        self.tracks = None # track index -> pickleable track
+        self.sequence = None # pickleable sequence if edit did not change only known tracks
+
+    def apply(self, project):
+        if self.sequence != None:
+            project.sequences[self.seq_index] = self.sequence
+        else:
+            seq = project.sequences[self.seq_index]
+            for track_index, track in self.tracks.iteritems():
+                seq.tracks[track_index] = track
+
+
+# --------------------------------------------------- autosaving
+def start(autosave_path):
+    """
+    Starts autosaving into given path by writing a snapshot of current project.
+    """
+    global _autosave_path, _pickled_sequences
+    _autosave_path = autosave_path
+    # Project or current sequence has changed, all sequences are pickled again
+    _pickled_sequences = {}
+    write_snapshot()
+
+def stop():
+    global _autosave_path, _pickled_sequences
+    _autosave_path = None
+    _pickled_sequences = {}
+
+def write_snapshot():
+    global _entries_count, _journal_bytes, _pickled_sequences, _pickled_proxy_mode
+    if _autosave_path == None:
+        return
+
+    project = editorstate.PROJECT()
+
+    # Pickled data of sequences other than current one is reused if it is still valid
+    if project.proxy_data.proxy_mode != _pickled_proxy_mode:
+        _pickled_sequences = {}
+    pickled_sequences = {}
+    for seq in project.sequences:
+        if seq != project.c_seq and id(seq) in _pickled_sequences:
+            pickled_for_seq, pickled_seq = _pickled_sequences[id(seq)]
+            if pickled_for_seq == seq and pickled_seq.name == seq.name:
+                pickled_sequences[id(seq)] = pickled_seq
+
+    s_proj = persistance.get_p_project(project, pickled_sequences)
+    s_proj.sequences = [projectfile.get_sequence_section(s_seq) for s_seq in s_proj.sequences]
+
+    _pickled_sequences = {}
+    for i in range(0, len(project.sequences)):
+        _pickled_sequences[id(project.sequences[i])] = (project.sequences[i], s_proj.sequences[i])
+    _pickled_proxy_mode = project.proxy_data.proxy_mode
+
+    _entries_count = 0
+    _journal_bytes = 0
+    _get_writer().add_job(SnapshotJob(_autosave_path, projectfile.get_project_data(s_proj)))
+
+def edit_done(edit_action):
+    """
+    Called after edit action has been done, undone or redone.
+    """
+    global _entries_count, _journal_bytes
+    if _autosave_path == None:
+        return
+
+    project = editorstate.PROJECT()
+    entry = JournalEntry(project.sequences.index(project.c_seq))
+    if edit_action.damage == None:
+        entry.sequence = persistance.get_p_current_sequence(project)
+    else:
+        entry.tracks = persistance.get_p_sequence_tracks(project, project.c_seq, edit_action.damage.keys())
+
+    data = pickle.dumps(entry)
+    _get_writer().add_job(AppendJob(_autosave_path, data))
+
+    _entries_count += 1
+    _journal_bytes += len(data)
+    if _entries_count >= MAX_JOURNAL_ENTRIES or _journal_bytes >= MAX_JOURNAL_BYTES:
+        write_snapshot()
+
+def get_journal_path(autosave_path):
+    return autosave_path + JOURNAL_EXTENSION
+
+def is_autosave_file(file_name):
+    """
+    Returns False for journals and partially written snapshots in autosave folder.
+    """
+    return not (file_name.endswith(JOURNAL_EXTENSION) or file_name.endswith(TEMP_EXTENSION))
+
+def delete_autosave(autosave_path):
+    """
+    Deletes snapshot and journal after all pending writes are done.
+    """
+    if _writer != None:
+        _writer.jobs.join()
+    for path in [autosave_path, get_journal_path(autosave_path), autosave_path + TEMP_EXTENSION]:
+        if os.path.exists(path):
+            os.remove(path)
+
+def _get_writer():
+    global _writer
+    if _writer == None:
+        _writer = AutosaveWriter()
+        _writer.start()
+    return _writer
+
+
+# --------------------------------------------------- recovery
+def replay_journal(autosave_path):
+    """
+    Applies journaled edits to snapshot in autosave_path and deletes journal.
+    """
+    journal_path = get_journal_path(autosave_path)
+    if not os.path.exists(journal_path):
+        return
+
+    entries = _read_journal(journal_path)
+    if len(entries) > 0:
+        print "Replaying", len(entries), "autosave journal entries"
+        project = projectfile.read_project(autosave_path)
+        for entry in entries:
+            entry.apply(project)
+        projectfile.write_project(autosave_path, project)
+
+    os.remove(journal_path)
+
+def _read_journal(journal_path):
+    entries = []
+    f = open(journal_path, "rb")
+    while True:
+        try:
+            entries.append(pickle.load(f))
+        except EOFError:
+            break
+        except Exception:
+            # Last entry was not completely written when app crashed
+            print "Autosave journal ends with a partial entry"
+            break
+    f.close()
+    return entries
+
+
+# --------------------------------------------------- writer thread
+class SnapshotJob:
+    def __init__(self, autosave_path, data):
+        self.autosave_path = autosave_path
+        self.data = data
+
+    def run(self):
+        projectfile.write_project_data(self.autosave_path, self.data)
+        # Edits in journal are now in snapshot
+        journal = open(get_journal_path(self.autosave_path), "wb")
+        journal.close()
+
+
+class AppendJob:
+    def __init__(self, autosave_path, data):
+        self.autosave_path = autosave_path
+        self.data = data
+
+    def run(self):
+        journal = open(get_journal_path(self.autosave_path), "ab")
+        journal.write(self.data)
+        journal.close()
+
+
+class AutosaveWriter(threading.Thread):
+    """
+    Runs autosave jobs in order they were added.
+    """
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.jobs = Queue.Queue()
+
+    def add_job(self, job):
+        self.jobs.put(job)
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                job.run()
+            except Exception as e:
+                print "Autosave write failed:", e
+            self.jobs.task_done()
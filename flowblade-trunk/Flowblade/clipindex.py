@@ -0,0 +1,130 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module contains index from media paths to clips on tracks.
+
+Index is kept per track in attribute 'clip_index' and built when first needed.
+Atomic edit ops in edit.py update index when clips are added to or removed from
+track.clips. Code that replaces track.clips list makes the index invalid and it is
+rebuilt next time it is needed, the same way sequence compositor index works.
+
+Clips on black bg track and hidden track are not considered to be on timeline.
+"""
+
+import appconsts
+
+
+class TrackClipIndex:
+    """
+    Media clips on a single track by path.
+    """
+    def __init__(self, clips):
+        self.clips = clips # list this was built from, used to detect when track list is replaced
+        self.paths = {} # clip.path -> list of clips
+        for clip in clips:
+            self.add(clip)
+
+    def add(self, clip):
+        if not _is_media_clip(clip):
+            return
+        try:
+            self.paths[clip.path].append(clip)
+        except KeyError:
+            self.paths[clip.path] = [clip]
+
+    def remove(self, clip):
+        if not _is_media_clip(clip):
+            return
+        path_clips = self.paths[clip.path]
+        for i in range(0, len(path_clips)):
+            if path_clips[i] is clip:
+                path_clips.pop(i)
+                break
+        if len(path_clips) == 0:
+            del self.paths[clip.path]
+
+    def get_clips(self, path):
+        return self.paths.get(path, [])
+
+
+def get_track_index(track):
+    """
+    Returns TrackClipIndex for track, index is rebuilt if track clips list has been replaced.
+    """
+    try:
+        if track.clip_index.clips is track.clips:
+            return track.clip_index
+    except AttributeError: # index not built or track was loaded from file
+        pass
+
+    track.clip_index = TrackClipIndex(track.clips)
+    return track.clip_index
+
+def clip_added(track, clip):
+    """
+    Called by edit ops after clip has been added to track.clips.
+    """
+    index = _get_valid_index(track)
+    if index != None:
+        index.add(clip)
+
+def clip_removed(track, clip):
+    """
+    Called by edit ops after clip has been removed from track.clips.
+    """
+    index = _get_valid_index(track)
+    if index != None:
+        index.remove(clip)
+
+def get_clips(sequences, paths):
+    """
+    Returns list of (sequence, track, clip) tuples for clips on timeline using any of the paths.
+    """
+    clips = []
+    for seq in sequences:
+        for track in seq.tracks[1:len(seq.tracks) - 1]:
+            index = get_track_index(track)
+            for path in paths:
+                for clip in index.get_clips(path):
+                    clips.append((seq, track, clip))
+    return clips
+
+def is_used(sequences, paths):
+    for seq in sequences:
+        for track in seq.tracks[1:len(seq.tracks) - 1]:
+            index = get_track_index(track)
+            for path in paths:
+                if path in index.paths:
+                    return True
+    return False
+
+def _get_valid_index(track):
+    # Index that is not built yet will be built from current clips when needed
+    try:
+        index = track.clip_index
+    except AttributeError:
+        return None
+    if index.clips is track.clips:
+        return index
+    return None
+
+def _is_media_clip(clip):
+    return clip.is_blanck_clip == False and clip.media_type != appconsts.PATTERN_PRODUCER
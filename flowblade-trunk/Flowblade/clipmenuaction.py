@@ -37,6 +37,7 @@ from editorstate import current_sequence
 from editorstate import get_track
 from editorstate import PROJECT
 import movemodes
+import producerpool
 import syncsplitevent
 import tlinewidgets
 import updater
@@ -118,19 +119,20 @@ def _open_clip_in_clip_monitor(data):
 
 def _show_clip_info(data):
     clip, track, item_id, x = data
-    
-    width = clip.get("width")
-    height = clip.get("height")
+    media_producer = producerpool.get_media_producer(clip)
+
+    width = media_producer.get("width")
+    height = media_producer.get("height")
     size = str(width) + " x " + str(height)
     l_frames = clip.clip_out - clip.clip_in + 1 # +1 out inclusive
     length = utils.get_tc_string(l_frames)
 
-    video_index = clip.get_int("video_index")
-    audio_index = clip.get_int("audio_index")
+    video_index = media_producer.get_int("video_index")
+    audio_index = media_producer.get_int("audio_index")
     long_video_property = "meta.media." + str(video_index) + ".codec.long_name"
     long_audio_property = "meta.media." + str(audio_index) + ".codec.long_name"
-    vcodec = clip.get(str(long_video_property))
-    acodec = clip.get(str(long_audio_property))
+    vcodec = media_producer.get(str(long_video_property))
+    acodec = media_producer.get(str(long_audio_property))
 
     dialogs.clip_properties_dialog((length, size, clip.path, vcodec, acodec))
 
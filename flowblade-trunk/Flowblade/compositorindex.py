@@ -0,0 +1,145 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module contains interval index for sequence compositors.
+
+Compositors are kept per track they are on (transition b_track) in lists sorted by clip_in.
+With length of the longest compositor on track known, compositors overlapping a frame range
+can be found by bisecting without looking at compositors outside the range.
+
+Stacking order of compositors is not kept here, see Sequence.compositors for that.
+"""
+
+import bisect
+
+
+class TrackCompositors:
+    """
+    Compositors on a single track sorted by clip_in.
+    """
+    def __init__(self):
+        self.ins = [] # clip_in values of compositors, kept separate for bisecting
+        self.compositors = []
+        self.max_length = 0 # not decreased on remove, only makes range queries look at few extra items
+
+    def add(self, compositor):
+        i = bisect.bisect_right(self.ins, compositor.clip_in)
+        self.ins.insert(i, compositor.clip_in)
+        self.compositors.insert(i, compositor)
+        self.max_length = max(self.max_length, compositor.get_length())
+
+    def remove(self, compositor):
+        i = bisect.bisect_left(self.ins, compositor.clip_in)
+        while i < len(self.ins) and self.ins[i] == compositor.clip_in:
+            if self.compositors[i] is compositor:
+                self._remove_index(i)
+                return
+            i += 1
+
+        # clip_in was changed without updating index
+        for i in range(0, len(self.compositors)):
+            if self.compositors[i] is compositor:
+                self._remove_index(i)
+                return
+
+        raise ValueError('compositor not in index')
+
+    def _remove_index(self, i):
+        self.ins.pop(i)
+        self.compositors.pop(i)
+
+    def get_range(self, start, end):
+        """
+        Returns compositors that have frames in range start - end, both inclusive.
+        """
+        first = bisect.bisect_left(self.ins, start - self.max_length + 1)
+        last = bisect.bisect_right(self.ins, end)
+        range_compositors = []
+        for i in range(first, last):
+            if self.compositors[i].clip_out >= start:
+                range_compositors.append(self.compositors[i])
+        return range_compositors
+
+    def get_starting_from(self, frame):
+        """
+        Returns compositors with clip_in at or after frame.
+        """
+        return self.compositors[bisect.bisect_left(self.ins, frame):]
+
+
+class CompositorIndex:
+    """
+    TrackCompositors for all tracks that have compositors.
+    """
+    def __init__(self, compositors):
+        self.compositors = compositors # list this was built from, used to detect when sequence list is replaced
+        self.tracks = {} # b_track -> TrackCompositors
+        for compositor in compositors:
+            self.add(compositor)
+
+    def add(self, compositor):
+        b_track = compositor.transition.b_track
+        try:
+            track_compositors = self.tracks[b_track]
+        except KeyError:
+            track_compositors = TrackCompositors()
+            self.tracks[b_track] = track_compositors
+        track_compositors.add(compositor)
+
+    def remove(self, compositor):
+        self.tracks[compositor.transition.b_track].remove(compositor)
+
+    def replace(self, old_compositor, new_compositor):
+        self.remove(old_compositor)
+        self.add(new_compositor)
+
+    def get_count(self, track_index):
+        try:
+            return len(self.tracks[track_index].compositors)
+        except KeyError:
+            return 0
+
+    def get_range(self, track_index, start, end):
+        """
+        Returns compositors on track that have frames in range start - end, both inclusive.
+        """
+        try:
+            return self.tracks[track_index].get_range(start, end)
+        except KeyError:
+            return []
+
+    def get_at(self, track_index, frame):
+        """
+        Returns first compositor on track covering frame or None.
+        """
+        frame_compositors = self.get_range(track_index, frame, frame)
+        if len(frame_compositors) == 0:
+            return None
+        return frame_compositors[0]
+
+    def get_starting_from(self, track_index, frame):
+        """
+        Returns compositors on track with clip_in at or after frame.
+        """
+        try:
+            return self.tracks[track_index].get_starting_from(frame)
+        except KeyError:
+            return []
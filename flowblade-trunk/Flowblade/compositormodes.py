@@ -108,7 +108,7 @@ def mouse_move(x, y, frame, state):
     else:
         edit_data["current_frame"] = frame
 
-    updater.repaint_tline()
+    updater.repaint_tline_overlay()
     
 def mouse_release(x, y, frame, state):
     editorstate.edit_mode = prev_edit_mode
@@ -31,6 +31,7 @@ import os
 import pango
 
 import appconsts
+import autosavejournal
 import dialogutils
 import gui
 import guicomponents
@@ -585,8 +586,7 @@ def load_dialog():
     status_box.pack_start(gtk.Label(), True, True, 0)
 
     progress_bar = gtk.ProgressBar()
-    progress_bar.set_fraction(0.2)
-    progress_bar.set_pulse_step(0.1)
+    progress_bar.set_fraction(0.0)
 
     est_box = gtk.HBox(False, 2)
     est_box.pack_start(gtk.Label(""),False, False, 0)
@@ -740,7 +740,7 @@ def autosaves_many_recovery_dialog(response_callback, autosaves, parent_window):
 
 def _autosaves_delete_all_clicked(autosaves, autosaves_view, dialog):
     for autosave in autosaves:
-        os.remove(autosave.path)
+        autosavejournal.delete_autosave(autosave.path)
     dialog.set_response_sensitive(gtk.RESPONSE_OK, False)
     del autosaves[:]
     autosaves_view.fill_data_model(autosaves)
@@ -748,7 +748,7 @@ def _autosaves_delete_all_clicked(autosaves, autosaves_view, dialog):
 def _autosaves_delete_unselected(autosaves, autosaves_view):
     selected_autosave = autosaves.pop(autosaves_view.get_selected_indexes_list()[0])
     for autosave in autosaves:
-        os.remove(autosave.path)
+        autosavejournal.delete_autosave(autosave.path)
     del autosaves[:]
     autosaves.append(selected_autosave)
     autosaves_view.fill_data_model(autosaves)
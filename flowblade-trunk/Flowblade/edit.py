@@ -27,12 +27,14 @@ EditAction objects and placing them on the undo/redo stack.
 """
 import audiowaveform
 import appconsts
+import clipindex
 import compositeeditor
 from editorstate import current_sequence
 from editorstate import get_track
 from editorstate import PLAYER
 import mltfilters
 import movemodes
+import producerpool
 import resync
 import trimmodes
 import undo
@@ -42,6 +44,11 @@ import utils
 # GUI updates are turned off for example when doing resync action
 do_gui_update = False
 
+# Timeline areas changed by edit being done, dict track id -> first changed frame.
+# Atomic edit ops add to this so that only changed areas need to be repainted.
+# Value None means that whole timeline needs to be repainted.
+damage = {}
+
 
 # ---------------------------------- atomic edit ops
 def append_clip(track, clip, clip_in, clip_out):
@@ -50,8 +57,11 @@ def append_clip(track, clip, clip_in, clip_out):
     """
     clip.clip_in = clip_in
     clip.clip_out = clip_out
+    _damage_track(track, len(track.clips))
+    _set_cut_in_and_out(clip, clip_in, clip_out)
     track.clips.append(clip) # py
     track.append(clip, clip_in, clip_out) # mlt
+    clipindex.clip_added(track, clip)
     resync.clip_added_to_timeline(clip, track)
 
 def _insert_clip(track, clip, index, clip_in, clip_out):
@@ -60,9 +70,19 @@ def _insert_clip(track, clip, index, clip_in, clip_out):
     """
     clip.clip_in = clip_in
     clip.clip_out = clip_out
+    _set_cut_in_and_out(clip, clip_in, clip_out)
+    producerpool.retain_cut(clip) # clip may have been released when removed earlier
     track.clips.insert(index, clip) # py
     track.insert(clip, index, clip_in, clip_out) # mlt
+    clipindex.clip_added(track, clip)
     resync.clip_added_to_timeline(clip, track)
+    _damage_track(track, index)
+
+def _set_cut_in_and_out(clip, clip_in, clip_out):
+    # Playlist uses cuts as they are and won't extend them past their current out point,
+    # so cut in and out must be set before cut is (re)inserted with new in and out.
+    if clip.is_cut():
+        clip.set_in_and_out(clip_in, clip_out)
 
 def _insert_blank(track, index, length):
     track.insert_blank(index, length - 1) # -1 MLT API says so
@@ -72,18 +92,63 @@ def _insert_blank(track, index, length):
     blank_clip.clip_out = length - 1 # -1, end inclusive
     blank_clip.is_blanck_clip = True
     track.clips.insert(index, blank_clip)
+    _damage_track(track, index)
     
 def _remove_clip(track, index):
     """
     Affects MLT c-struct and python obj values.
     """
+    _damage_track(track, index)
     track.remove(index)
     clip = track.clips.pop(index)
+    clipindex.clip_removed(track, clip)
     updater.clip_removed_during_edit(clip)
     resync.clip_removed_from_timeline(clip)
+    producerpool.release_cut(clip) # undo keeps cut and its parent alive, _insert_clip() retains it again
     
     return clip
 
+def _damage_track(track, index):
+    """
+    Marks track changed from start of clip at index to the end of track.
+    """
+    if damage == None:
+        return
+    if index < len(track.clips):
+        frame = track.clip_start(index)
+    else:
+        frame = track.get_length()
+    try:
+        if frame < damage[track.id]:
+            damage[track.id] = frame
+    except KeyError:
+        damage[track.id] = frame
+
+def _damage_all():
+    """
+    Marks whole timeline changed, used by edits that change more then clips on tracks.
+    """
+    global damage
+    damage = None
+
+def _begin_damage():
+    global damage
+    damage = {}
+    
+    # Selection is cleared by edit
+    if movemodes.selected_track != -1:
+        _damage_track(get_track(movemodes.selected_track), movemodes.selected_range_in)
+
+def _get_damage(sync_children_count):
+    # Edits that change anything other than clips on tracks call _damage_all(), because the
+    # selected track is damaged at start of every edit. Sync relations are drawn across tracks
+    # and sync states can change anywhere, so timelines with synced clips are repainted fully.
+    if damage == None or len(damage) == 0:
+        return None
+    if sync_children_count > 0 or len(resync.sync_children) > 0:
+        return None
+    return damage
+
 # -------------------------------- combined edit ops
 def _cut(track, index, clip_cut_frame, clip, clip_copy):
     """
@@ -169,7 +234,7 @@ def _remove_all_trailing_blanks(self=None):
 
 def _create_clip_clone(clip):
     if clip.media_type != appconsts.PATTERN_PRODUCER:
-        new_clip = current_sequence().create_file_producer_clip(clip.path)
+        new_clip = current_sequence().create_file_producer_clip(clip.path, None, producerpool.get_track_id(clip))
     else:
         new_clip = current_sequence().create_pattern_producer(clip.create_data)
     new_clip.name = clip.name
@@ -305,6 +370,9 @@ class EditAction:
         # update the hidden track themselves and this flag "update_hidden_track" to False
         self.update_hidden_track_blank = True
 
+        # Timeline areas changed by last undo or redo, see module variable 'damage'.
+        self.damage = None
+
     def do_edit(self):
         if self.exit_active_trimmode_on_edit:
             trimmodes.set_no_edit_trim_mode()
@@ -321,6 +389,9 @@ class EditAction:
         if self.stop_for_edit:
             PLAYER().consumer.stop()
 
+        sync_children_count = len(resync.sync_children)
+        _begin_damage()
+
         movemodes.clear_selected_clips()  # selection not valid after change in sequence
         _remove_trailing_blanks_undo(self)
         _consolidate_all_blanks_undo(self)
@@ -330,6 +401,7 @@ class EditAction:
         _remove_all_trailing_blanks(None)
 
         resync.calculate_and_set_child_clip_sync_states()
+        self.damage = _get_damage(sync_children_count)
 
         # HACK, see above.
         if self.stop_for_edit:
@@ -345,6 +417,9 @@ class EditAction:
         if self.stop_for_edit:
             PLAYER().consumer.stop()
 
+        sync_children_count = len(resync.sync_children)
+        _begin_damage()
+
         movemodes.clear_selected_clips() # selection not valid after change in sequence
 
         self.redo_func(self)
@@ -352,6 +427,7 @@ class EditAction:
         _consolidate_all_blanks_redo(self)
         _remove_trailing_blanks_redo(self)
         resync.calculate_and_set_child_clip_sync_states()
+        self.damage = _get_damage(sync_children_count)
 
         # HACK, see above.
         if self.stop_for_edit:
@@ -362,7 +438,7 @@ class EditAction:
 
     def _update_gui(self):
         updater.update_tline_scrollbar() # Slider needs to adjust to possily new program length.
-                                         # This REPAINTS TIMELINE as a side effect.
+        updater.repaint_tline_damage(self.damage)
         updater.update_kf_editor()
 
         current_sequence().update_edit_tracks_length() # NEEDED FOR TRIM CRASH HACK, REMOVE IF FIXED
@@ -956,6 +1032,7 @@ def multi_move_action(data):
     return action
 
 def _multi_move_undo(self):
+    _damage_all() # compositors are moved too
     track_moved = self.multi_data.track_affected    
     tracks = current_sequence().tracks
     for i in range(1, len(tracks) - 1):
@@ -979,16 +1056,15 @@ def _multi_move_undo(self):
                 
             _insert_blank(track, trim_blank_index, self.orig_length)
 
-    tracks_compositors = _get_tracks_compositors_list()
+    compositor_index = current_sequence().get_compositor_index()
     for i in range(1, len(tracks) - 1):
         if not track_moved[i - 1]:
             continue
-        track_comp = tracks_compositors[i - 1]
-        for comp in track_comp:
-            if comp.clip_in >= self.multi_data.first_moved_frame + self.edit_delta:
-                comp.move(-self.edit_delta)
+        moved_compositors = compositor_index.get_starting_from(i, self.multi_data.first_moved_frame + self.edit_delta)
+        current_sequence().move_compositors(moved_compositors, -self.edit_delta)
 
 def _multi_move_redo(self):
+    _damage_all() # compositors are moved too
     tracks = current_sequence().tracks
     track_moved = self.multi_data.track_affected
 
@@ -1015,28 +1091,12 @@ def _multi_move_redo(self):
                 _insert_blank(track, trim_blank_index, self.orig_length + self.edit_delta)
 
     # Move compositors
-    tracks_compositors = _get_tracks_compositors_list()
+    compositor_index = current_sequence().get_compositor_index()
     for i in range(1, len(tracks) - 1):
         if not track_moved[i - 1]:
             continue
-        track_comp = tracks_compositors[i - 1]
-        for comp in track_comp:
-            if comp.clip_in >= self.multi_data.first_moved_frame:
-                comp.move(self.edit_delta)
-
-def _get_tracks_compositors_list():
-    tracks_list = []
-    tracks = current_sequence().tracks
-    compositors = current_sequence().compositors
-    for track_index in range(1, len(tracks) - 1):
-        track_compositors = []
-        for j in range(0, len(compositors)):
-            comp = compositors[j]
-            if comp.transition.b_track == track_index:
-                track_compositors.append(comp)
-        tracks_list.append(track_compositors)
-    
-    return tracks_list
+        moved_compositors = compositor_index.get_starting_from(i, self.multi_data.first_moved_frame)
+        current_sequence().move_compositors(moved_compositors, self.edit_delta)
 
 #------------------ TRIM CLIP START
 # "track","clip","index","delta","first_do"
@@ -1120,6 +1180,7 @@ def add_filter_action(data):
     return action
 
 def _add_filter_undo(self):
+    _damage_all() # edited clip may be on any track, not only selected one
     self.clip.detach(self.filter_object.mlt_filter)
     index = self.clip.filters.index(self.filter_object)
     self.clip.filters.pop(index)
@@ -1127,6 +1188,7 @@ def _add_filter_undo(self):
     self.filter_edit_done_func(self.clip, len(self.clip.filters) - 1) # updates effect stack gui
 
 def _add_filter_redo(self):
+    _damage_all() # edited clip may be on any track, not only selected one
     try: # is redo, fails for first
         self.clip.attach(self.filter_object.mlt_filter)
         self.clip.filters.append(self.filter_object)
@@ -1145,6 +1207,7 @@ def add_multipart_filter_action(data):
     return action
 
 def _add_multipart_filter_undo(self):
+    _damage_all() # edited clip may be on any track, not only selected one
     self.filter_object.detach_all_mlt_filters(self.clip)
     index = self.clip.filters.index(self.filter_object)
     self.clip.filters.pop(index)
@@ -1152,6 +1215,7 @@ def _add_multipart_filter_undo(self):
     self.filter_edit_done_func(self.clip, len(self.clip.filters) - 1) # updates effect stack
 
 def _add_multipart_filter_redo(self):
+    _damage_all() # edited clip may be on any track, not only selected one
     try: # if redo, fails for first
         self.filter_object.attach_filters(self.clip)
         self.clip.filters.append(self.filter_object)
@@ -1170,6 +1234,7 @@ def remove_filter_action(data):
     return action
 
 def _remove_filter_undo(self):
+    _damage_all() # edited clip may be on any track, not only selected one
     _detach_all(self.clip)
     try:
         self.clip.filters.insert(self.index, self.filter_object)
@@ -1181,6 +1246,7 @@ def _remove_filter_undo(self):
     self.filter_edit_done_func(self.clip,self.index) # updates effect stack gui if needed
 
 def _remove_filter_redo(self):
+    _damage_all() # edited clip may be on any track, not only selected one
     _detach_all(self.clip)
     self.filter_object = self.clip.filters.pop(self.index)
     _attach_all(self.clip)
@@ -1201,11 +1267,13 @@ def remove_multiple_filters_action(data):
     return action
 
 def _remove_multiple_filters_undo(self):
+    _damage_all() # edited clip may be on any track, not only selected one
     for clip, clip_filters in zip(self.clips, self.clip_filters):
         clip.filters = clip_filters
         _attach_all(clip)
 
 def _remove_multiple_filters_redo(self):
+    _damage_all() # edited clip may be on any track, not only selected one
     self.clip_filters = []
     for clip in self.clips:
         _detach_all(clip)
@@ -1220,11 +1288,13 @@ def clone_filters_action(data):
     return action
 
 def _clone_filters_undo(self):
+    _damage_all() # edited clip may be on any track, not only selected one
     _detach_all(self.clip)
     self.clip.filters = self.old_filters
     _attach_all(self.clip)
     
 def _clone_filters_redo(self):
+    _damage_all() # edited clip may be on any track, not only selected one
     if not hasattr(self, "clone_filters"):
         self.clone_filters = current_sequence().clone_filters(self.clone_source_clip)
         self.old_filters = self.clip.filters
@@ -1241,6 +1311,7 @@ def add_compositor_action(data):
     return action
 
 def _add_compositor_undo(self):
+    _damage_all() # compositors are drawn across tracks
     current_sequence().remove_compositor(self.compositor)
     current_sequence().restack_compositors()
     
@@ -1252,6 +1323,7 @@ def _add_compositor_undo(self):
     self.compositor = None
 
 def _add_compositor_redo(self):    
+    _damage_all() # compositors are drawn across tracks
     self.compositor = current_sequence().create_compositor(self.compositor_type)
     self.compositor.transition.set_tracks(self.a_track, self.b_track)
     self.compositor.set_in_and_out(self.in_frame, self.out_frame)
@@ -1278,6 +1350,7 @@ def delete_compositor_action(data):
     return action
 
 def _delete_compositor_undo(self):
+    _damage_all() # compositors are drawn across tracks
     old_compositor = self.compositor 
     
     self.compositor = current_sequence().create_compositor(old_compositor.type_id)
@@ -1291,6 +1364,7 @@ def _delete_compositor_undo(self):
     compositeeditor.set_compositor(self.compositor)
 
 def _delete_compositor_redo(self):
+    _damage_all() # compositors are drawn across tracks
     # Compositors are recreated continually in sequnece.restack_compositors() and cannot be identified for undo/redo using object identity 
     # so these ids must be  preserved for all succesive versions of a compositor.
     if self.first_do == True:
@@ -1317,12 +1391,14 @@ def move_compositor_action(data):
     return action  
 
 def _move_compositor_undo(self):
+    _damage_all() # compositors are drawn across tracks
     move_compositor = current_sequence().get_compositor_for_destroy_id(self.destroy_id)
-    move_compositor.set_in_and_out(self.orig_in, self.orig_out)
+    current_sequence().set_compositor_in_and_out(move_compositor, self.orig_in, self.orig_out)
 
     compositeeditor.set_compositor(self.compositor)
 
 def _move_compositor_redo(self):
+    _damage_all() # compositors are drawn across tracks
     # Compositors are recreated continually in sequence.restack_compositors() and cannot be identified for undo/redo using object identity 
     # so these ids must be  preserved for all succesive versions of a compositor.
     if self.first_do == True:
@@ -1332,7 +1408,7 @@ def _move_compositor_redo(self):
         self.first_do = False
 
     move_compositor = current_sequence().get_compositor_for_destroy_id(self.destroy_id)
-    move_compositor.set_in_and_out(self.clip_in, self.clip_out)
+    current_sequence().set_compositor_in_and_out(move_compositor, self.clip_in, self.clip_out)
 
     compositeeditor.set_compositor(self.compositor)
 
@@ -1538,6 +1614,7 @@ def set_sync_action(data):
     return action
     
 def _set_sync_undo(self):
+    _damage_all() # sync relations are drawn across tracks
     # Get clips
     child_clip = self.child_track.clips[self.child_index]
      
@@ -1548,6 +1625,7 @@ def _set_sync_undo(self):
     resync.clip_sync_cleared(child_clip)
     
 def _set_sync_redo(self):
+    _damage_all() # sync relations are drawn across tracks
     # Get clips
     child_clip = self.child_track.clips[self.child_index]
     parent_clip = get_track(current_sequence().first_video_index).clips[self.parent_index]
@@ -1572,6 +1650,7 @@ def clear_sync_action(data):
     return action
     
 def _clear_sync_undo(self):
+    _damage_all() # sync relations are drawn across tracks
     # Reset child sync data
     self.child_clip.sync_data = self.sync_data
 
@@ -1579,6 +1658,7 @@ def _clear_sync_undo(self):
     resync.clip_added_to_timeline(self.child_clip, self.child_track)
 
 def _clear_sync_redo(self):
+    _damage_all() # sync relations are drawn across tracks
     # Save sync data
     self.sync_data = self.child_clip.sync_data
 
@@ -1595,9 +1675,11 @@ def mute_clip(data):
     return action
 
 def _mute_clip_undo(self):
+    _damage_all() # edited clip may be on any track, not only selected one
     _do_clip_unmute(self.clip)
 
 def _mute_clip_redo(self):
+    _damage_all() # edited clip may be on any track, not only selected one
     mute_filter = _create_mute_volume_filter(current_sequence())
     _do_clip_mute(self.clip, mute_filter)
 
@@ -1608,10 +1690,12 @@ def unmute_clip(data):
     return action
 
 def _unmute_clip_undo(self):
+    _damage_all() # edited clip may be on any track, not only selected one
     mute_filter = _create_mute_volume_filter(current_sequence())
     _do_clip_mute(self.clip, mute_filter)
 
 def _unmute_clip_redo(self):
+    _damage_all() # edited clip may be on any track, not only selected one
     _do_clip_unmute(self.clip)
 
 
@@ -1733,6 +1817,10 @@ def _consolidate_all_blanks_redo(self):
                 except:
                     pass
 
+                # Single blanks are already consolidated
+                if i == len(track.clips) - 1 or track.clips[i + 1].is_blanck_clip == False:
+                    continue
+
                 # Now consolidate from clip in index i
                 consolidaded_indexes.append(i)
                 removed_lengths = _remove_consecutive_blanks(track, i)
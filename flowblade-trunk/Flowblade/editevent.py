@@ -444,7 +444,7 @@ def tline_canvas_mouse_pressed(event, frame):
 
     #  Check if compositor is hit and if so handle compositor editing
     if editorstate.current_is_move_mode() and timeline_visible():
-        hit_compositor = tlinewidgets.compositor_hit(frame, event.y, current_sequence().compositors)
+        hit_compositor = tlinewidgets.compositor_hit(frame, event.y)
         if hit_compositor != None:
             movemodes.clear_selected_clips()
             if event.button == 1:
@@ -592,7 +592,7 @@ def tline_canvas_double_click(frame, x, y):
         set_default_edit_mode()
         return
 
-    hit_compositor = tlinewidgets.compositor_hit(frame, y, current_sequence().compositors)
+    hit_compositor = tlinewidgets.compositor_hit(frame, y)
     if hit_compositor != None:
         compositeeditor.set_compositor(hit_compositor)
         return
@@ -642,7 +642,7 @@ def tline_media_drop(media_file, x, y, use_marks=False):
     
     # Create new clip.
     if media_file.type != appconsts.PATTERN_PRODUCER:
-        new_clip = current_sequence().create_file_producer_clip(media_file.path, media_file.name)
+        new_clip = current_sequence().create_file_producer_clip(media_file.path, media_file.name, track.id)
     else:
         new_clip = current_sequence().create_pattern_producer(media_file)
 
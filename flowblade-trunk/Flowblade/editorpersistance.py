@@ -40,6 +40,11 @@ UNDO_STACK_DEFAULT = 30
 UNDO_STACK_MIN = 10
 UNDO_STACK_MAX = 100
 
+PROXY_RENDER_JOBS_AUTO = 0 # number of processors is used to decide jobs count
+PROXY_RENDER_JOBS_MAX = 8
+BATCH_RENDER_JOBS_AUTO = 0 # number of processors is used to decide simultaneous renders count
+BATCH_RENDER_JOBS_MAX = 8
+
 GLASS_STYLE = 0
 SIMPLE_STYLE = 1
 
@@ -160,7 +165,7 @@ def update_prefs_from_widgets(widgets_tuples_tuple):
     # Unpack widgets
     gen_opts_widgets, edit_prefs_widgets, view_prefs_widgets = widgets_tuples_tuple
 
-    default_profile_combo, open_in_last_opened_check, open_in_last_rendered_check, undo_max_spin, load_order_combo = gen_opts_widgets
+    default_profile_combo, open_in_last_opened_check, open_in_last_rendered_check, undo_max_spin, load_order_combo, proxy_jobs_combo, autosave_combo = gen_opts_widgets
     auto_play_in_clip_monitor_check, auto_center_check, grfx_insert_length_spin, trim_exit_click, trim_quick_enter, remember_clip_frame = edit_prefs_widgets
     disp_splash, buttons_style, dark_theme = view_prefs_widgets
 
@@ -170,6 +175,8 @@ def update_prefs_from_widgets(widgets_tuples_tuple):
     prefs.default_profile_name = mltprofiles.get_profile_name_for_index(default_profile_combo.get_active())
     prefs.undos_max = undo_max_spin.get_adjustment().get_value()
     prefs.media_load_order = load_order_combo.get_active()
+    prefs.proxy_render_jobs = proxy_jobs_combo.get_active() # 0 is auto, other indexes are jobs count
+    prefs.auto_save_delay_value_index = autosave_combo.get_active()
 
     prefs.auto_play_in_clip_monitor = auto_play_in_clip_monitor_check.get_active()
     prefs.auto_center_on_play_stop = auto_center_check.get_active()
@@ -244,3 +251,5 @@ class EditorPreferences:
         self.jack_frequency = 48000
         self.jack_output_type = appconsts.JACK_OUT_AUDIO
         self.media_load_order = appconsts.LOAD_ABSOLUTE_FIRST
+        self.proxy_render_jobs = PROXY_RENDER_JOBS_AUTO
+        self.batch_render_jobs = BATCH_RENDER_JOBS_AUTO
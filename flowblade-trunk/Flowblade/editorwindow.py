@@ -31,6 +31,7 @@ import pango
 import app
 import appconsts
 import audiomonitoring
+import audiowaveform
 import batchrendering
 import clipeffectseditor
 import clipmenuaction
@@ -172,6 +173,8 @@ class EditorWindow:
             ('AddTransition', None, _('Add Single Track Transition'), None, None, lambda a:tlineaction.add_transition_menu_item_selected()),
             ('AddFade', None, _('Add Single Track Fade'), None, None, lambda a:tlineaction.add_fade_menu_item_selected()),
             ('ClearFilters', None, _('Clear Filters'), None, None, lambda a:clipmenuaction.clear_filters()),
+            ('DisplaySequenceWaveforms', None, _('Display Audio Levels For All Clips'), None, None, lambda a:audiowaveform.display_sequence_waveforms()),
+            ('CancelWaveforms', None, _('Cancel Audio Levels Creation'), None, None, lambda a:audiowaveform.cancel_waveform_jobs()),
             ('ChangeSequenceTracks', None, _('Change Sequence Tracks Count...'), None, None, lambda a:projectaction.change_sequence_track_count()),
             ('Watermark', None, _('Watermark...'), None, None, lambda a:menuactions.edit_watermark()),
             ('ProfilesManager', None, _('Profiles Manager'), None, None, lambda a:menuactions.profiles_manager()),
@@ -251,6 +254,9 @@ class EditorWindow:
                     <menuitem action='ResyncSelected'/>
                     <menuitem action='ClearFilters'/>
                     <separator/>
+                    <menuitem action='DisplaySequenceWaveforms'/>
+                    <menuitem action='CancelWaveforms'/>
+                    <separator/>
                     <menuitem action='AddTransition'/>
                     <menuitem action='AddFade'/>
                     <separator/>
@@ -346,7 +352,7 @@ class EditorWindow:
         self.media_list_view = guicomponents.MediaPanel(projectaction.media_file_menu_item_selected,
                                                         updater.set_and_display_monitor_media_file)
         self.media_scroll_window = gtk.ScrolledWindow()
-        self.media_scroll_window.add_with_viewport(self.media_list_view.widget)
+        self.media_scroll_window.add(self.media_list_view.widget) # gtk.Layout scrolls itself
         self.media_scroll_window.set_policy(gtk.POLICY_AUTOMATIC, gtk.POLICY_AUTOMATIC)
         self.media_scroll_window.set_size_request(guicomponents.MEDIA_OBJECT_WIDGET_WIDTH * 2 + 70, guicomponents.MEDIA_OBJECT_WIDGET_HEIGHT)
         self.media_scroll_window.show_all()
@@ -27,7 +27,6 @@ from xml.dom import minidom
 from decimal import Decimal,getcontext,ROUND_DOWN
 from math import modf, floor
 import mlt
-import time
 import md5
 import re
 import shutil
@@ -575,16 +574,9 @@ def render_screen_shot(frame, render_path, vcodec):
     consumer.set("rescale", "bicubic")
     consumer.set("vcodec", str(vcodec))
     
-    renderer = renderconsumer.FileRenderPlayer(None, producer, consumer, frame, frame + 1)
-    renderer.wait_for_producer_end_stop = False
-    renderer.consumer_pos_stop_add = 2 # Hack, see FileRenderPlayer
+    renderer = renderconsumer.FileRenderPlayer(None, producer, consumer, frame, frame)
     renderer.start()
-
-    while renderer.has_started_running == False:
-        time.sleep(0.05)
-
-    while renderer.stopped == False:
-        time.sleep(0.05)
+    renderer.done.wait()
 
 def export_screenshot_dialog(callback, frame, parent_window, project_name):
     cancel_str = _("Cancel").encode('utf-8')
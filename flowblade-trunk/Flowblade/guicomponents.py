@@ -292,7 +292,7 @@ class MediaListView(ImageTextTextListView):
         self.storemodel.clear()
         for file_id in current_bin().file_ids:
             media_file = PROJECT().media_files[file_id]
-            row_data = [media_file.icon,
+            row_data = [media_file.get_icon(),
                         media_file.name, 
                         utils.clip_length_string(media_file.length)]
             self.storemodel.append(row_data)
@@ -700,11 +700,23 @@ class CompositorInfoPanel(gtk.VBox):
 
 # -------------------------------------------- media select panel
 class MediaPanel():
-    
+    """
+    Media objects of current bin in a grid.
+
+    Only media objects for rows in view have widgets. Widgets are kept in a pool
+    and moved and given new media files when panel is scrolled.
+    """
     def __init__(self, media_file_popup_cb, double_click_cb):
-        self.widget = gtk.VBox()
-        self.row_widgets = []
-        self.selected_objects = []
+        self.widget = gtk.Layout()
+        self.widget.add_events(gtk.gdk.BUTTON_PRESS_MASK)
+        self.widget.connect("button-press-event", self._layout_pressed)
+        self.widget.connect("set-scroll-adjustments", self._scroll_adjustments_set)
+        self.widget.connect("size-allocate", lambda w, a: self._update_visible_objects())
+        self.items = [] # MediaPanelItems for media files in current bin that pass filter
+        self.item_for_media_file = {}
+        self.selected_objects = [] # MediaPanelItems
+        self.object_widgets = [] # MediaObjectWidget pool, widgets not needed for view are hidden
+        self.visible_start = 0 # index in self.items of first object in view
         self.columns = editorpersistance.prefs.media_columns
         self.media_file_popup_cb = media_file_popup_cb
         self.double_click_cb = double_click_cb
@@ -722,52 +734,55 @@ class MediaPanel():
         return self.selected_objects
         
     def media_object_selected(self, media_object, widget, event):
+        item = media_object.item
         widget.grab_focus()
         if event.type == gtk.gdk._2BUTTON_PRESS:
-             self.double_click_cb(media_object.media_file)
+             self.double_click_cb(item.media_file)
         elif event.button == 1:
             if (event.state & gtk.gdk.CONTROL_MASK):
-                widget.modify_bg(gtk.STATE_NORMAL, gui.selected_bg_color)
                 # only add to selected if not already there
-                try:
-                    self.selected_objects.index(media_object)
-                except:
-                    self.selected_objects.append(media_object)
+                if not item.selected:
+                    item.selected = True
+                    self.selected_objects.append(item)
             else:
                 self.clear_selection()
-                widget.modify_bg(gtk.STATE_NORMAL, gui.selected_bg_color)
-                self.selected_objects.append(media_object)
+                item.selected = True
+                self.selected_objects.append(item)
+            media_object.update_bg()
         elif event.button == 3:
             self.clear_selection()
-            display_media_file_popup_menu(media_object.media_file,
+            display_media_file_popup_menu(item.media_file,
                                           self.media_file_popup_cb,
                                           event)
-        elif event.type == gtk.gdk._2BUTTON_PRESS:
-             print "double click"
         self.widget.queue_draw()
 
     def select_media_file(self, media_file):
         self.clear_selection()
-        self.selected_objects.append(self.widget_for_mediafile[media_file])
+        self._select_item(self.item_for_media_file[media_file])
     
     def select_media_file_list(self, media_files):
         self.clear_selection()
         for media_file in media_files:
-            self.selected_objects.append(self.widget_for_mediafile[media_file])        
+            self._select_item(self.item_for_media_file[media_file])
 
     def empty_pressed(self, widget, event):
         self.clear_selection()
 
     def select_all(self):
         self.clear_selection()
-        for media_file, media_object in self.widget_for_mediafile.iteritems():
-            media_object.widget.modify_bg(gtk.STATE_NORMAL, gui.selected_bg_color)
-            self.selected_objects.append(media_object)
+        for item in self.items:
+            self._select_item(item)
+        self._update_visible_bgs()
 
     def clear_selection(self):
-        for m_obj in self.selected_objects:
-            m_obj.widget.modify_bg(gtk.STATE_NORMAL, gui.note_bg_color)
+        for item in self.selected_objects:
+            item.selected = False
         self.selected_objects = []
+        self._update_visible_bgs()
+
+    def _select_item(self, item):
+        item.selected = True
+        self.selected_objects.append(item)
 
     def columns_changed(self, adjustment):
         self.columns = int(adjustment.get_value())
@@ -776,78 +791,133 @@ class MediaPanel():
         self.fill_data_model()
 
     def fill_data_model(self):
-        for w in self.row_widgets:
-            self.widget.remove(w)
-        self.row_widgets = []
-        self.widget_for_mediafile = {}
+        self.items = []
+        self.item_for_media_file = {}
         self.selected_objects = []
 
-        column = 0
-        bin_index = 0
-        row_box = gtk.HBox()
-        row_box.set_size_request(MEDIA_OBJECT_WIDGET_WIDTH * self.columns, MEDIA_OBJECT_WIDGET_HEIGHT)
-        for file_id in current_bin().file_ids:
-            media_file = PROJECT().media_files[file_id]
-            
-            # Filter view
-            if ((editorstate.media_view_filter == appconsts.SHOW_VIDEO_FILES) 
-                and (media_file.type != appconsts.VIDEO)):
+        file_ids = current_bin().file_ids
+        for bin_index in range(0, len(file_ids)):
+            media_file = PROJECT().media_files[file_ids[bin_index]]
+            if self._is_filtered_out(media_file):
                 continue
-            if ((editorstate.media_view_filter == appconsts.SHOW_AUDIO_FILES) 
-                and (media_file.type != appconsts.AUDIO)):
-                continue
-            if ((editorstate.media_view_filter == appconsts.SHOW_GRAPHICS_FILES) 
-                and (media_file.type != appconsts.IMAGE)):
-                continue
-            if ((editorstate.media_view_filter == appconsts.SHOW_IMAGE_SEQUENCES) 
-                and (media_file.type != appconsts.IMAGE_SEQUENCE)):
-                continue
-            if ((editorstate.media_view_filter == appconsts.SHOW_PATTERN_PRODUCERS) 
-                and (media_file.type != appconsts.PATTERN_PRODUCER)):
-                continue
-                
-            media_object = MediaObjectWidget(media_file, self.media_object_selected, bin_index, self.monitor_indicator)
+            self._add_item(media_file, bin_index)
+
+        self._update_layout_size()
+        self.visible_start = -1 # forces all visible widgets to be updated
+        self._update_visible_objects()
+
+    def add_media_file(self, media_file):
+        """
+        Adds media object for media file that was added last in current bin.
+        """
+        if self._is_filtered_out(media_file):
+            return
+
+        self._add_item(media_file, len(current_bin().file_ids) - 1)
+        self._update_layout_size()
+        self._update_visible_objects()
+
+    def _add_item(self, media_file, bin_index):
+        item = MediaPanelItem(media_file, bin_index)
+        self.items.append(item)
+        self.item_for_media_file[media_file] = item
+
+    def _is_filtered_out(self, media_file):
+        if ((editorstate.media_view_filter == appconsts.SHOW_VIDEO_FILES) 
+            and (media_file.type != appconsts.VIDEO)):
+            return True
+        if ((editorstate.media_view_filter == appconsts.SHOW_AUDIO_FILES) 
+            and (media_file.type != appconsts.AUDIO)):
+            return True
+        if ((editorstate.media_view_filter == appconsts.SHOW_GRAPHICS_FILES) 
+            and (media_file.type != appconsts.IMAGE)):
+            return True
+        if ((editorstate.media_view_filter == appconsts.SHOW_IMAGE_SEQUENCES) 
+            and (media_file.type != appconsts.IMAGE_SEQUENCE)):
+            return True
+        if ((editorstate.media_view_filter == appconsts.SHOW_PATTERN_PRODUCERS) 
+            and (media_file.type != appconsts.PATTERN_PRODUCER)):
+            return True
+        return False
+
+    # ------------------------------------------------- virtual grid
+    def _get_rows_count(self):
+        return (len(self.items) + self.columns - 1) / self.columns
+
+    def _update_layout_size(self):
+        self.widget.set_size(MEDIA_OBJECT_WIDGET_WIDTH * self.columns, 
+                             MEDIA_OBJECT_WIDGET_HEIGHT * self._get_rows_count())
+
+    def _scroll_adjustments_set(self, layout, hadjustment, vadjustment):
+        if vadjustment != None:
+            vadjustment.connect("value-changed", lambda a: self._update_visible_objects())
+
+    def _update_visible_objects(self):
+        vadjustment = self.widget.get_vadjustment()
+        view_height = self.widget.get_allocation().height
+        if vadjustment != None:
+            top = int(vadjustment.get_value())
+        else:
+            top = 0
+        first_row = top / MEDIA_OBJECT_WIDGET_HEIGHT
+        last_row = (top + view_height) / MEDIA_OBJECT_WIDGET_HEIGHT
+        start = min(first_row * self.columns, len(self.items))
+        end = min((last_row + 1) * self.columns, len(self.items))
+
+        # Add widgets to pool if view has grown
+        while len(self.object_widgets) < end - start:
+            media_object = MediaObjectWidget(self.media_object_selected, self.monitor_indicator)
             dnd.connect_media_files_object_widget(media_object.widget)
             dnd.connect_media_files_object_cairo_widget(media_object.img)
-            self.widget_for_mediafile[media_file] = media_object
-            row_box.pack_start(media_object.widget, False, False, 0)
-            column += 1
-            if column == self.columns:
-                filler = self._get_empty_filler()
-                row_box.pack_start(filler, True, True, 0)
-                self.widget.pack_start(row_box, False, False, 0)
-                self.row_widgets.append(row_box)
-                row_box = gtk.HBox()
-                column = 0
-            bin_index += 1
-
-        if column != 0:
-            filler = self._get_empty_filler()
-            row_box.pack_start(filler, True, True, 0)
-            self.widget.pack_start(row_box, False, False, 0)
-            self.row_widgets.append(row_box)
-
-        filler = self._get_empty_filler()
-        self.row_widgets.append(filler)
-        self.widget.pack_start(filler, True, True, 0)
+            self.widget.put(media_object.widget, 0, 0)
+            self.object_widgets.append(media_object)
+
+        for i in range(0, len(self.object_widgets)):
+            media_object = self.object_widgets[i]
+            item_index = start + i
+            if item_index < end:
+                if media_object.item is not self.items[item_index] or start != self.visible_start:
+                    media_object.set_item(self.items[item_index])
+                    x = (item_index % self.columns) * MEDIA_OBJECT_WIDGET_WIDTH
+                    y = (item_index / self.columns) * MEDIA_OBJECT_WIDGET_HEIGHT
+                    self.widget.move(media_object.widget, x, y)
+                media_object.widget.show_all()
+            else:
+                media_object.set_item(None)
+                media_object.widget.hide()
 
-        self.widget.show_all()
+        self.visible_start = start
 
-    def _get_empty_filler(self):
-        filler = gtk.EventBox()
-        filler.connect("button-press-event", lambda w,e: self.empty_pressed(w,e))
-        filler.add(gtk.Label())
-        return filler
+    def _update_visible_bgs(self):
+        for media_object in self.object_widgets:
+            if media_object.item != None:
+                media_object.update_bg()
 
+    def _layout_pressed(self, widget, event):
+        # Presses on media objects are handled by them and propagated here
+        if event.window == self.widget.bin_window:
+            self.empty_pressed(widget, event)
 
-class MediaObjectWidget:
-    
-    def __init__(self, media_file, selected_callback, bin_index, indicator_icon):
+
+class MediaPanelItem:
+    """
+    Media file in MediaPanel, these are the selected objects given to users of panel.
+    """
+    def __init__(self, media_file, bin_index):
         self.media_file = media_file
+        self.bin_index = bin_index # index in Bin.file_ids
+        self.selected = False
+
+
+class MediaObjectWidget:
+    """
+    Widget displaying a MediaPanelItem, reused for other items when MediaPanel is scrolled.
+    """
+    def __init__(self, selected_callback, indicator_icon):
+        self.item = None
+        self.media_file = None
         self.selected_callback = selected_callback
-        self.bin_index = bin_index
         self.indicator_icon = indicator_icon
-        self.selected_callback = selected_callback
         self.widget = gtk.EventBox()
         self.widget.connect("button-press-event", lambda w,e: selected_callback(self, w, e))
         self.widget.dnd_media_widget_attr = True # this is used to identify widget at dnd drop
@@ -863,23 +933,41 @@ class MediaObjectWidget:
         self.img.press_func = self._press
         self.img.dnd_media_widget_attr = True # this is used to identify widget at dnd drop
 
-        txt = gtk.Label(media_file.name)
-        txt.modify_font(pango.FontDescription("sans 9"))
-        txt.set_ellipsize(pango.ELLIPSIZE_END)
+        self.txt = gtk.Label()
+        self.txt.modify_font(pango.FontDescription("sans 9"))
+        self.txt.set_ellipsize(pango.ELLIPSIZE_END)
 
         self.vbox.pack_start(self.img, True, True, 0)
-        self.vbox.pack_start(txt, False, False, 0)
+        self.vbox.pack_start(self.txt, False, False, 0)
         
         self.align.add(self.vbox)
         
         self.widget.add(self.align)
 
+    def set_item(self, item):
+        self.item = item
+        if item == None:
+            self.media_file = None
+            return
+        self.media_file = item.media_file
+        self.txt.set_text(self.media_file.name)
+        self.update_bg()
+        self.img.queue_draw()
+
+    def update_bg(self):
+        if self.item.selected:
+            self.widget.modify_bg(gtk.STATE_NORMAL, gui.selected_bg_color)
+        else:
+            self.widget.modify_bg(gtk.STATE_NORMAL, gui.note_bg_color)
+
     def _press(self, event):
         self.selected_callback(self, self.widget, event)
         
     def _draw_icon(self, event, cr, allocation):
+        if self.media_file == None:
+            return
         x, y, w, h = allocation
-        cr.set_source_pixbuf(self.media_file.icon, 0, 0)
+        cr.set_source_pixbuf(self.media_file.get_icon(), 0, 0)
         cr.paint()
         if self.media_file == editorstate.MONITOR_MEDIA_FILE():
             cr.set_source_pixbuf(self.indicator_icon, 29, 22)
@@ -0,0 +1,274 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module builds MLT objects for current sequence of a saved project without GUI modules.
+
+Project modules that are unpickled with projects import gtk, so project sections are
+unpickled with ProjectUnpickler that replaces application classes with SavedObject.
+MLT objects are then created from saved attribute values the same way persistance.py
+does when project is loaded in application.
+
+Only objects that affect rendered output are built. Filters, compositors and pattern
+producers are created with mltbuild.py that application uses too.
+"""
+
+import fnmatch
+import os
+import pickle
+
+import mlt
+
+import appconsts
+import mltbuild
+import mltrefhold
+import projectfile
+import respaths
+
+USER_PROFILES_DIR = "/.flowblade/user_profiles/" # in home dir, see mltprofiles.py
+
+# Modules whose classes are unpickled as they are
+STANDARD_MODULES = ["__builtin__", "copy_reg", "collections", "datetime", "decimal"]
+
+AUDIO_MIX_DOWN_TRACK = mltbuild.AUDIO_MIX_DOWN_TRACK
+
+# Compositor type ids with resource paths that are looked up relative to project, see persistance.py
+WIPE_RESOURCE_PROPERTIES = {"##wipe":"resource", "##region":"composite.luma"}
+
+
+class ProjectLoadError(Exception):
+    pass
+
+
+class SavedObject(object):
+    """
+    Replaces application classes when project is unpickled, has saved attributes only.
+    """
+    pass
+
+
+class ProjectUnpickler(pickle.Unpickler):
+    def find_class(self, module_name, class_name):
+        if module_name in STANDARD_MODULES:
+            return pickle.Unpickler.find_class(self, module_name, class_name)
+        return SavedObject
+
+
+# --------------------------------------------------- interface
+def load_current_sequence(file_path):
+    """
+    Returns (profile, tractor) for current sequence of project file.
+
+    Only project metadata and current sequence sections are read.
+    """
+    project_file = projectfile.open_project_file(file_path, ProjectUnpickler)
+    project = project_file.get_metadata()
+
+    profile = get_profile(project.profile_desc)
+    if profile == None:
+        raise ProjectLoadError("Project profile not found: " + project.profile_desc)
+
+    seq = project_file.get_sequence(project.c_seq_index)
+    savefile_version = getattr(project, "SAVEFILE_VERSION", 1)
+    builder = SequenceBuilder(profile, file_path, savefile_version)
+    return (profile, builder.build(seq))
+
+def get_profile(profile_desc):
+    """
+    Returns factory or user profile with description or None if not found.
+    """
+    profile_dirs = [respaths.PROFILE_PATH, os.getenv("HOME") + USER_PROFILES_DIR]
+    for profile_dir in profile_dirs:
+        if not os.path.isdir(profile_dir):
+            continue
+        for file_name in os.listdir(profile_dir):
+            profile = mlt.Profile(profile_dir + file_name)
+            if profile.description() == profile_desc:
+                return profile
+    return None
+
+
+# --------------------------------------------------- building
+class SequenceBuilder:
+    """
+    Creates MLT tractor from saved sequence.
+    """
+    def __init__(self, profile, project_file_path, savefile_version):
+        self.profile = profile
+        self.project_file_path = project_file_path
+        self.savefile_version = savefile_version
+        self.mute_filter_properties = None # read from filters.xml when first needed
+
+    def build(self, seq):
+        tractor = mlt.Tractor()
+        mltrefhold.hold_ref(tractor)
+        if getattr(seq, "master_audio_pan", appconsts.NO_PAN) != appconsts.NO_PAN:
+            tractor.attach(mltbuild.create_pan_filter(self.profile, seq.master_audio_pan))
+        tractor.attach(mltbuild.create_gain_filter(self.profile, getattr(seq, "master_audio_gain", 1.0)))
+
+        field = tractor.field()
+        multitrack = tractor.multitrack()
+
+        for i in range(0, len(seq.tracks)):
+            py_track = seq.tracks[i]
+            mlt_track = self._build_track(py_track)
+            multitrack.connect(mlt_track, i)
+            if i > AUDIO_MIX_DOWN_TRACK:
+                self._mix_audio_for_track(field, mlt_track, i, py_track)
+
+        compositors = sorted(seq.compositors, key=lambda compositor: compositor.transition.b_track, reverse=True)
+        for py_compositor in compositors:
+            self._plant_compositor(field, py_compositor)
+
+        watermark_file_path = getattr(seq, "watermark_file_path", None)
+        if watermark_file_path != None:
+            tractor.attach(mltbuild.create_watermark_filter(self.profile, watermark_file_path))
+
+        return tractor
+
+    def _build_track(self, py_track):
+        mlt_track = mlt.Playlist()
+        mltrefhold.hold_ref(mlt_track)
+        # Saved mute state is not applied on load, see sequence.Sequence._add_track_attributes()
+        if py_track.type == appconsts.VIDEO:
+            mlt_track.set("hide", 0)
+        else:
+            mlt_track.set("hide", 1)
+
+        parents = {} # path -> parent producer, clips on track are cuts of one parent per media file
+        for clip in py_track.clips:
+            if clip.is_blanck_clip == True:
+                mlt_track.blank(clip.clip_out - clip.clip_in)
+                continue
+
+            if clip.media_type == appconsts.PATTERN_PRODUCER:
+                producer = mltbuild.create_pattern_producer(self.profile, clip.create_data)
+                if producer == None:
+                    raise ProjectLoadError("Unknown pattern producer type: " + str(clip.create_data.patter_producer_type))
+            else:
+                producer = self._create_file_producer_cut(parents, clip.path)
+            self._attach_filters(producer, clip.filters)
+            if getattr(clip, "mute_filter", None) != None:
+                producer.attach(self._create_mute_filter())
+
+            if producer.is_cut():
+                producer.set_in_and_out(clip.clip_in, clip.clip_out)
+            mlt_track.append(producer, clip.clip_in, clip.clip_out)
+
+        return mlt_track
+
+    def _mix_audio_for_track(self, field, mlt_track, index, py_track):
+        transition = mltbuild.create_audio_mix_transition(self.profile, index)
+        field.plant_transition(transition, int(AUDIO_MIX_DOWN_TRACK), index)
+
+        mlt_track.attach(mltbuild.create_gain_filter(self.profile, getattr(py_track, "audio_gain", 1.0)))
+        audio_pan = getattr(py_track, "audio_pan", appconsts.NO_PAN)
+        if audio_pan != appconsts.NO_PAN:
+            mlt_track.attach(mltbuild.create_pan_filter(self.profile, audio_pan))
+
+    # ------------------------------------------------ producers
+    def _create_file_producer_cut(self, parents, saved_path):
+        path = self._get_media_path(saved_path)
+        try:
+            parent = parents[path]
+        except KeyError:
+            parent = mlt.Producer(self.profile, str(path))
+            if not parent.is_valid():
+                raise ProjectLoadError("Media file could not be opened: " + path)
+            mltrefhold.hold_ref(parent)
+            parents[path] = parent
+
+        cut = parent.cut(0, parent.get_length() - 1)
+        mltrefhold.hold_ref(cut)
+        return cut
+
+    # ------------------------------------------------ filters
+    def _attach_filters(self, producer, filters):
+        for py_filter in filters:
+            service_id = py_filter.info.mlt_service_id
+            properties = py_filter.properties
+            if service_id == "affine": # see persistance.FIX_1_TO_N_BACKWARDS_FILTER_COMPABILITY()
+                properties = [(name, value.replace(",","/"), prop_type) for name, value, prop_type in properties]
+
+            if py_filter.is_multi_filter == False:
+                mlt_filters = [mltbuild.create_filter(self.profile, service_id, properties)]
+            else:
+                # See mltfilters.MultipartFilterObject.create_mlt_filters()
+                keyframes = mltbuild.parse_keyframes(py_filter.value)
+                if len(keyframes) == 1:
+                    frame, value = keyframes[0]
+                    keyframes.append((producer.get_length(), value))
+                mlt_filters = mltbuild.create_multipart_filters(self.profile, service_id, keyframes)
+                mltbuild.set_multipart_filters_values(mlt_filters, properties, py_filter.info.multipart_desc, keyframes)
+
+            for mlt_filter in mlt_filters:
+                if py_filter.active == False:
+                    mltbuild.set_filter_active(mlt_filter, False)
+                producer.attach(mlt_filter)
+
+    def _create_mute_filter(self):
+        # See mltfilters.create_mute_volume_filter()
+        if self.mute_filter_properties == None:
+            self.mute_filter_properties = mltbuild.load_mute_filter_properties()
+        mute_filter = mltbuild.create_filter(self.profile, mltbuild.MUTE_FILTER_SERVICE, self.mute_filter_properties)
+        mltbuild.set_mute_values(mute_filter)
+        return mute_filter
+
+    # ------------------------------------------------ compositors
+    def _plant_compositor(self, field, py_compositor):
+        py_transition = py_compositor.transition
+        service_id = py_transition.info.mlt_service_id
+        properties = py_transition.properties
+        if self.savefile_version == 1: # see persistance.FIX_1_TO_2_BACKWARDS_COMPOSITOR_COMPABILITY()
+            properties = [(name, value.replace(",","/"), prop_type) for name, value, prop_type in properties]
+
+        transition = mltbuild.create_compositor_transition(self.profile, service_id)
+        mltbuild.set_properties(transition, properties)
+
+        resource_property = WIPE_RESOURCE_PROPERTIES.get(getattr(py_compositor, "type_id", None))
+        if resource_property != None:
+            resource_path = transition.get(resource_property)
+            if resource_path != None:
+                transition.set(resource_property, str(self._get_resource_path(resource_path)))
+
+        transition.set("a_track", str(py_transition.a_track))
+        transition.set("b_track", str(py_transition.b_track))
+        transition.set("in", str(py_compositor.clip_in))
+        transition.set("out", str(py_compositor.clip_out))
+        field.plant_transition(transition, int(py_transition.a_track), int(py_transition.b_track))
+
+    # ------------------------------------------------ paths
+    def _get_media_path(self, path):
+        # Absolute path first, then file with same name under project folder
+        resolved_path = self._get_resource_path(path)
+        if not os.path.isfile(resolved_path):
+            raise ProjectLoadError("Media file not found: " + path)
+        return resolved_path
+
+    def _get_resource_path(self, path):
+        if os.path.isfile(path):
+            return path
+        project_folder = os.path.dirname(os.path.abspath(self.project_file_path))
+        file_name = os.path.basename(path)
+        for root, dirnames, filenames in os.walk(project_folder):
+            for match in fnmatch.filter(filenames, file_name):
+                return os.path.join(root, match)
+        return path
+
@@ -0,0 +1,288 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module renders projects from command line without GUI, launched with launch/flowbladerender.
+
+Rendered file can be:
+    - batch render queue item (.renderitem), item render file, args and range are used
+    - Flowblade project (.flb), current sequence is rendered with project profile
+    - MLT XML file (.mlt, .xml)
+
+Render output path and encoding args given on command line override the ones saved in
+render items. Args can be given as key=value pairs or in a .rargs file saved from
+render panel.
+
+Render state is written to stdout one item per line:
+
+    status <loading|rendering|done>
+    progress <fraction of range rendered>
+    error <message>
+
+Exit status is 0 if render was completed.
+
+Projects are read with headlessproject.py, gtk and other GUI modules are not imported.
+"""
+
+import locale
+import optparse
+import os
+import pickle
+import sys
+import time
+
+import mlt
+
+import headlessproject
+import respaths
+
+STATUS_LINE = "status "
+PROGRESS_LINE = "progress "
+ERROR_LINE = "error "
+
+STATUS_LOADING = "loading"
+STATUS_RENDERING = "rendering"
+STATUS_DONE = "done"
+
+RENDER_ITEM_EXTENSION = ".renderitem"
+PROJECT_EXTENSION = ".flb"
+XML_EXTENSIONS = [".mlt", ".xml"]
+
+PROGRESS_INTERVAL = 0.5 # seconds
+STOP_POLL_INTERVAL = 0.02 # seconds, process exits soon after last frame has been written
+
+class RenderError(Exception):
+    pass
+
+
+class RenderItemData:
+    """
+    Data of batch render queue item, replaces batchrendering classes when items are unpickled.
+    """
+    pass
+
+
+class RenderItemUnpickler(pickle.Unpickler):
+    """
+    batchrendering module is not imported because it needs DBus.
+    """
+    def find_class(self, module_name, class_name):
+        if module_name == "batchrendering":
+            return RenderItemData
+        return pickle.Unpickler.find_class(self, module_name, class_name)
+
+
+class RenderJob:
+    """
+    Everything needed to render a file.
+    """
+    def __init__(self):
+        self.producer = None
+        self.profile = None
+        self.render_path = None
+        self.args_vals_list = []
+        self.start_frame = 0
+        self.end_frame = -1 # render to end
+        self.threads = 0
+
+
+# --------------------------------------------------- entry point
+def main(root_path):
+    parser = optparse.OptionParser(usage="%prog [options] FILE",
+                                   description="Renders Flowblade project, batch render item or MLT XML file.")
+    parser.add_option("-o", "--output", dest="output", help="rendered file path")
+    parser.add_option("-a", "--arg", dest="args", action="append", default=[], metavar="KEY=VALUE",
+                      help="encoding arg, can be given multiple times")
+    parser.add_option("-f", "--args-file", dest="args_file", metavar="FILE", help="encoding args .rargs file")
+    parser.add_option("-p", "--profile", dest="profile", help="MLT profile name or file for MLT XML files")
+    parser.add_option("-i", "--in", dest="start_frame", type="int", help="first rendered frame")
+    parser.add_option("-e", "--out", dest="end_frame", type="int", help="last rendered frame")
+    parser.add_option("-t", "--threads", dest="threads", type="int", default=0, help="encoding threads")
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error("give one file to render")
+
+    try:
+        job = get_render_job(root_path, args[0], options)
+        render(job)
+    except (RenderError, headlessproject.ProjectLoadError, IOError) as e:
+        write_line(ERROR_LINE + str(e))
+        sys.exit(1)
+    except Exception as e: # Error line is written for all failures so that callers can show it
+        write_line(ERROR_LINE + e.__class__.__name__ + ": " + str(e))
+        sys.exit(1)
+
+    write_line(STATUS_LINE + STATUS_DONE)
+
+def get_render_job(root_path, file_path, options):
+    write_line(STATUS_LINE + STATUS_LOADING)
+
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == RENDER_ITEM_EXTENSION:
+        job = _get_render_item_job(root_path, file_path)
+    elif extension == PROJECT_EXTENSION:
+        job = _get_project_job(root_path, file_path)
+    elif extension in XML_EXTENSIONS:
+        job = _get_xml_job(file_path, options.profile)
+    else:
+        raise RenderError("Unknown file type: " + file_path)
+
+    # Command line options override saved values
+    if options.output != None:
+        job.render_path = options.output
+    if options.args_file != None:
+        job.args_vals_list = read_args_file(options.args_file)
+    if len(options.args) > 0:
+        job.args_vals_list = [_parse_arg(arg) for arg in options.args]
+    if options.start_frame != None:
+        job.start_frame = options.start_frame
+    if options.end_frame != None:
+        job.end_frame = options.end_frame
+    job.threads = options.threads
+
+    if job.render_path == None:
+        raise RenderError("No output file given")
+    if len(job.args_vals_list) == 0:
+        raise RenderError("No encoding args given")
+    return job
+
+def read_args_file(file_path):
+    """
+    Returns args list from .rargs file, file has a key=value pair on each line.
+    """
+    args_file = open(file_path)
+    lines = args_file.read().splitlines()
+    args_file.close()
+    return [_parse_arg(line) for line in lines if len(line.strip()) > 0]
+
+def write_line(line):
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+# --------------------------------------------------- jobs
+def _get_xml_job(file_path, profile_arg):
+    if profile_arg == None:
+        raise RenderError("MLT XML files need --profile")
+
+    mlt.Factory().init()
+    profile = mlt.Profile(profile_arg) # MLT accepts profile file paths and names of its own profiles
+    if profile.width() == 0:
+        raise RenderError("Profile not found: " + profile_arg)
+
+    job = RenderJob()
+    job.profile = profile
+    job.producer = mlt.Producer(profile, "xml:" + file_path)
+    if not job.producer.is_valid():
+        raise RenderError("MLT XML file could not be loaded: " + file_path)
+    return job
+
+def _get_project_job(root_path, file_path):
+    respaths.set_paths(root_path)
+    mlt.Factory().init()
+    # Set numeric locale to use "." as radix, MLT initilizes this to OS locale and this causes bugs
+    locale.setlocale(locale.LC_NUMERIC, 'C')
+
+    job = RenderJob()
+    job.profile, job.producer = headlessproject.load_current_sequence(file_path)
+    return job
+
+def _get_render_item_job(root_path, file_path):
+    render_item = _read_render_item(file_path)
+
+    # Item project is in projects folder next to data files folder
+    identifier = os.path.splitext(os.path.basename(file_path))[0]
+    batch_dir = os.path.dirname(os.path.dirname(os.path.abspath(file_path)))
+    project_path = batch_dir + "/projects/" + identifier + PROJECT_EXTENSION
+
+    job = _get_project_job(root_path, project_path)
+    job.render_path = render_item.render_path
+    job.args_vals_list = render_item.args_vals_list
+
+    # Same range as batch render queue
+    if render_item.mark_in >= 0:
+        job.start_frame = render_item.mark_in
+    if render_item.mark_in >= 0 and render_item.mark_out >= 0:
+        job.end_frame = render_item.mark_out
+    return job
+
+def _read_render_item(file_path):
+    item_file = open(file_path, "rb")
+    try:
+        render_item = RenderItemUnpickler(item_file).load()
+    finally:
+        item_file.close()
+    return render_item
+
+def _parse_arg(arg):
+    if arg.find("=") == -1:
+        raise RenderError("Encoding arg is not key=value pair: " + arg)
+    k, v = arg.split("=", 1)
+    return (k.strip(), v.strip())
+
+
+# --------------------------------------------------- rendering
+def render(job):
+    consumer = mlt.Consumer(job.profile, "avformat", str(job.render_path))
+    if not consumer.is_valid():
+        raise RenderError("Render consumer could not be created")
+    consumer.set("real_time", -1)
+    consumer.set("rescale", "bicubic")
+    for k, v in job.args_vals_list:
+        consumer.set(str(k), str(v))
+    if job.threads > 0:
+        consumer.set("threads", job.threads)
+
+    producer = job.producer
+    last_frame = producer.get_length() - 1 # length changes when in and out are set
+    if job.end_frame < 0 or job.end_frame > last_frame:
+        job.end_frame = last_frame
+    if job.start_frame > job.end_frame:
+        raise RenderError("Render range is empty")
+    render_length = job.end_frame - job.start_frame + 1
+
+    write_line(STATUS_LINE + STATUS_RENDERING)
+
+    # Producer is limited to range so that consumer stops after writing last frame of range
+    producer.set_in_and_out(job.start_frame, job.end_frame)
+    consumer.connect(producer)
+    producer.set_speed(0)
+    producer.seek(0)
+    producer.set_speed(1)
+    if consumer.start() != 0:
+        raise RenderError("Render consumer could not be started")
+
+    # Producer position is relative to in point, frame() would give position in media
+    last_progress_time = 0
+    while not consumer.is_stopped():
+        if time.time() - last_progress_time >= PROGRESS_INTERVAL:
+            write_line(PROGRESS_LINE + str(min(float(producer.position()) / render_length, 1.0)))
+            last_progress_time = time.time()
+        time.sleep(STOP_POLL_INTERVAL)
+
+    # Consumer also stops when encoder fails, producer is then stopped before last frame of range
+    frames_rendered = producer.position() + 1
+    if frames_rendered < render_length:
+        raise RenderError("Render stopped at frame " + str(job.start_frame + frames_rendered - 1) + \
+                          " of " + str(job.end_frame) + ", check encoding args")
+    if not os.path.isfile(job.render_path) or os.path.getsize(job.render_path) == 0:
+        raise RenderError("Rendered file was not written: " + job.render_path)
+
+    write_line(PROGRESS_LINE + "1.0")
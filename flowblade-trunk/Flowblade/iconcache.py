@@ -0,0 +1,70 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module keeps media file icons in memory.
+
+Icons are loaded from thumbnail files when they are first displayed and kept in a
+least recently used cache of MAX_ICONS icons. Media panel only displays icons for
+media objects in view, so icons of other media files are dropped as others are loaded.
+
+Only called from GTK thread.
+"""
+
+import collections
+
+import pygtk
+pygtk.require('2.0');
+import gtk
+
+import appconsts
+
+MAX_ICONS = 500 # icons are about 30kB each
+
+_icons = collections.OrderedDict() # icon path -> pixbuf, least recently used first
+
+
+def get_icon(icon_path):
+    """
+    Returns scaled icon pixbuf for thumbnail file or None if file could not be loaded.
+    """
+    try:
+        icon = _icons.pop(icon_path)
+    except KeyError:
+        try:
+            icon = gtk.gdk.pixbuf_new_from_file(icon_path)
+        except:
+            return None
+        icon = icon.scale_simple(appconsts.THUMB_WIDTH, appconsts.THUMB_HEIGHT, \
+                                 gtk.gdk.INTERP_BILINEAR)
+        if len(_icons) >= MAX_ICONS:
+            _icons.popitem(last=False)
+
+    _icons[icon_path] = icon # most recently used last
+    return icon
+
+def remove(icon_path):
+    """
+    Called when thumbnail file has been rewritten.
+    """
+    _icons.pop(icon_path, None)
+
+def clear():
+    _icons.clear()
@@ -53,8 +53,8 @@ def key_down(widget, event):
     """
     # Handle ESCAPE
     if event.keyval == gtk.keysyms.Escape:
-        if audiowaveform.waveform_thread != None:
-            audiowaveform.waveform_thread.abort_rendering()
+        if audiowaveform.waveform_queue.is_running():
+            audiowaveform.cancel_waveform_jobs()
             return True
         else:
             if editorstate.current_is_move_mode() == False:
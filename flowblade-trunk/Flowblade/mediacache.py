@@ -0,0 +1,332 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module keeps a persistent cache of media file thumbnails and probe data.
+
+Entries are keyed by file contents: file size and md5 of first and last blocks of file.
+Renamed or moved files are found in cache and a replaced file gets a new entry.
+Keys are remembered for (path, size, mtime) so that unchanged files are not read again.
+
+Cache is in thumbnails folder, thumbnails are named by entry key and index is a pickled
+MediaCacheIndex. When thumbnails take more disk space than MAX_CACHE_SIZE least recently
+used entries are removed.
+
+Producer length in frames depends on profile frame rate, so lengths are kept
+per frame rate and a file is probed again when it is first used with a new frame rate.
+
+Files that cannot be stat'ed, like image sequences, are not cached.
+"""
+
+import md5
+import os
+import pickle
+import threading
+import time
+
+import editorpersistance
+
+INDEX_FILE = "mediacache"
+TEMP_EXTENSION = ".part"
+THUMBNAIL_EXTENSION = ".png"
+
+MAX_CACHE_SIZE = 200 * 1024 * 1024 # bytes of thumbnails on disk
+EVICT_TO_FRACTION = 0.9 # eviction removes entries until this fraction of MAX_CACHE_SIZE is used
+HASH_BLOCK_SIZE = 64 * 1024
+INDEX_VERSION = 2 # 2: lengths per profile frame rate
+
+_index = None
+_index_folder = None # thumbnails folder index was loaded from
+_lock = threading.Lock()
+
+
+class ProbeData:
+    """
+    Media file properties read from MLT producer.
+    """
+    def __init__(self, media_type):
+        self.media_type = media_type
+        self.lengths = {} # (profile frame_rate_num, frame_rate_den) -> length in frames
+        self.fps_num = 0
+        self.fps_den = 0
+        self.width = 0
+        self.height = 0
+        self.audio_streams = 0
+
+    def get_length(self, profile):
+        """
+        Returns length in frames for profile or None if file has not been probed with profile frame rate.
+        """
+        return self.lengths.get(_get_frame_rate_key(profile))
+
+    def set_length(self, profile, length):
+        self.lengths[_get_frame_rate_key(profile)] = length
+
+
+class CacheEntry:
+    def __init__(self, key, probe_data):
+        self.key = key
+        self.probe_data = probe_data
+        self.has_thumbnail = False
+        self.thumbnail_size = 0
+        self.last_used = time.time()
+
+
+class MediaCacheIndex:
+    def __init__(self):
+        self.entries = {} # key -> CacheEntry
+        self.path_keys = {} # path -> (size, mtime, key)
+        self.total_size = 0
+        self.changed = False
+        self.version = INDEX_VERSION
+
+
+# --------------------------------------------------- interface
+def get_probe_data(file_path):
+    """
+    Returns ProbeData for file or None if file is not in cache.
+    """
+    entry = _get_entry(file_path)
+    if entry == None:
+        return None
+    return entry.probe_data
+
+def get_thumbnail(file_path):
+    """
+    Returns (thumbnail_path, ProbeData) for file or None if file has no thumbnail in cache.
+    """
+    entry = _get_entry(file_path)
+    if entry == None or entry.has_thumbnail == False:
+        return None
+    thumbnail_path = _get_thumbnail_path_for_key(entry.key)
+    if not os.path.isfile(thumbnail_path):
+        return None
+    return (thumbnail_path, entry.probe_data)
+
+def get_thumbnail_write_path(file_path):
+    """
+    Returns path that thumbnail for file should be written to, or None if file cannot be cached.
+    """
+    key = get_key(file_path)
+    if key == None:
+        return None
+    return _get_thumbnail_path_for_key(key)
+
+def add_probe_data(file_path, probe_data, has_thumbnail=False):
+    """
+    Adds entry for file, thumbnail must have been written to get_thumbnail_write_path() first.
+    """
+    key = get_key(file_path)
+    if key == None:
+        return
+
+    entry = CacheEntry(key, probe_data)
+    if has_thumbnail:
+        entry.has_thumbnail = True
+        entry.thumbnail_size = os.path.getsize(_get_thumbnail_path_for_key(key))
+
+    _lock.acquire()
+    try:
+        index = _get_index()
+        old_entry = index.entries.get(key)
+        if old_entry != None:
+            index.total_size -= old_entry.thumbnail_size
+        index.entries[key] = entry
+        index.total_size += entry.thumbnail_size
+        index.changed = True
+        if index.total_size > MAX_CACHE_SIZE:
+            _evict(index)
+    finally:
+        _lock.release()
+
+def add_length(file_path, profile, length):
+    """
+    Adds length for profile frame rate to existing entry.
+    """
+    key = get_key(file_path)
+    if key == None:
+        return
+
+    _lock.acquire()
+    try:
+        index = _get_index()
+        entry = index.entries.get(key)
+        if entry != None:
+            entry.probe_data.set_length(profile, length)
+            index.changed = True
+    finally:
+        _lock.release()
+
+def get_key(file_path):
+    """
+    Returns cache key for file contents or None if file cannot be read.
+    """
+    if editorpersistance.prefs.thumbnail_folder == None:
+        return None
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+
+    _lock.acquire()
+    try:
+        saved = _get_index().path_keys.get(file_path)
+    finally:
+        _lock.release()
+    if saved != None:
+        size, mtime, key = saved
+        if size == stat.st_size and mtime == stat.st_mtime:
+            return key
+
+    try:
+        key = _get_content_hash(file_path, stat.st_size)
+    except IOError:
+        return None
+
+    _lock.acquire()
+    try:
+        index = _get_index()
+        index.path_keys[file_path] = (stat.st_size, stat.st_mtime, key)
+        index.changed = True
+    finally:
+        _lock.release()
+    return key
+
+def save():
+    """
+    Writes index to disk if it has changed since it was loaded or last saved.
+    """
+    _lock.acquire()
+    try:
+        if _index == None or _index.changed == False:
+            return
+        index_path = _get_index_path(_index_folder)
+        f = open(index_path + TEMP_EXTENSION, "wb")
+        pickle.dump(_index, f, pickle.HIGHEST_PROTOCOL)
+        f.close()
+        os.rename(index_path + TEMP_EXTENSION, index_path)
+        _index.changed = False
+    except Exception as e:
+        print "Media cache index save failed:", e
+    finally:
+        _lock.release()
+
+
+# --------------------------------------------------- probing
+def get_probe_data_from_producer(producer, media_type, profile):
+    probe_data = ProbeData(media_type)
+    probe_data.set_length(profile, producer.get_length())
+    probe_data.fps_num = producer.get_int("meta.media.frame_rate_num")
+    probe_data.fps_den = producer.get_int("meta.media.frame_rate_den")
+    probe_data.width = producer.get_int("meta.media.width")
+    probe_data.height = producer.get_int("meta.media.height")
+    for i in range(0, producer.get_int("meta.media.nb_streams")):
+        if producer.get("meta.media." + str(i) + ".stream.type") == "audio":
+            probe_data.audio_streams += 1
+    return probe_data
+
+
+# --------------------------------------------------- module functions
+def _get_entry(file_path):
+    key = get_key(file_path)
+    if key == None:
+        return None
+
+    _lock.acquire()
+    try:
+        entry = _get_index().entries.get(key)
+        if entry != None:
+            entry.last_used = time.time()
+            _index.changed = True
+    finally:
+        _lock.release()
+    return entry
+
+def _get_content_hash(file_path, size):
+    f = open(file_path, "rb")
+    try:
+        content_md5 = md5.new(str(size))
+        content_md5.update(f.read(HASH_BLOCK_SIZE))
+        if size > HASH_BLOCK_SIZE:
+            f.seek(max(HASH_BLOCK_SIZE, size - HASH_BLOCK_SIZE))
+            content_md5.update(f.read(HASH_BLOCK_SIZE))
+    finally:
+        f.close()
+    return content_md5.hexdigest()
+
+def _get_index():
+    # Index is loaded again if user has changed thumbnails folder, call with _lock held
+    global _index, _index_folder
+    folder = editorpersistance.prefs.thumbnail_folder
+    if _index != None and _index_folder == folder:
+        return _index
+
+    _index_folder = folder
+    _index = None
+    try:
+        f = open(_get_index_path(folder), "rb")
+        _index = pickle.load(f)
+        f.close()
+    except Exception: # No index yet or index not readable
+        _index = MediaCacheIndex()
+    if getattr(_index, "version", 1) < INDEX_VERSION:
+        _update_index(_index)
+    return _index
+
+def _update_index(index):
+    # Version 1 lengths were saved without frame rate and cannot be used
+    for entry in index.entries.values():
+        entry.probe_data.lengths = {}
+        try:
+            del entry.probe_data.length
+        except AttributeError:
+            pass
+    index.version = INDEX_VERSION
+    index.changed = True
+
+def _get_frame_rate_key(profile):
+    return (profile.frame_rate_num(), profile.frame_rate_den())
+
+def _get_index_path(folder):
+    return folder + "/" + INDEX_FILE
+
+def _get_thumbnail_path_for_key(key):
+    return editorpersistance.prefs.thumbnail_folder + "/" + key + THUMBNAIL_EXTENSION
+
+def _evict(index):
+    # Removes least recently used entries, call with _lock held
+    entries = sorted(index.entries.values(), key=lambda entry: entry.last_used)
+    target_size = MAX_CACHE_SIZE * EVICT_TO_FRACTION
+    evicted_keys = set()
+    for entry in entries:
+        if index.total_size <= target_size:
+            break
+        if entry.has_thumbnail:
+            try:
+                os.remove(_get_thumbnail_path_for_key(entry.key))
+            except OSError:
+                pass
+        index.total_size -= entry.thumbnail_size
+        del index.entries[entry.key]
+        evicted_keys.add(entry.key)
+
+    for path, (size, mtime, key) in index.path_keys.items():
+        if key in evicted_keys:
+            del index.path_keys[path]
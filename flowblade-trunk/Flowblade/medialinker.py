@@ -40,8 +40,8 @@ import mltenv
 import mltprofiles
 import mlttransitions
 import mltfilters
-import persistance
 import projectdata
+import projectreader
 import propertyparse
 import respaths
 import renderconsumer
@@ -70,8 +70,8 @@ class ProjectLoadThread(threading.Thread):
         linker_window.project_label.set_text("Loading...")
         gtk.gdk.threads_leave()
 
-        persistance.show_messages = False
-        project = persistance.load_project(self.filename, False)
+        # Linker only changes paths in project data, no MLT objects or media are needed
+        project = projectreader.read_project(self.filename)
         
         global target_project
         target_project = project
@@ -350,40 +350,8 @@ class MediaAsset:
 
 def _update_media_assets():
     # Collect all media assets used by project
-    
-    new_assets = []
-    asset_paths = {}
-            
-    # Media file media assets
-    for media_file_id, media_file in target_project.media_files.iteritems():
-        new_assets.append(MediaAsset(media_file.path))
-        asset_paths[media_file.path] = media_file.path
-
-    for seq in target_project.sequences:
-        # Clip media assets
-        for track in seq.tracks:
-            for i in range(0, len(track.clips)):
-                clip = track.clips[i]
-                # Only producer clips are affected
-                if (clip.is_blanck_clip == False and (clip.media_type != appconsts.PATTERN_PRODUCER)):
-                    if not(clip.path in asset_paths):
-                        new_assets.append(MediaAsset(clip.path))
-                        asset_paths[clip.path] = clip.path
-        # Wipe lumas
-        for compositor in seq.compositors:
-            res_path = None
-            if compositor.type_id == "##wipe": # Wipe may have user luma and needs to be looked up relatively
-                res_path = propertyparse.get_property_value(compositor.transition.properties, "resource")
-            if compositor.type_id == "##region": # Wipe may have user luma and needs to be looked up relatively
-                res_path = propertyparse.get_property_value(compositor.transition.properties, "composite.luma")
-
-            if res_path != None:
-                if not(res_path in asset_paths):
-                    new_assets.append(MediaAsset(res_path))
-                    asset_paths[res_path] = res_path
-
     global media_assets
-    media_assets = new_assets
+    media_assets = [MediaAsset(path) for path in projectreader.get_media_paths(target_project)]
 
 def _media_asset_menu_item_selected(widget, data):
     msg, row = data
@@ -465,7 +433,7 @@ def _save_as_dialog_callback(dialog, response_id):
         
         _relink_project_media_paths()
             
-        persistance.save_project(target_project, target_project.last_save_path)
+        projectreader.save_project(target_project, target_project.last_save_path)
 
         dialogutils.info_message(_("Relinked version of the Project saved!"), 
                                  _("To test the project, close this tool and open the relinked version in Flowblade."), 
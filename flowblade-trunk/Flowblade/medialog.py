@@ -199,12 +199,12 @@ def get_current_filtered_events():
     return log_events
 
 def append_log_events():
+    track = editorstate.current_sequence().get_first_active_track() # audio tracks??!!??
+
     clips = []
     log_events = get_current_filtered_events()
     for le in log_events:
-        clips.append(get_log_event_clip(le))
-    
-    track = editorstate.current_sequence().get_first_active_track() # audio tracks??!!??
+        clips.append(get_log_event_clip(le, track.id))
     
     data = {"track":track,
             "clips":clips}
@@ -219,18 +219,18 @@ def insert_selected_log_events():
     treeselection = widgets.media_log_view.treeview.get_selection()
     (model, rows) = treeselection.get_selected_rows()
     
+    track = editorstate.current_sequence().get_first_active_track()
     for row_tuple in rows:
         row = row_tuple[0]
         le = log_events[row]
-        clips.append(get_log_event_clip(le))
+        clips.append(get_log_event_clip(le, track.id))
     
-    track = editorstate.current_sequence().get_first_active_track()
     tline_pos = editorstate.current_tline_frame()
     do_multiple_clip_insert_func(track, clips, tline_pos)
 
-def get_log_event_clip(log_event):
+def get_log_event_clip(log_event, track_id=None):
     # currently quarateed not to be a pattern producer
-    new_clip = editorstate.current_sequence().create_file_producer_clip(log_event.path)
+    new_clip = editorstate.current_sequence().create_file_producer_clip(log_event.path, None, track_id)
         
     # Set clip in and out points
     new_clip.clip_in = log_event.mark_in
@@ -40,6 +40,7 @@ from editorstate import current_sequence
 import editorstate
 import gui
 import jackaudio
+import mediacache
 import mltenv
 import mltfilters
 import mlttransitions
@@ -95,6 +96,8 @@ class RecreateIconsThread(threading.Thread):
         recreate_progress_window.destroy()
         time.sleep(0.3)
         gtk.gdk.threads_leave()
+
+        mediacache.save()
         
         gtk.gdk.threads_enter()
         gui.media_list_view.fill_data_model()
@@ -0,0 +1,254 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module creates MLT objects for sequences, filters, compositors and pattern producers
+from saved values.
+
+Module does not import gtk or other GUI modules, so these same functions are used
+when projects are built in application by sequence.py, mltfilters.py, mlttransitions.py
+and patternproducer.py, and when projects are rendered without GUI by headlessproject.py.
+Created MLT objects are kept alive with mltrefhold.py.
+"""
+
+import xml.dom.minidom
+
+import mlt
+
+import appconsts
+import mltrefhold
+import propertyparse
+import respaths
+
+AUDIO_MIX_DOWN_TRACK = 0
+
+# Pattern producer types
+UNDEFINED = 0
+COLOR_CLIP = 1
+NOISE_CLIP = 2
+EBUBARS_CLIP = 3
+ISING_CLIP = 4
+COLOR_PULSE_CLIP = 5
+
+MUTE_FILTER_SERVICE = "volume"
+
+
+# --------------------------------------------------- sequence
+def create_gain_filter(profile, gain):
+    gain_filter = mlt.Filter(profile, "volume")
+    mltrefhold.hold_ref(gain_filter)
+    gain_filter.set("gain", str(gain))
+    return gain_filter
+
+def create_pan_filter(profile, value):
+    pan_filter = mlt.Filter(profile, "panner")
+    mltrefhold.hold_ref(pan_filter)
+    pan_filter.set("start", value)
+    return pan_filter
+
+def create_audio_mix_transition(profile, track_index):
+    """
+    Returns transition that combines audio of track with audio mix down track.
+    """
+    transition = mlt.Transition(profile, "mix")
+    mltrefhold.hold_ref(transition)
+    transition.set("a_track", int(AUDIO_MIX_DOWN_TRACK))
+    transition.set("b_track", track_index)
+    transition.set("always_active", 1)
+    transition.set("combine", 1)
+    return transition
+
+def create_watermark_filter(profile, watermark_file_path):
+    watermark = mlt.Filter(profile, "watermark")
+    mltrefhold.hold_ref(watermark)
+    watermark.set("resource", str(watermark_file_path))
+    watermark.set("composite.always_active", 1)
+    return watermark
+
+
+# --------------------------------------------------- filters
+def create_filter(profile, service_id, properties=[]):
+    mlt_filter = mlt.Filter(profile, str(service_id))
+    mltrefhold.hold_ref(mlt_filter)
+    set_properties(mlt_filter, properties)
+    return mlt_filter
+
+def set_properties(mlt_service, properties):
+    for name, value, prop_type in properties:
+        mlt_service.set(str(name), str(value)) # new const strings are created from values
+
+def set_filter_active(mlt_filter, active):
+    if active == True:
+        mlt_filter.set("disable", str(0))
+    else:
+        mlt_filter.set("disable", str(1))
+
+def parse_keyframes(kf_string):
+    """
+    Returns list of (frame, value) tuples for multipart filter value string.
+    """
+    value = kf_string.strip('"') # for some reason we have to use " around values or something broke
+    kfs = []
+    for part in value.split(";"):
+        tokens = part.split("=")
+        kfs.append((tokens[0], tokens[1]))
+    return kfs
+
+def create_multipart_filters(profile, service_id, keyframes):
+    """
+    Returns filter parts for keyframes, values are set with set_multipart_filters_values().
+    """
+    mlt_filters = []
+    for i in range(0, len(keyframes) - 1): # Theres one less filter parts than keyframes
+        mlt_filter = mlt.Filter(profile, str(service_id))
+        mltrefhold.hold_ref(mlt_filter)
+        mlt_filters.append(mlt_filter)
+    return mlt_filters
+
+def set_multipart_filters_values(mlt_filters, properties, multipart_desc, keyframes):
+    args, start_property, end_property = multipart_desc
+    for i in range(0, len(keyframes) - 1):
+        start_frame, start_value = keyframes[i]
+        end_frame, end_value = keyframes[i + 1]
+
+        mlt_filter = mlt_filters[i]
+
+        # Set all property values to defaults
+        set_properties(mlt_filter, properties)
+
+        # set in and out points
+        mlt_filter.set("in", str(start_frame))
+        end_frame = int(end_frame) - 1
+        mlt_filter.set("out", str(end_frame))
+
+        # set start and end values
+        mlt_filter.set(str(start_property), str(start_value)) # Value at start of filter part
+        mlt_filter.set(str(end_property), str(end_value)) # Value at end of filter part
+
+def set_mute_values(mute_filter):
+    """
+    Sets values that mute audio for filter created with MUTE_FILTER_SERVICE properties.
+    """
+    mute_filter.set("gain", "0")
+    mute_filter.set("end", "0")
+
+def load_mute_filter_properties():
+    """
+    Returns properties of MUTE_FILTER_SERVICE filter in filters.xml.
+    """
+    filters_doc = xml.dom.minidom.parse(respaths.FILTERS_XML_DOC)
+    for f_node in filters_doc.getElementsByTagName("filter"):
+        if f_node.getAttribute("id") == MUTE_FILTER_SERVICE:
+            return propertyparse.node_list_to_properties_array(f_node.getElementsByTagName(appconsts.PROPERTY))
+    return []
+
+
+# --------------------------------------------------- compositors
+def create_compositor_transition(profile, service_id):
+    transition = mlt.Transition(profile, str(service_id))
+    mltrefhold.hold_ref(transition)
+    set_compositor_default_values(transition, service_id)
+    return transition
+
+def set_compositor_default_values(transition, service_id):
+    if service_id == "composite" or service_id == "region":
+        transition.set("automatic",1)
+        transition.set("aligned", 1)
+        transition.set("deinterlace",0)
+        transition.set("distort",0)
+        transition.set("fill",1)
+        transition.set("operator","over")
+        transition.set("luma_invert",0)
+        transition.set("progressive",1)
+        transition.set("softness",0)
+    elif service_id == "affine":
+        transition.set("distort",0)
+        transition.set("automatic",1)
+        transition.set("keyed",1)
+    elif service_id == "luma":
+        transition.set("automatic",1)
+        transition.set("invert",0)
+        transition.set("reverse",0)
+        transition.set("softness",0)
+    else:
+        transition.set("automatic",1)
+
+
+# --------------------------------------------------- pattern producers
+def create_pattern_producer(profile, create_data):
+    """
+    Creates producer for saved pattern producer creation data, returns None for unknown types.
+    """
+    pattern_type = create_data.patter_producer_type
+    if pattern_type == COLOR_CLIP:
+        return create_color_producer(profile, create_data.gdk_color_str)
+    elif pattern_type == NOISE_CLIP:
+        return create_noise_producer(profile)
+    elif pattern_type == EBUBARS_CLIP:
+        return create_ebubars_producer(profile)
+    elif pattern_type == ISING_CLIP:
+        return create_ising_producer(profile, create_data.temp, create_data.bg, create_data.sg)
+    elif pattern_type == COLOR_PULSE_CLIP:
+        return create_color_pulse_producer(profile, create_data.s1, create_data.s2, create_data.s3,
+                                           create_data.s4, create_data.m1, create_data.m2)
+    return None
+
+def create_color_producer(profile, gdk_color_str):
+    producer = mlt.Producer(profile, "colour", gdk_color_str_to_mlt_color_str(gdk_color_str))
+    mltrefhold.hold_ref(producer)
+    return producer
+
+def create_noise_producer(profile):
+    producer = mlt.Producer(profile, "frei0r.nois0r")
+    mltrefhold.hold_ref(producer)
+    return producer
+
+def create_ebubars_producer(profile):
+    producer = mlt.Producer(profile, respaths.PATTERN_PRODUCER_PATH + "ebubars.png")
+    mltrefhold.hold_ref(producer)
+    return producer
+
+def create_ising_producer(profile, temp, bg, sg):
+    producer = mlt.Producer(profile, "frei0r.ising0r")
+    producer.set("Temperature", str(temp))
+    producer.set("Border Growth", str(bg))
+    producer.set("Spontaneous Growth", str(sg))
+    mltrefhold.hold_ref(producer)
+    return producer
+
+def create_color_pulse_producer(profile, s1, s2, s3, s4, m1, m2):
+    producer = mlt.Producer(profile, "frei0r.plasma")
+    producer.set("1_speed", str(s1))
+    producer.set("2_speed", str(s2))
+    producer.set("3_speed", str(s3))
+    producer.set("4_speed", str(s4))
+    producer.set("1_move", str(m1))
+    producer.set("2_move", str(m2))
+    mltrefhold.hold_ref(producer)
+    return producer
+
+def gdk_color_str_to_mlt_color_str(gdk_color_str):
+    value = gdk_color_str.lstrip('#')
+    lv = len(value)
+    raw_r, raw_g, raw_b = tuple(int(value[i:i+lv/3], 16) for i in range(0, lv, lv/3))
+    val_str = "#" + hex(int((float(raw_r) * 255.0) / 65535.0))[2:] + \
+                    hex(int((float(raw_g) * 255.0) / 65535.0))[2:] + \
+                    hex(int((float(raw_b) * 255.0) / 65535.0))[2:]
+    return val_str
@@ -27,13 +27,12 @@ import pygtk
 pygtk.require('2.0');
 import gtk
 
-import mlt
 import xml.dom.minidom
 
 import appconsts
 import editorstate
 from editorstate import PROJECT
-import mltrefhold
+import mltbuild
 import propertyparse
 import respaths
 import translations
@@ -220,24 +219,17 @@ class FilterObject:
         propertyparse.replace_value_keywords(self.properties, PROJECT().profile)
     
     def create_mlt_filter(self, mlt_profile):
-        self.mlt_filter = mlt.Filter(mlt_profile, str(self.info.mlt_service_id))
-        mltrefhold.hold_ref(self.mlt_filter)
-        self.update_mlt_filter_properties_all()
+        self.mlt_filter = mltbuild.create_filter(mlt_profile, self.info.mlt_service_id, self.properties)
     
     def update_mlt_filter_properties_all(self):
         """
         Called at creation time and when loaded to set all mlt properties
         of a compositor filter to correct values.
         """
-        for prop in self.properties:
-            name, value, prop_type = prop
-            self.mlt_filter.set(str(name), str(value)) # new const strings are created from values
+        mltbuild.set_properties(self.mlt_filter, self.properties)
     
     def update_mlt_disabled_value(self):
-        if self.active == True:
-             self.mlt_filter.set("disable", str(0))
-        else:
-             self.mlt_filter.set("disable", str(1))
+        mltbuild.set_filter_active(self.mlt_filter, self.active)
     
     def reset_values(self,  mlt_profile=None, clip=None): #multipartfilters need profile and clip
         for i in range(0, len(self.properties)):
@@ -295,49 +287,20 @@ class MultipartFilterObject:
         self.value = kf_str
 
     def create_filters_for_keyframes(self, keyframes, mlt_profile):
-        for i in range(0, len(keyframes) - 1): # Theres one less filter parts than keyframes
-            mlt_filter = mlt.Filter(mlt_profile, str(self.info.mlt_service_id))
-            mltrefhold.hold_ref(mlt_filter)
-            self.mlt_filters.append(mlt_filter)
+        self.mlt_filters.extend(mltbuild.create_multipart_filters(mlt_profile, self.info.mlt_service_id, keyframes))
             
     def update_mlt_filters_values(self, keyframes):
         """
         Called obove at creation time and when loaded to set all mlt properties
         of all filters
         """
-        args, start_property, end_property = self.info.multipart_desc
-        for i in range(0, len(keyframes) - 1):
-            start_frame, start_value = keyframes[i]
-            end_frame, end_value = keyframes[i + 1]
-
-            mlt_filter = self.mlt_filters[i]
-
-            # Set all property values to defaults
-            for property in self.properties:
-                name, val, type = property
-                mlt_filter.set(str(name), str(val))
-                
-            # set in and out points
-            mlt_filter.set("in", str(start_frame))
-            end_frame = int(end_frame) - 1
-            mlt_filter.set("out", str(end_frame))
-            
-            # set start and end values
-            mlt_filter.set(str(start_property), str(start_value)) # Value at start of filter part
-            mlt_filter.set(str(end_property), str(end_value)) # Value at end of filter part
+        mltbuild.set_multipart_filters_values(self.mlt_filters, self.properties, self.info.multipart_desc, keyframes)
 
     def _parse_value_to_keyframes(self):
         return self._parse_string_to_keyframes(self.value)
         
     def _parse_string_to_keyframes(self, kf_string):
-        # returs list of (frame, value) tuples
-        value = kf_string.strip('"') # for some reason we have to use " around values or something broke
-        parts = value.split(";")
-        kfs = []
-        for part in parts:
-            tokens = part.split("=")
-            kfs.append((tokens[0],tokens[1]))
-        return kfs
+        return mltbuild.parse_keyframes(kf_string)
     
     def attach_all_mlt_filters(self, clip):
         for f in self.mlt_filters:
@@ -348,12 +311,8 @@ class MultipartFilterObject:
             clip.detach(f)
 
     def update_mlt_disabled_value(self):
-        if self.active == True:
-            for f in self.mlt_filters:
-                f.set("disable", str(0))
-        else:
-            for f in self.mlt_filters:
-                f.set("disable", str(1))
+        for f in self.mlt_filters:
+            mltbuild.set_filter_active(f, self.active)
     
     def reset_values(self, mlt_profile, clip):
         self.value = copy.deepcopy(self.info.multipart_value)
@@ -394,7 +353,7 @@ def load_filters_xml(services):
             not_found_filters.append(filter_info)
             continue
 
-        if filter_info.mlt_service_id == "volume": # we need this filter to do mutes so save reference to it
+        if filter_info.mlt_service_id == mltbuild.MUTE_FILTER_SERVICE: # we need this filter to do mutes so save reference to it
             global _volume_filter_info
             _volume_filter_info = filter_info
 
@@ -527,8 +486,7 @@ def print_not_found_filters():
 # ------------------------------------------------------------- mute filters
 def create_mute_volume_filter(seq):    
     mute_filter = seq.create_filter(get_volume_filters_info())
-    mute_filter.mlt_filter.set("gain","0")
-    mute_filter.mlt_filter.set("end","0")
+    mltbuild.set_mute_values(mute_filter.mlt_filter)
     return mute_filter
 
 def do_clip_mute(clip, volume_filter):
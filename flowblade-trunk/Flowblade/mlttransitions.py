@@ -28,6 +28,7 @@ import os
 import xml.dom.minidom
 
 import appconsts
+import mltbuild
 import mltrefhold
 import patternproducer
 import propertyparse
@@ -205,11 +206,7 @@ class CompositorTransition:
         self.b_track = -1 # from, source
     
     def create_mlt_transition(self, mlt_profile):
-        transition = mlt.Transition(mlt_profile, 
-                                   str(self.info.mlt_service_id))
-        mltrefhold.hold_ref(transition)
-        self.mlt_transition = transition
-        self.set_default_values()
+        self.mlt_transition = mltbuild.create_compositor_transition(mlt_profile, self.info.mlt_service_id)
         
         # PROP_EXPR values may have keywords that need to be replaced with
         # numerical values that depend on the profile we have. These need
@@ -219,52 +216,7 @@ class CompositorTransition:
         self.update_editable_mlt_properties()
 
     def set_default_values(self):
-        if self.info.mlt_service_id == "composite":
-            self._set_composite_service_default_values() 
-        elif self.info.mlt_service_id == "affine":
-            self._set_affine_service_default_values()
-        elif self.info.mlt_service_id == "luma":
-            self._set_luma_service_default_values()
-        elif self.info.mlt_service_id == "region":
-            self._set_region_service_default_values()
-        else:
-            self._set_blend_service_default_values()
-        
-    def _set_composite_service_default_values(self):
-        self.mlt_transition.set("automatic",1)
-        self.mlt_transition.set("aligned", 1)
-        self.mlt_transition.set("deinterlace",0)
-        self.mlt_transition.set("distort",0)
-        self.mlt_transition.set("fill",1)
-        self.mlt_transition.set("operator","over")
-        self.mlt_transition.set("luma_invert",0)
-        self.mlt_transition.set("progressive",1)
-        self.mlt_transition.set("softness",0)
-
-    def _set_affine_service_default_values(self):
-        self.mlt_transition.set("distort",0)
-        self.mlt_transition.set("automatic",1)
-        self.mlt_transition.set("keyed",1)
-   
-    def _set_luma_service_default_values(self):
-        self.mlt_transition.set("automatic",1)
-        self.mlt_transition.set("invert",0)
-        self.mlt_transition.set("reverse",0)
-        self.mlt_transition.set("softness",0)
-
-    def _set_region_service_default_values(self):
-        self.mlt_transition.set("automatic",1)
-        self.mlt_transition.set("aligned",1)
-        self.mlt_transition.set("deinterlace",0)
-        self.mlt_transition.set("distort",0)
-        self.mlt_transition.set("fill",1)
-        self.mlt_transition.set("operator","over")
-        self.mlt_transition.set("luma_invert",0)
-        self.mlt_transition.set("progressive",1)
-        self.mlt_transition.set("softness",0)
-  
-    def _set_blend_service_default_values(self):
-        self.mlt_transition.set("automatic",1)
+        mltbuild.set_compositor_default_values(self.mlt_transition, self.info.mlt_service_id)
     
     def set_tracks(self, a_track, b_track):
         self.a_track = a_track
@@ -282,9 +234,7 @@ class CompositorTransition:
         self.mlt_transition.set("force_track",str(fval))
 
     def update_editable_mlt_properties(self):
-        for prop in self.properties:
-            name, value, prop_type = prop
-            self.mlt_transition.set(str(name), str(value)) # new const strings are created from values
+        mltbuild.set_properties(self.mlt_transition, self.properties)
 
 
 class CompositorObject:
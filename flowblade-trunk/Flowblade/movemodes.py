@@ -176,7 +176,7 @@ def insert_move_move(x, y, frame, state):
 
     _move_mode_move(frame, x, y)
     
-    updater.repaint_tline()
+    updater.repaint_tline_overlay()
 
 def insert_move_release(x, y, frame, state):
     """
@@ -244,6 +244,7 @@ def insert_move_release(x, y, frame, state):
             PLAYER().seek_frame(track.clip_start(select_index), False)
         else:
             _move_mode_released()
+            updater.repaint_tline()
     else: # insert to different track 
         data["to_track"] = to_track
         clear_selected_clips()
@@ -251,11 +252,11 @@ def insert_move_release(x, y, frame, state):
         action.do_edit()
         PLAYER().seek_frame(to_track.clip_start(insert_index), False)
 
-    # Clear edit mode data
+    # Clear edit mode data, edit action repaints areas it changed
     edit_data = None
     tlinewidgets.set_edit_mode_data(edit_data)
     
-    updater.repaint_tline()
+    updater.repaint_tline_overlay()
 
 # --------------------------------- OVERWRITE MOVE EVENTS
 def overwrite_move_press(event, frame):
@@ -304,7 +305,7 @@ def overwrite_move_move(x, y, frame, state):
         edit_data["over_in"] = over_in
         edit_data["over_out"] = over_out
 
-    updater.repaint_tline()
+    updater.repaint_tline_overlay()
 
 def overwrite_move_release(x, y, frame, state):
     """
@@ -361,6 +362,7 @@ def overwrite_move_release(x, y, frame, state):
             PLAYER().seek_frame(over_in, False)
         else:
             _move_mode_released()
+            updater.repaint_tline()
     else: # Moved to different track
         data["to_track"] = to_track
         clear_selected_clips()
@@ -369,11 +371,11 @@ def overwrite_move_release(x, y, frame, state):
 
         PLAYER().seek_frame(over_in, False)
 
-    # Clear edit mode data
+    # Clear edit mode data, edit action repaints areas it changed
     edit_data = None
     tlinewidgets.set_edit_mode_data(edit_data)
     
-    updater.repaint_tline()
+    updater.repaint_tline_overlay()
 
 
 # ------------------------------------- MOVE MODES EVENTS
@@ -237,7 +237,7 @@ def mouse_move(x, y, frame, state):
     global edit_data
     edit_data["current_frame"] = frame
 
-    updater.repaint_tline()
+    updater.repaint_tline_overlay()
     
 def mouse_release(x, y, frame, state):
     if mouse_disabled:
@@ -261,5 +261,5 @@ def mouse_release(x, y, frame, state):
     edit_data = None
     tlinewidgets.set_edit_mode_data(edit_data)
     
-    updater.repaint_tline()
+    updater.repaint_tline_overlay() # edit action repaints areas it changed
 
@@ -26,24 +26,22 @@ import pygtk
 pygtk.require('2.0');
 import gtk
 
-import mlt
-
 import appconsts
 import dialogutils
 import guiutils
 from editorstate import PROJECT
 import gui
-import mltrefhold
+import mltbuild
 import respaths
 import utils
 
 # Pattern producer types
-UNDEFINED = 0
-COLOR_CLIP = 1
-NOISE_CLIP = 2
-EBUBARS_CLIP = 3
-ISING_CLIP = 4
-COLOR_PULSE_CLIP = 5
+UNDEFINED = mltbuild.UNDEFINED
+COLOR_CLIP = mltbuild.COLOR_CLIP
+NOISE_CLIP = mltbuild.NOISE_CLIP
+EBUBARS_CLIP = mltbuild.EBUBARS_CLIP
+ISING_CLIP = mltbuild.ISING_CLIP
+COLOR_PULSE_CLIP = mltbuild.COLOR_PULSE_CLIP
 
 # ---------------------------------------------------- create callbacks
 def create_color_clip():
@@ -138,33 +136,16 @@ We originally did producer creation using elifs and now using pickle() for save/
 requires keeping this around until atleast 2017 for backwards compatibility.
 """
 def _create_patten_producer_old_style(profile, bin_clip):
+    clip = mltbuild.create_pattern_producer(profile, bin_clip)
     if bin_clip.patter_producer_type == COLOR_CLIP:
-        clip = create_color_producer(profile, bin_clip.gdk_color_str)
-    elif bin_clip.patter_producer_type == NOISE_CLIP:
-        clip = _create_noise_producer(profile)
-    elif bin_clip.patter_producer_type == EBUBARS_CLIP:
-        clip = _create_ebubars_producer(profile)
-    
+        clip.gdk_color_str = bin_clip.gdk_color_str
     return clip
 
 def create_color_producer(profile, gdk_color_str):
-    mlt_color = utils.gdk_color_str_to_mlt_color_str(gdk_color_str)
-
-    producer = mlt.Producer(profile, "colour", mlt_color)
-    mltrefhold.hold_ref(producer)
+    producer = mltbuild.create_color_producer(profile, gdk_color_str)
     producer.gdk_color_str = gdk_color_str
 
     return producer
-        
-def _create_noise_producer(profile):
-    producer = mlt.Producer(profile, "frei0r.nois0r")
-    mltrefhold.hold_ref(producer)
-    return producer
-
-def _create_ebubars_producer(profile):
-    producer = mlt.Producer(profile, respaths.PATTERN_PRODUCER_PATH + "ebubars.png")
-    mltrefhold.hold_ref(producer)
-    return producer
 
 # --------------------------------------------------- END DECPRECATED producer create methods
 
@@ -196,6 +177,9 @@ class AbstractBinClip: # wtf not extends projectdata.MediaFile?
     def create_icon(self):
         print "patter producer create_icon() not implemented"
 
+    def get_icon(self):
+        return self.icon
+
 class BinColorClip(AbstractBinClip):
     """
     Color Clip that can added to and edited in Sequence.
@@ -206,13 +190,7 @@ class BinColorClip(AbstractBinClip):
         self.patter_producer_type = COLOR_CLIP
 
     def create_mlt_producer(self, profile):
-        mlt_color = utils.gdk_color_str_to_mlt_color_str(self.gdk_color_str)
-
-        producer = mlt.Producer(profile, "colour", mlt_color)
-        mltrefhold.hold_ref(producer)
-        producer.gdk_color_str = self.gdk_color_str
-
-        return producer
+        return create_color_producer(profile, self.gdk_color_str)
 
     def create_icon(self):
         icon = gtk.gdk.Pixbuf(gtk.gdk.COLORSPACE_RGB, False, 8, appconsts.THUMB_WIDTH, appconsts.THUMB_HEIGHT)
@@ -226,9 +204,7 @@ class BinNoiseClip(AbstractBinClip):
         self.patter_producer_type = NOISE_CLIP
 
     def create_mlt_producer(self, profile):
-        producer = mlt.Producer(profile, "frei0r.nois0r")        
-        mltrefhold.hold_ref(producer)
-        return producer
+        return mltbuild.create_noise_producer(profile)
     
     def create_icon(self):
         self.icon = gtk.gdk.pixbuf_new_from_file(respaths.PATTERN_PRODUCER_PATH + "noise_icon.png")
@@ -239,9 +215,7 @@ class BinColorBarsClip(AbstractBinClip):
         self.patter_producer_type = EBUBARS_CLIP
 
     def create_mlt_producer(self, profile):
-        producer = mlt.Producer(profile, respaths.PATTERN_PRODUCER_PATH + "ebubars.png")
-        mltrefhold.hold_ref(producer)
-        return producer
+        return mltbuild.create_ebubars_producer(profile)
 
     def create_icon(self):
         self.icon = gtk.gdk.pixbuf_new_from_file(respaths.PATTERN_PRODUCER_PATH + "bars_icon.png")
@@ -257,12 +231,7 @@ class BinIsingClip(AbstractBinClip):
         self.sg = sg
 
     def create_mlt_producer(self, profile):
-        producer = mlt.Producer(profile, "frei0r.ising0r")
-        producer.set("Temperature", str(self.temp))
-        producer.set("Border Growth", str(self.bg))
-        producer.set("Spontaneous Growth", str(self.sg))
-        mltrefhold.hold_ref(producer)
-        return producer
+        return mltbuild.create_ising_producer(profile, self.temp, self.bg, self.sg)
 
     def create_icon(self):
         self.icon = gtk.gdk.pixbuf_new_from_file(respaths.PATTERN_PRODUCER_PATH + "ising_icon.png")
@@ -281,15 +250,7 @@ class BinColorPulseClip(AbstractBinClip):
         self.m2 = m2
 
     def create_mlt_producer(self, profile):
-        producer = mlt.Producer(profile, "frei0r.plasma")
-        producer.set("1_speed", str(self.s1))
-        producer.set("2_speed", str(self.s2))
-        producer.set("3_speed", str(self.s3))
-        producer.set("4_speed", str(self.s4))
-        producer.set("1_move", str(self.m1))
-        producer.set("2_move", str(self.m2))
-        mltrefhold.hold_ref(producer)
-        return producer
+        return mltbuild.create_color_pulse_producer(profile, self.s1, self.s2, self.s3, self.s4, self.m1, self.m2)
 
     def create_icon(self):
         self.icon = gtk.gdk.pixbuf_new_from_file(respaths.PATTERN_PRODUCER_PATH + "color_pulse_icon.png")
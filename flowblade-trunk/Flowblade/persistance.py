@@ -33,8 +33,9 @@ import gtk
 
 import copy
 import fnmatch
+import multiprocessing
 import os
-import pickle
+import threading
 import time
 
 import appconsts
@@ -44,15 +45,18 @@ import mltprofiles
 import mltfilters
 import mlttransitions
 import miscdataobjects
+import producerpool
+import projectfile
 import propertyparse
 import resync
+import sequence
 
 # Unpickleable attributes for all objects
 # These are removed at save and recreated at load.
-PROJECT_REMOVE = ['profile','c_seq']
-SEQUENCE_REMOVE = ['profile','field','multitrack','tractor','monitor_clip','vectorscope','audiowave','rgbparade','outputfilter','watermark_filter']
-PLAY_LIST_REMOVE = ['this','sequence','get_name','gain_filter','pan_filter']
-CLIP_REMOVE = ['this','clip_length']
+PROJECT_REMOVE = ['profile','c_seq','media_files_by_path','media_files_by_proxy_path','media_file_index_keys']
+SEQUENCE_REMOVE = ['mlt_build_pending','profile','field','multitrack','tractor','monitor_clip','vectorscope','audiowave','rgbparade','outputfilter','watermark_filter','compositor_index']
+PLAY_LIST_REMOVE = ['this','sequence','get_name','gain_filter','pan_filter','clip_index']
+CLIP_REMOVE = ['this','clip_length','pool_key','pool_retained']
 TRANSITION_REMOVE = ['this']
 FILTER_REMOVE = ['mlt_filter','mlt_filters']
 MEDIA_FILE_REMOVE = ['icon']
@@ -77,6 +81,20 @@ show_messages = True
 # Path of file being loaded, global for convenience. Used toimplement relative paths search on load
 _load_file_path = None
 
+# Media for clips is opened in worker threads before sequences are built
+try:
+    LOAD_WORKERS_COUNT = max(1, min(multiprocessing.cpu_count(), 8))
+except NotImplementedError:
+    LOAD_WORKERS_COUNT = 2
+
+# Load progress bar fraction at start of each load phase
+MEDIA_PHASE_START = 0.0
+SEQUENCES_PHASE_START = 0.5
+
+# Progress of sequence building phase
+_clips_count = 0
+_clips_built = 0
+
 # Used to change media item and clip paths when saving backup snapshot.
 # 'snapshot_paths != None' flags that snapsave is being done and paths need to be replaced 
 snapshot_paths = None
@@ -108,13 +126,30 @@ def _show_msg(msg, delay=0.0):
         time.sleep(delay)
         gtk.gdk.threads_leave()
 
+def _show_progress(phase_start, phase_end, fraction):
+    if show_messages == True:
+        gtk.gdk.threads_enter()
+        load_dialog.progress_bar.set_fraction(phase_start + (phase_end - phase_start) * fraction)
+        gtk.gdk.threads_leave()
+
 # -------------------------------------------------- SAVE
 def save_project(project, file_path):
     """
-    Creates pickleable project object
+    Creates pickleable project object and writes it to file
     """
     print "Save project " + os.path.basename(file_path)
     
+    s_proj = get_p_project(project)
+
+    # Write out file.
+    projectfile.write_project(file_path, s_proj)
+
+def get_p_project(project, pickled_sequences=None):
+    """
+    Creates pickleable project object.
+    pickled_sequences is dict id(sequence) -> projectfile.PickledSection for sequences
+    that are known to be unchanged since they were last pickled.
+    """
     # Get shallow copy
     s_proj = copy.copy(project)
     
@@ -126,9 +161,7 @@ def save_project(project, file_path):
     s_proj.SAVEFILE_VERSION = appconsts.SAVEFILE_VERSION
 
     # Init proxy convert data
-    global project_proxy_mode, proxy_path_dict
-    project_proxy_mode = s_proj.proxy_data.proxy_mode
-    proxy_path_dict = {}
+    _init_proxy_convert(s_proj.proxy_data.proxy_mode)
 
     # Replace media file objects with pickleable copys
     media_files = {}
@@ -154,19 +187,55 @@ def save_project(project, file_path):
         media_files[s_media_file.id] = s_media_file
     s_proj.media_files = media_files
 
-    # Replace sequences with pickleable objects
+    # Replace sequences with pickleable objects.
+    # Already pickled sequences and sequences not unpickled since load are written back
+    # unchanged without loading them, unless clip paths need converting.
+    convert_paths = (snapshot_paths != None or project_proxy_mode == appconsts.CONVERTING_TO_USE_PROXY_MEDIA
+                     or project_proxy_mode == appconsts.CONVERTING_TO_USE_ORIGINAL_MEDIA)
     sequences = []
     for i in range(0, len(project.sequences)):
         add_seq = project.sequences[i]
-        sequences.append(get_p_sequence(add_seq))
+        pickled_seq = None
+        if not convert_paths:
+            if pickled_sequences != None:
+                pickled_seq = pickled_sequences.get(id(add_seq))
+            if pickled_seq == None:
+                pickled_seq = projectfile.get_lazy_sequence_section(add_seq)
+        if pickled_seq != None:
+            sequences.append(pickled_seq)
+        elif is_mlt_build_pending(add_seq):
+            sequences.append(get_p_unbuilt_sequence(add_seq))
+        else:
+            sequences.append(get_p_sequence(add_seq))
     s_proj.sequences = sequences
 
     # Remove unpickleable attributes
     remove_attrs(s_proj, PROJECT_REMOVE)
 
-    # Write out file.
-    write_file = file(file_path, "wb")
-    pickle.dump(s_proj, write_file)
+    return s_proj
+
+def get_p_sequence_tracks(project, seq, track_indexes):
+    """
+    Creates pickleable copies of tracks of sequence, used to save edits in autosave journal.
+    Returns dict track index -> pickleable track.
+    """
+    _init_proxy_convert(project.proxy_data.proxy_mode)
+    p_tracks = {}
+    for i in track_indexes:
+        p_tracks[i] = get_p_playlist(seq.tracks[i])
+    return p_tracks
+
+def get_p_current_sequence(project):
+    """
+    Creates pickleable copy of current sequence, used to save edits in autosave journal.
+    """
+    _init_proxy_convert(project.proxy_data.proxy_mode)
+    return get_p_sequence(project.c_seq)
+
+def _init_proxy_convert(proxy_mode):
+    global project_proxy_mode, proxy_path_dict
+    project_proxy_mode = proxy_mode
+    proxy_path_dict = {}
 
 def get_p_sequence(sequence):
     """
@@ -190,6 +259,29 @@ def get_p_sequence(sequence):
 
     return s_seq
 
+def get_p_unbuilt_sequence(sequence):
+    """
+    Creates pickleable sequence object from sequence that has no MLT objects yet.
+    Tracks, clips and compositors are already pickleable, only clip paths may need converting.
+    """
+    s_seq = copy.copy(sequence)
+    
+    tracks = []
+    for track in sequence.tracks:
+        s_track = copy.copy(track)
+        s_track.clips = []
+        for clip in track.clips:
+            s_clip = copy.copy(clip)
+            _convert_clip_path(s_clip)
+            s_track.clips.append(s_clip)
+        remove_attrs(s_track, PLAY_LIST_REMOVE)
+        tracks.append(s_track)
+    s_seq.tracks = tracks
+
+    remove_attrs(s_seq, SEQUENCE_REMOVE)
+
+    return s_seq
+
 def get_p_playlist(playlist):
     """
     Creates pickleable version of MLT Playlist
@@ -247,6 +339,11 @@ def get_p_clip(clip):
     # Add pickleable filters
     s_clip.filters = filters
     
+    _convert_clip_path(s_clip)
+
+    return s_clip
+
+def _convert_clip_path(s_clip):
     # Do proxy mode convert if needed
     if (project_proxy_mode == appconsts.CONVERTING_TO_USE_PROXY_MEDIA or 
         project_proxy_mode == appconsts.CONVERTING_TO_USE_ORIGINAL_MEDIA):
@@ -262,8 +359,6 @@ def get_p_clip(clip):
     except:
         pass
 
-    return s_clip
-
 def get_p_filter(f):
     """
     Creates pickleable version MLT Filter object.
@@ -307,9 +402,9 @@ def remove_attrs(obj, remove_attrs):
 def load_project(file_path, icons_and_thumnails=True):
     _show_msg("Unpickling")
 
-    # Load project object
-    f = open(file_path)
-    project = pickle.load(f)
+    # Load project object, older project files are single pickled project objects.
+    # Sequences other than current one are unpickled when first used.
+    project = projectfile.open_project_file(file_path).get_lazy_project(lambda seq: _lazy_sequence_loaded(seq, project))
 
     global _load_file_path
     _load_file_path = file_path
@@ -331,24 +426,21 @@ def load_project(file_path, icons_and_thumnails=True):
     if project.profile == None:
         raise ProjectProfileNotFoundError(project.profile_desc)
 
-    # Add MLT objects to sequences.
-    global all_clips, sync_clips
-    for seq in project.sequences:
-        FIX_N_TO_3_SEQUENCE_COMPATIBILITY(seq)
-        _show_msg(_("Building sequence ") + seq.name)
-        all_clips = {}
-        sync_clips = []
-                
-        seq.profile = project.profile
-        fill_sequence_mlt(seq, project.SAVEFILE_VERSION)
-
-        handle_seq_watermark(seq)
+    # Only current sequence gets its MLT objects on load, other sequences are kept as
+    # python objects and are built when they are first displayed, see build_sequence_mlt().
+    c_seq = project.sequences[project.c_seq_index]
+    loaded_sequences = [seq for seq in project.sequences if not projectfile.is_lazy_sequence(seq)]
+    for seq in loaded_sequences:
+        _prepare_sequence(seq, project)
 
-        if not hasattr(seq, "seq_len"):
-            seq.update_edit_tracks_length()
+    # Resolve clip media paths and open media for current sequence in worker threads,
+    # clips are then created from opened media when sequence is built in order.
+    _show_msg(_("Opening media"))
+    _open_clips_media(loaded_sequences, [c_seq], project.profile)
 
-    all_clips = {}
-    sync_clips = []
+    # Add MLT objects to current sequence.
+    _show_msg(_("Building sequence ") + c_seq.name)
+    _build_sequence(c_seq)
 
     for k, media_file in project.media_files.iteritems():
         if project.SAVEFILE_VERSION < 4:
@@ -356,12 +448,13 @@ def load_project(file_path, icons_and_thumnails=True):
         media_file.current_frame = 0 # this is always reset on load, value is not considered persistent
         if media_file.type != appconsts.PATTERN_PRODUCER:
             media_file.path = get_media_asset_path(media_file.path, _load_file_path)
-            
-    # Add icons to media files
+    project.init_media_file_index()
+
+    # Add icons to pattern producers, media file icons are loaded when first displayed
     if icons_and_thumnails == True:
-        _show_msg(_("Loading icons"))
         for k, media_file in project.media_files.iteritems():
-            media_file.create_icon()
+            if media_file.type == appconsts.PATTERN_PRODUCER:
+                media_file.create_icon()
     
     project.c_seq = project.sequences[project.c_seq_index]
     if icons_and_thumnails == True:
@@ -369,7 +462,132 @@ def load_project(file_path, icons_and_thumnails=True):
 
     return project
 
-def fill_sequence_mlt(seq, SAVEFILE_VERSION):
+def _prepare_sequence(seq, project):
+    FIX_N_TO_3_SEQUENCE_COMPATIBILITY(seq)
+    fix_sequence_compositors(seq, project.SAVEFILE_VERSION)
+    seq.profile = project.profile
+    seq.mlt_build_pending = True
+
+def _lazy_sequence_loaded(seq, project):
+    """
+    Called when sequence left unpickled on load is first used.
+    """
+    global show_messages
+    old_show_messages = show_messages
+    show_messages = False # Load dialog is gone and we may be holding gtk lock
+    try:
+        _prepare_sequence(seq, project)
+        # Clip paths are resolved so that media usage checks see same paths as in media files,
+        # missing media is reported when sequence is built.
+        resolved_paths = {}
+        for track in seq.tracks:
+            for clip in track.clips:
+                if clip.is_blanck_clip == True or clip.media_type == appconsts.PATTERN_PRODUCER:
+                    continue
+                if not clip.path in resolved_paths:
+                    resolved_path = get_media_asset_path(clip.path, _load_file_path)
+                    if resolved_path == NOT_FOUND:
+                        resolved_path = clip.path
+                    resolved_paths[clip.path] = resolved_path
+                clip.path = resolved_paths[clip.path]
+    finally:
+        show_messages = old_show_messages
+
+def build_sequence_mlt(seq):
+    """
+    Creates MLT objects for a sequence that was left unbuilt when project was loaded.
+    Called before sequence is displayed or otherwise needs its MLT objects.
+    """
+    if not is_mlt_build_pending(seq):
+        return
+
+    global show_messages
+    old_show_messages = show_messages
+    show_messages = False # Load dialog is gone and we may be holding gtk lock
+    old_c_seq = editorstate.project.c_seq
+    py_seq_attrs = seq.__dict__.copy()
+    try:
+        _open_clips_media([seq], [seq], seq.profile)
+        _build_sequence(seq)
+    except FileProducerNotFoundError:
+        # Building replaces py tracks of sequence, put them back so that build can be retried
+        seq.__dict__.clear()
+        seq.__dict__.update(py_seq_attrs)
+        raise
+    finally:
+        editorstate.project.c_seq = old_c_seq # fill_sequence_mlt() sets this
+        show_messages = old_show_messages
+
+def is_mlt_build_pending(seq):
+    return getattr(seq, "mlt_build_pending", False)
+
+def _build_sequence(seq):
+    global all_clips, sync_clips, _clips_count, _clips_built
+    all_clips = {}
+    sync_clips = []
+    _clips_count = _get_clips_count(seq)
+    _clips_built = 0
+
+    fill_sequence_mlt(seq)
+    handle_seq_watermark(seq)
+    if not hasattr(seq, "seq_len"):
+        seq.update_edit_tracks_length()
+
+    all_clips = {}
+    sync_clips = []
+    seq.mlt_build_pending = False
+
+def _open_clips_media(sequences, open_sequences, profile):
+    """
+    Resolves media paths of file clips in sequences and opens media for clips in
+    open_sequences in worker threads so that creating clips on sequence build only makes cuts of opened media.
+    """
+    # Unique saved clip paths in timeline order so that missing media is reported deterministically
+    paths = []
+    open_paths = {} # saved path -> ids of tracks that media is opened for
+    path_clips = {} # saved path -> clips
+    for seq in sequences:
+        for track_id in range(0, len(seq.tracks)):
+            for clip in seq.tracks[track_id].clips:
+                if clip.is_blanck_clip == True or clip.media_type == appconsts.PATTERN_PRODUCER:
+                    continue
+                try:
+                    path_clips[clip.path].append(clip)
+                except KeyError:
+                    path_clips[clip.path] = [clip]
+                    paths.append(clip.path)
+                if seq in open_sequences:
+                    open_paths.setdefault(clip.path, set()).add(track_id)
+
+    if len(paths) == 0:
+        return
+
+    load_queue = MediaLoadQueue(profile, paths, open_paths)
+    load_queue.run(LOAD_WORKERS_COUNT)
+
+    for path in paths:
+        resolved_path = load_queue.resolved_paths[path]
+        if resolved_path == None:
+            raise FileProducerNotFoundError(path)
+        for clip in path_clips[path]:
+            clip.path = resolved_path
+
+def _get_clips_count(seq):
+    count = 0
+    for py_track in seq.tracks:
+        count += len(py_track.clips)
+    return count
+
+def fix_sequence_compositors(seq, SAVEFILE_VERSION):
+    """
+    Does backwards compability fixes and relative path lookups for python compositor objects.
+    """
+    for py_compositor in seq.compositors:
+        if SAVEFILE_VERSION < 3:
+            FIX_N_TO_3_COMPOSITOR_COMPABILITY(py_compositor, SAVEFILE_VERSION)
+        _fix_wipe_relative_path(py_compositor)
+
+def fill_sequence_mlt(seq):
     """
     Replaces sequences py objects with mlt objects
     """
@@ -397,9 +615,7 @@ def fill_sequence_mlt(seq, SAVEFILE_VERSION):
     # Create and connect compositors.
     mlt_compositors = []
     for py_compositor in seq.compositors:
-            # Keeping backwards compability
-            if SAVEFILE_VERSION < 3:
-                FIX_N_TO_3_COMPOSITOR_COMPABILITY(py_compositor, SAVEFILE_VERSION)
+            # Backwards compability fixes have been done in fix_sequence_compositors()
         
             # Create new compositor object
             compositor = mlttransitions.create_compositor(py_compositor.type_id)                                        
@@ -407,7 +623,6 @@ def fill_sequence_mlt(seq, SAVEFILE_VERSION):
 
             # Copy and set param values
             compositor.transition.properties = copy.deepcopy(py_compositor.transition.properties)
-            _fix_wipe_relative_path(compositor)
             compositor.transition.update_editable_mlt_properties()
     
             compositor.transition.set_tracks(py_compositor.transition.a_track, py_compositor.transition.b_track)
@@ -416,6 +631,7 @@ def fill_sequence_mlt(seq, SAVEFILE_VERSION):
             mlt_compositors.append(compositor)
 
     seq.compositors = mlt_compositors
+    seq.sort_compositors()
     seq.restack_compositors()
 
     # Connect sync relations
@@ -453,14 +669,11 @@ def fill_track_mlt(mlt_track, py_track):
             clip.color = None
 
         # normal clip
+        # Clip path has been resolved and media opened in _open_clips_media().
         if (clip.is_blanck_clip == False and (clip.media_type != appconsts.PATTERN_PRODUCER)):
-            orig_path = clip.path # Save the path for error message
-            
-            clip.path = get_media_asset_path(clip.path, _load_file_path)
-                
-            mlt_clip = sequence.create_file_producer_clip(clip.path)
+            mlt_clip = sequence.create_file_producer_clip(clip.path, None, mlt_track.id)
             if mlt_clip == None:
-                raise FileProducerNotFoundError(orig_path)
+                raise FileProducerNotFoundError(clip.path)
             mlt_clip.__dict__.update(clip.__dict__)
             fill_filters_mlt(mlt_clip, sequence)
         # pattern producer
@@ -490,11 +703,14 @@ def fill_track_mlt(mlt_track, py_track):
             append_clip(mlt_track, mlt_clip, clip.clip_in, clip.clip_out)
 
         # Save refences to recreate sync relations after all clips loaded
-        global all_clips, sync_clips
+        global all_clips, sync_clips, _clips_built
         all_clips[mlt_clip.id] = mlt_clip
         if mlt_clip.sync_data != None:
             sync_clips.append((mlt_clip, mlt_track))
 
+        _clips_built += 1
+        _show_progress(SEQUENCES_PHASE_START, 1.0, float(_clips_built) / max(_clips_count, 1))
+
 def fill_filters_mlt(mlt_clip, sequence):
     """
     Creates new FilterObject objects and creates and attaches mlt.Filter
@@ -522,6 +738,73 @@ def fill_filters_mlt(mlt_clip, sequence):
     
     mlt_clip.filters = filters
     
+#------------------------------------------------------------ media loading
+class MediaLoadQueue:
+    """
+    Resolves media paths and opens media for them in worker threads.
+    """
+    def __init__(self, profile, paths, open_paths):
+        self.profile = profile
+        self.paths = paths
+        self.open_paths = open_paths # media is only opened for these tracks, other paths are resolved
+        self.next_index = 0
+        self.done_count = 0
+        self.resolved_paths = {} # saved path -> resolved path, or None if media not found
+        self.lock = threading.Lock()
+
+    def run(self, workers_count):
+        """
+        Returns when all paths have been processed.
+        """
+        workers = []
+        for i in range(0, min(workers_count, len(self.paths))):
+            worker = MediaLoadWorker(self)
+            workers.append(worker)
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def get_next_path(self):
+        self.lock.acquire()
+        path = None
+        if self.next_index < len(self.paths):
+            path = self.paths[self.next_index]
+            self.next_index += 1
+        self.lock.release()
+        return path
+
+    def path_done(self, path, resolved_path):
+        self.lock.acquire()
+        self.resolved_paths[path] = resolved_path
+        self.done_count += 1
+        fraction = float(self.done_count) / len(self.paths)
+        self.lock.release()
+        _show_progress(MEDIA_PHASE_START, SEQUENCES_PHASE_START, fraction)
+
+
+class MediaLoadWorker(threading.Thread):
+    def __init__(self, queue):
+        threading.Thread.__init__(self)
+        self.queue = queue
+
+    def run(self):
+        path = self.queue.get_next_path()
+        while path != None:
+            try:
+                resolved_path = get_media_asset_path(path, _load_file_path)
+                if sequence.get_media_type(resolved_path) == appconsts.FILE_DOES_NOT_EXIST:
+                    resolved_path = None
+                elif path in self.queue.open_paths:
+                    for track_id in self.queue.open_paths[path]:
+                        producerpool.preload(self.queue.profile, resolved_path, track_id)
+            except Exception as e:
+                # Path is reported as missing media, other paths are still processed
+                print "opening media " + path + " failed:", e
+                resolved_path = None
+            self.queue.path_done(path, resolved_path)
+            path = self.queue.get_next_path()
+
+
 #------------------------------------------------------------ track building
 # THIS IS COPYPASTED FROM edit.py TO NOT IMPORT IT.
 def append_clip(track, clip, clip_in, clip_out):
@@ -530,6 +813,8 @@ def append_clip(track, clip, clip_in, clip_out):
     """
     clip.clip_in = clip_in
     clip.clip_out = clip_out
+    if clip.is_cut():
+        clip.set_in_and_out(clip_in, clip_out)
     track.clips.append(clip) # py
     track.append(clip, clip_in, clip_out) # mlt
     resync.clip_added_to_timeline(clip, track)
@@ -120,6 +120,12 @@ def _general_options_panel(folder_select_clicked_cb, render_folder_select_clicke
     load_order_combo.append_text("Absolute paths only")
     load_order_combo.set_active(prefs.media_load_order)
 
+    proxy_jobs_combo = gtk.combo_box_new_text()
+    proxy_jobs_combo.append_text(_("Automatic"))
+    for i in range(1, editorpersistance.PROXY_RENDER_JOBS_MAX + 1):
+        proxy_jobs_combo.append_text(str(i))
+    proxy_jobs_combo.set_active(prefs.proxy_render_jobs)
+
     # Layout
     row1 = guiutils.get_two_column_box(gtk.Label(_("Default Profile:")), default_profile_combo, PREFERENCES_LEFT)
     row2 = guiutils.get_checkbox_row_box(open_in_last_opened_check, gtk.Label(_("Remember last media directory")))
@@ -129,6 +135,7 @@ def _general_options_panel(folder_select_clicked_cb, render_folder_select_clicke
     row6 = guiutils.get_two_column_box(gtk.Label(_("Autosave for crash recovery every:")), autosave_combo, PREFERENCES_LEFT)
     row8 = guiutils.get_two_column_box(gtk.Label(_("Rendered Clips folder:")), render_folder_select, PREFERENCES_LEFT)
     row9 = guiutils.get_two_column_box(gtk.Label(_("Media look-up order on load:")), load_order_combo, PREFERENCES_LEFT)
+    row10 = guiutils.get_two_column_box(gtk.Label(_("Simultaneous proxy renders:")), proxy_jobs_combo, PREFERENCES_LEFT)
 
     vbox = gtk.VBox(False, 2)
     vbox.pack_start(row1, False, False, 0)
@@ -139,13 +146,14 @@ def _general_options_panel(folder_select_clicked_cb, render_folder_select_clicke
     vbox.pack_start(row4, False, False, 0)
     vbox.pack_start(row8, False, False, 0)
     vbox.pack_start(row9, False, False, 0)
+    vbox.pack_start(row10, False, False, 0)
     vbox.pack_start(gtk.Label(), True, True, 0)
 
     align = gtk.Alignment(0.5, 0.5, 1.0, 1.0)
     align.set_padding(12, 0, 12, 12)
     align.add(vbox)
 
-    return align, (default_profile_combo, open_in_last_opened_check, open_in_last_rendered_check, undo_max_spin, load_order_combo)
+    return align, (default_profile_combo, open_in_last_opened_check, open_in_last_rendered_check, undo_max_spin, load_order_combo, proxy_jobs_combo, autosave_combo)
 
 def _edit_prefs_panel():
     prefs = editorpersistance.prefs
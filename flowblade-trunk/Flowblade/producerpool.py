@@ -0,0 +1,156 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module keeps a pool of shared parent producers for media files.
+
+Creating a MLT file producer opens and probes the file and creates a decoder for it,
+which can take 0.5s+ on some files. File producer clips are instead created as cuts of
+a parent producer that is created once for each media file, profile and track.
+
+Cuts of a parent share its decoder, so parents are not shared between tracks where clips
+of same file are read at different positions on every frame and decoder would need to seek
+for each one. Clips moved to another track keep the parent they were created with.
+
+Cuts are counted as users of their parent and pool drops its reference to parent
+when last counted cut is released. Timeline clips are released when they are removed from
+a track and retained again if they are put back e.g. on undo. Cuts hold a reference to their
+parent in MLT, so parent is freed when all cuts created from it are freed.
+
+Parents can be opened beforehand from worker threads with preload().
+"""
+
+import mlt
+import threading
+
+_pool = {} # (path, profile description, track id) -> PoolEntry
+_lock = threading.Lock()
+
+
+class PoolEntry:
+    def __init__(self, parent):
+        self.parent = parent
+        self.users = 0
+
+
+def get_cut(profile, path, track_id=None):
+    """
+    Returns new cut covering all of media file from parent producer for path, profile and track.
+    track_id is None for clips that are not created for a timeline track.
+    """
+    key = (path, profile.description(), track_id)
+    cut = None
+    while cut == None:
+        # Parent is opened without holding pool lock, opening can take long or raise
+        preload(profile, path, track_id)
+
+        _lock.acquire()
+        try:
+            entry = _pool.get(key)
+            if entry != None: # None if parent was released by another thread after preload
+                cut = entry.parent.cut(0, entry.parent.get_length() - 1)
+                cut.pool_key = key
+                cut.pool_retained = True
+                entry.users += 1
+        finally:
+            _lock.release()
+    return cut
+
+def preload(profile, path, track_id=None):
+    """
+    Opens parent producer for path, profile and track if it is not in pool.
+    Called from worker threads and get_cut(), parents are opened without holding pool lock.
+    """
+    key = (path, profile.description(), track_id)
+    _lock.acquire()
+    found = key in _pool
+    _lock.release()
+    if found:
+        return
+
+    parent = mlt.Producer(profile, str(path))
+    _lock.acquire()
+    if not key in _pool:
+        _pool[key] = PoolEntry(parent)
+    _lock.release()
+
+def release_cut(clip):
+    """
+    Called when clip created with get_cut() is no longer used or is removed from timeline.
+    """
+    if getattr(clip, "pool_retained", False) == False: # not a pooled clip or already released
+        return
+    clip.pool_retained = False
+
+    _lock.acquire()
+    try:
+        entry = _pool.get(clip.pool_key)
+        if entry != None: # None if pool was cleared after clip was created
+            entry.users -= 1
+            if entry.users <= 0:
+                del _pool[clip.pool_key]
+    finally:
+        _lock.release()
+
+def retain_cut(clip):
+    """
+    Called when released clip is used again, e.g. when undo puts removed clip back on timeline.
+    Parent of clip is put back in pool if it was dropped when clip was released.
+    """
+    if getattr(clip, "pool_retained", True) == True: # not a pooled clip or already retained
+        return
+    clip.pool_retained = True
+
+    _lock.acquire()
+    try:
+        entry = _pool.get(clip.pool_key)
+        if entry == None:
+            entry = PoolEntry(clip.parent())
+            _pool[clip.pool_key] = entry
+        entry.users += 1
+    finally:
+        _lock.release()
+
+def get_track_id(clip):
+    """
+    Returns track id that parent of pooled clip was created for, clones of clip use same parent.
+    """
+    try:
+        return clip.pool_key[2]
+    except AttributeError: # not a pooled clip
+        return None
+
+def get_media_producer(clip):
+    """
+    Returns producer that has properties of media file, clip itself if it is not a cut.
+    """
+    if clip.is_cut():
+        return clip.parent()
+    return clip
+
+def clear():
+    """
+    Drops all parents from pool, existing cuts keep working.
+    Called when a project is loaded as clips of previous project are no longer used.
+    """
+    global _pool
+    _lock.acquire()
+    _pool = {}
+    _lock.release()
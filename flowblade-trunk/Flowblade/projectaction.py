@@ -30,6 +30,7 @@ import glib
 
 import datetime
 import md5
+import multiprocessing
 import os
 from os import listdir
 from os.path import isfile, join
@@ -37,6 +38,7 @@ import re
 import shutil
 import time
 import threading
+import Queue
 
 import app
 import appconsts
@@ -53,8 +55,10 @@ from editorstate import current_bin
 from editorstate import PROJECT
 from editorstate import MONITOR_MEDIA_FILE
 import editorpersistance
+import mediacache
 import movemodes
 import persistance
+import producerpool
 import projectdata
 import projectinfogui
 import propertyparse
@@ -69,6 +73,12 @@ import utils
 save_time = None
 save_icon_remove_event_id = None
 
+# Thumbnails and lengths of added media files are probed in worker threads
+try:
+    PROBE_WORKERS_COUNT = max(1, min(multiprocessing.cpu_count(), 8))
+except NotImplementedError:
+    PROBE_WORKERS_COUNT = 2
+
 
 #--------------------------------------- worker threads
 class LoadThread(threading.Thread):
@@ -86,12 +96,10 @@ class LoadThread(threading.Thread):
         persistance.load_dialog = dialog
         gtk.gdk.threads_leave()
 
-        ticker = utils.Ticker(_load_pulse_bar, 0.15)
-        ticker.start_ticker()
-
         old_project = editorstate.project
         try:
             editorstate.project_is_loading = True
+            producerpool.clear() # clips of loaded project get new parent producers
             
             project = persistance.load_project(self.filename)
             sequence.set_track_counts(project)
@@ -100,19 +108,13 @@ class LoadThread(threading.Thread):
 
         except persistance.FileProducerNotFoundError as e:
             print "did not find file:", e
-            self._error_stop(dialog, ticker)
-            primary_txt = _("Media asset was missing!")
-            secondary_txt = _("Path of missing asset:") + "\n   <b>" + e.value  + "</b>\n\n" + \
-                            _("Relative search for replacement file in sub folders of project file failed.") + "\n\n" + \
-                            _("To load the project you will need to either:") + "\n" + \
-                            u"\u2022" + " " + _("Use 'Media Linker' tool to relink media assets to new files, or") + "\n" + \
-                            u"\u2022" + " " + _("Place a file with the same exact name and path on the hard drive")
-            dialogutils.warning_message(primary_txt, secondary_txt, None, is_info=False)
+            self._error_stop(dialog)
+            missing_media_info(e.value, None)
             editorstate.project = old_project # persistance.load_project() changes this,
                                               # we simply change it back as no GUI or other state is yet changed
             return
         except persistance.ProjectProfileNotFoundError as e:
-            self._error_stop(dialog, ticker)
+            self._error_stop(dialog)
             primary_txt = _("Profile with Description: '") + e.value + _("' was not found on load!")
             secondary_txt = _("It is possible to load the project by creating a User Profile with exactly the same Description\nas the missing profile. ") + "\n\n" + \
                             _("User Profiles can be created by selecting 'Edit->Profiles Manager'.")
@@ -140,15 +142,12 @@ class LoadThread(threading.Thread):
         dialog.destroy()
         gtk.gdk.threads_leave()
 
-        ticker.stop_ticker()
-
-    def _error_stop(self, dialog, ticker):
+    def _error_stop(self, dialog):
         editorstate.project_is_loading = False
         gtk.gdk.threads_enter()
         updater.set_info_icon(None)
         dialog.destroy()
         gtk.gdk.threads_leave()
-        ticker.stop_ticker()
 
             
 
@@ -166,32 +165,44 @@ class AddMediaFilesThread(threading.Thread):
 
         duplicates = []
         succes_new_file = None
-        filenames = self.filenames
-        for new_file in filenames:
+        new_files = []
+        new_files_set = set()
+        for new_file in self.filenames:
             (folder, file_name) = os.path.split(new_file)
-            if PROJECT().media_file_exists(new_file):
+            if PROJECT().media_file_exists(new_file) or new_file in new_files_set:
                 duplicates.append(file_name)
             else:
-                try:
-                    PROJECT().add_media_file(new_file)
-                    succes_new_file = new_file
-                except projectdata.ProducerNotValidError as err:
-                    print err.__str__()
-                    dialogs.not_valid_producer_dialog(err.value, gui.editor_window.window)
+                new_files.append(new_file)
+                new_files_set.add(new_file)
+
+        # Files are probed in parallel and added to project and media panel in
+        # given order as soon as they and all files before them are done.
+        probe_queue = MediaProbeQueue(new_files)
+        probe_queue.start(PROBE_WORKERS_COUNT)
+        for probe_job in probe_queue.jobs:
+            probe_job.done.wait()
             
             gtk.gdk.threads_enter()
-            gui.media_list_view.fill_data_model()
-            max_val = gui.editor_window.media_scroll_window.get_vadjustment().get_upper()
-            gui.editor_window.media_scroll_window.get_vadjustment().set_value(max_val)
+            if probe_job.probe_data != None:
+                media_type, icon_path, length = probe_job.probe_data
+                media_file = PROJECT().add_probed_media_file(probe_job.file_path, media_type, icon_path, length)
+                succes_new_file = probe_job.file_path
+                gui.media_list_view.add_media_file(media_file)
+                max_val = gui.editor_window.media_scroll_window.get_vadjustment().get_upper()
+                gui.editor_window.media_scroll_window.get_vadjustment().set_value(max_val)
+            elif probe_job.error != None:
+                print "probing " + probe_job.file_path + " failed:", probe_job.error
+                dialogs.not_valid_producer_dialog(probe_job.file_path, gui.editor_window.window)
             gtk.gdk.threads_leave()
 
         if succes_new_file != None:
             editorpersistance.prefs.last_opened_media_dir = os.path.dirname(succes_new_file)
             editorpersistance.save()
 
-        # Update editor gui
+        mediacache.save()
+
+        # Update editor gui, media panel is already up to date
         gtk.gdk.threads_enter()
-        gui.media_list_view.fill_data_model()
         gui.bin_list_view.fill_data_model()
         _enable_save()
 
@@ -202,6 +213,49 @@ class AddMediaFilesThread(threading.Thread):
         if len(duplicates) > 0:
             gobject.timeout_add(10, _duplicates_info, duplicates)
 
+class MediaProbeJob:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.probe_data = None # (media_type, icon_path, length)
+        self.error = None
+        self.done = threading.Event()
+
+
+class MediaProbeQueue:
+    """
+    Writes thumbnails and gets lengths for media files in worker threads.
+    """
+    def __init__(self, file_paths):
+        self.jobs = [MediaProbeJob(file_path) for file_path in file_paths]
+        self.waiting_jobs = Queue.Queue()
+        for job in self.jobs:
+            self.waiting_jobs.put(job)
+
+    def start(self, workers_count):
+        for i in range(0, min(workers_count, len(self.jobs))):
+            worker = MediaProbeWorker(self.waiting_jobs)
+            worker.daemon = True
+            worker.start()
+
+
+class MediaProbeWorker(threading.Thread):
+    def __init__(self, waiting_jobs):
+        threading.Thread.__init__(self)
+        self.waiting_jobs = waiting_jobs
+
+    def run(self):
+        while True:
+            try:
+                job = self.waiting_jobs.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                job.probe_data = PROJECT().probe_media_file(job.file_path)
+            except Exception as err: # worker continues with next file whatever failed
+                job.error = err
+            finally:
+                job.done.set()
+
 def _duplicates_info(duplicates):
     primary_txt = _("Media files already present in project were opened!")
     MAX_DISPLAYED_ITEMS = 3
@@ -221,17 +275,18 @@ def _duplicates_info(duplicates):
     dialogutils.info_message(primary_txt, secondary_txt, gui.editor_window.window)
     return False
 
-def _load_pulse_bar():
-    gtk.gdk.threads_enter()
-    try: 
-        persistance.load_dialog.progress_bar.pulse()
-    except:
-        pass
-    gtk.gdk.threads_leave()
-
 def _enable_save():
     gui.editor_window.uimanager.get_widget("/MenuBar/FileMenu/Save").set_sensitive(True)
 
+def missing_media_info(missing_path, parent_window):
+    primary_txt = _("Media asset was missing!")
+    secondary_txt = _("Path of missing asset:") + "\n   <b>" + missing_path  + "</b>\n\n" + \
+                    _("Relative search for replacement file in sub folders of project file failed.") + "\n\n" + \
+                    _("To load the project you will need to either:") + "\n" + \
+                    u"\u2022" + " " + _("Use 'Media Linker' tool to relink media assets to new files, or") + "\n" + \
+                    u"\u2022" + " " + _("Place a file with the same exact name and path on the hard drive")
+    dialogutils.warning_message(primary_txt, secondary_txt, parent_window, is_info=False)
+
 
 # ---------------------------------- project: new, load, save
 def new_project():
@@ -720,7 +775,7 @@ def delete_media_files(force_delete=False):
         
     # Delete from project
     for file_id in file_ids:
-        PROJECT().media_files.pop(file_id)
+        PROJECT().remove_media_file(file_id)
 
     gui.media_list_view.fill_data_model()
 
@@ -752,9 +807,10 @@ def media_file_name_edited(dialog, response_id, data):
 
 def _display_file_info(media_file):
     clip = current_sequence().create_file_producer_clip(media_file.path)
+    media_producer = producerpool.get_media_producer(clip)
 
-    width = clip.get("width")
-    height = clip.get("height")
+    width = media_producer.get("width")
+    height = media_producer.get("height")
     size = str(width) + " x " + str(height)
     length = utils.get_tc_string(clip.get_length())
 
@@ -763,46 +819,35 @@ def _display_file_info(media_file):
     except:
         print "_display_file_info() failed to get thumbnail"
 
-    video_index = clip.get_int("video_index")
-    audio_index = clip.get_int("audio_index")
+    video_index = media_producer.get_int("video_index")
+    audio_index = media_producer.get_int("audio_index")
     long_video_property = "meta.media." + str(video_index) + ".codec.long_name"
     long_audio_property = "meta.media." + str(audio_index) + ".codec.long_name"
-    vcodec = clip.get(str(long_video_property))
-    acodec = clip.get(str(long_audio_property))
+    vcodec = media_producer.get(str(long_video_property))
+    acodec = media_producer.get(str(long_audio_property))
     
     frame = clip.get_frame()
     channels = str(frame.get_int("channels"))
     frequency = str(frame.get_int("frequency")) + "Hz"
     try:
-        num = float(clip.get("meta.media.frame_rate_num")) # from producer_avformat.c
-        den = float(clip.get("meta.media.frame_rate_den")) # from producer_avformat.c
+        num = float(media_producer.get("meta.media.frame_rate_num")) # from producer_avformat.c
+        den = float(media_producer.get("meta.media.frame_rate_den")) # from producer_avformat.c
         fps = str(num/den)
     except:
         fps ="N/A"
-    
+    producerpool.release_cut(clip)
+
     dialogs.file_properties_dialog((media_file, img, size, length, vcodec, acodec, channels, frequency, fps))
 
 def remove_unused_media():
-    # Create path -> media item dict
-    path_to_media_object = {}
+    # Create a list of media objects that have no clips on any of the sequences
+    unused = []
     for key, media_item in PROJECT().media_files.items():
+        if media_item.type == appconsts.PATTERN_PRODUCER:
+            continue
         if media_item.path != "" and media_item.path != None:
-            path_to_media_object[media_item.path] = media_item
-    
-    # Remove all items from created dict that have a clip with same path on any of the sequences
-    for seq in PROJECT().sequences:
-        for track in seq.tracks:
-            for clip in track.clips:
-                try:
-                    removed = path_to_media_object.pop(clip.path)
-                    print "Removed: " + removed.path
-                except:
-                    pass
-    
-    # Create a list of unused media objects
-    unused = []
-    for path, media_item in path_to_media_object.items():
-        unused.append(media_item)
+            if not PROJECT().media_file_is_used(media_item):
+                unused.append(media_item)
     
     # It is most convenient to do remove via gui object
     gui.media_list_view.select_media_file_list(unused)
@@ -1003,13 +1048,21 @@ def _delete_confirm_callback(dialog, response_id):
     row = max(rows[0])
     current_index = PROJECT().sequences.index(current_sequence())
 
-    # Remove sequence from gui and project data
-    model.remove(iter)
-    PROJECT().sequences.pop(row)
-    
-    # If we deleted current sequence, open first sequence
+    # If we delete current sequence, open first other sequence before removing it
+    # so that deleted sequence stays current if the other one can't be opened.
     if row == current_index:
-        app.change_current_sequence(0)
+        open_index = 0
+        if row == 0:
+            open_index = 1
+        if app.change_current_sequence(open_index) == False:
+            return
+        PROJECT().sequences.pop(row)
+        gui.sequence_list_view.fill_data_model()
+        selection.select_path(str(PROJECT().sequences.index(current_sequence())))
+    else:
+        # Remove sequence from gui and project data
+        model.remove(iter)
+        PROJECT().sequences.pop(row)
     
     _enable_save()
 
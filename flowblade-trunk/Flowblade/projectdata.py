@@ -34,7 +34,10 @@ import shutil
 import time
 
 import appconsts
+import clipindex
 import editorpersistance
+import iconcache
+import mediacache
 from editorstate import PLAYER
 import mltprofiles
 import mltrefhold
@@ -60,6 +63,7 @@ EVENT_RENDERED = 4
 EVENT_SAVED_SNAPSHOT = 5
 
 thumbnailer = None
+_thumbnail_rewrite_failed = set() # media paths that thumbnail could not be written for
 
 
 class Project:
@@ -75,6 +79,7 @@ class Project:
         self.profile_desc = profile.description()
         self.bins = []
         self.media_files = {} # MediaFile.id(key) -> MediaFile object(value)
+        self.init_media_file_index()
         self.sequences = []
         self.next_media_file_id = 0 
         self.next_bin_number = 1 # This is for creating name for new bin 
@@ -100,7 +105,7 @@ class Project:
         global thumbnailer
         if thumbnailer == None:
             thumbnailer = Thumbnailer()
-            thumbnailer.set_context(self.profile)
+        thumbnailer.set_context(self.profile) # lengths are probed with frame rate of current project
 
     def add_image_sequence_media_object(self, resource_path, name, length):
         media_object = self.add_media_file(resource_path)
@@ -111,9 +116,14 @@ class Project:
         """
         Adds media file to project if exists and file is of right type.
         """
-        (directory, file_name) = os.path.split(file_path)
-        (name, ext) = os.path.splitext(file_name)
+        (media_type, icon_path, length) = self.probe_media_file(file_path)
+        return self.add_probed_media_file(file_path, media_type, icon_path, length)
 
+    def probe_media_file(self, file_path):
+        """
+        Returns (media_type, icon_path, length) for file, writes thumbnail for non-audio files.
+        Does not change project data or use GTK, so this can be called from worker threads.
+        """
         # Get media type
         media_type = sequence.get_media_type(file_path)
         
@@ -124,7 +134,15 @@ class Project:
         else: # For non-audio we need write a thumbbnail file and get file lengh while we're at it
              (icon_path, length) = thumbnailer.write_image(file_path)
 
-          # Create media file object
+        return (media_type, icon_path, length)
+
+    def add_probed_media_file(self, file_path, media_type, icon_path, length):
+        """
+        Adds media file with values from probe_media_file() to project.
+        """
+        (directory, file_name) = os.path.split(file_path)
+
+        # Create media file object
         media_object = MediaFile(self.next_media_file_id, file_path, 
                                file_name, media_type, length, icon_path)
 
@@ -140,44 +158,90 @@ class Project:
         Adds media file or color clip to project data structures.
         """
         self.media_files[media_object.id] = media_object
+        self.index_media_file(media_object)
         self.next_media_file_id += 1
 
         # Add to bin
         self.c_bin.file_ids.append(media_object.id)
 
-    def media_file_exists(self, file_path):
-        for key, media_file in self.media_files.items():
-            if media_file.type == appconsts.PATTERN_PRODUCER:
-                continue
-            if file_path == media_file.path:
-                return True
+    def remove_media_file(self, file_id):
+        media_file = self.media_files.pop(file_id)
+        self.unindex_media_file(media_file)
 
-        return False
+    def media_file_exists(self, file_path):
+        return file_path in self.media_files_by_path
 
     def get_media_file_for_path(self, file_path):
-        for key, media_file in self.media_files.items():
-            if media_file.type == appconsts.PATTERN_PRODUCER:
-                continue
-            if file_path == media_file.path:
-                return media_file
-        return None
+        return self.media_files_by_path.get(file_path)
+
+    def get_media_file_for_proxy_path(self, proxy_path):
+        return self.media_files_by_proxy_path.get(proxy_path)
+
+    def get_media_file_clips(self, media_file):
+        """
+        Returns list of (sequence, track, clip) tuples for clips on timeline in all sequences
+        using media file or its proxy file.
+        """
+        return clipindex.get_clips(self.sequences, self._get_media_file_paths(media_file))
+
+    def media_file_is_used(self, media_file):
+        return clipindex.is_used(self.sequences, self._get_media_file_paths(media_file))
+
+    def _get_media_file_paths(self, media_file):
+        paths = [media_file.path]
+        if media_file.second_file_path != None:
+            paths.append(media_file.second_file_path)
+        return paths
 
     def delete_media_file_from_current_bin(self, media_file):
         self.c_bin.file_ids.pop(media_file.id)
 
     def get_current_proxy_paths(self):
         paths_dict = {}
-        for idkey, media_file in self.media_files.items():
-            try:
-                if media_file.is_proxy_file:
-                    paths_dict[media_file.path] = media_file
-            except AttributeError: # Pattern producers or old media files do not have these, add values
-                self.has_proxy_file = False
-                self.is_proxy_file = False
-                self.second_file_path = None
+        for proxy_path, media_file in self.media_files_by_proxy_path.iteritems():
+            if media_file.is_proxy_file:
+                paths_dict[media_file.path] = media_file
 
         return paths_dict
 
+    # ------------------------------------------------------- media file index
+    def init_media_file_index(self):
+        """
+        Creates path -> MediaFile lookup dicts for all media files.
+        Called on creation and on load because index is not saved with project.
+        """
+        self.media_files_by_path = {} # MediaFile.path -> MediaFile
+        self.media_files_by_proxy_path = {} # proxy file path -> MediaFile, in both original and proxy mode
+        self.media_file_index_keys = {} # MediaFile.id -> (path, proxy path) MediaFile is currently indexed with
+        for media_file in self.media_files.values():
+            self.index_media_file(media_file)
+
+    def index_media_file(self, media_file):
+        """
+        Adds media file to index or updates its entries after its paths have changed.
+        """
+        self.unindex_media_file(media_file)
+        if media_file.type == appconsts.PATTERN_PRODUCER:
+            return
+
+        path = media_file.path
+        proxy_path = media_file.get_proxy_path()
+        self.media_files_by_path[path] = media_file
+        if proxy_path != None:
+            self.media_files_by_proxy_path[proxy_path] = media_file
+        self.media_file_index_keys[media_file.id] = (path, proxy_path)
+
+    def unindex_media_file(self, media_file):
+        try:
+            path, proxy_path = self.media_file_index_keys.pop(media_file.id)
+        except KeyError:
+            return
+        # Another media file may have been added with the same path
+        if self.media_files_by_path.get(path) is media_file:
+            del self.media_files_by_path[path]
+        if self.media_files_by_proxy_path.get(proxy_path) is media_file:
+            del self.media_files_by_proxy_path[proxy_path]
+
     def add_unnamed_bin(self):
         """
         Adds bin with default name.
@@ -308,8 +372,6 @@ class MediaFile:
         self.type = media_type
         self.length = length
         self.icon_path = icon_path
-        self.icon = None
-        self.create_icon()
 
         self.mark_in = -1
         self.mark_out = -1
@@ -328,17 +390,29 @@ class MediaFile:
             self.mark_out = out_fr
             self.length = l
  
+    def get_icon(self):
+        """
+        Returns icon pixbuf, icons are loaded when first needed and kept in iconcache.py.
+
+        Thumbnail files may have been removed from media cache, they are written again when needed.
+        """
+        icon = iconcache.get_icon(self.icon_path)
+        if icon == None and self.type != appconsts.AUDIO and not (self.path in _thumbnail_rewrite_failed):
+            try:
+                (self.icon_path, length) = thumbnailer.write_image(self.path)
+                icon = iconcache.get_icon(self.icon_path)
+            except Exception as e:
+                print "failed to write thumbnail for:", self.path, e
+            if icon == None:
+                _thumbnail_rewrite_failed.add(self.path) # file missing or not readable, not tried again this session
+        if icon == None:
+            # icon_path is kept so that icon is found if file becomes available
+            icon = iconcache.get_icon(respaths.IMAGE_PATH + FALLBACK_THUMB)
+        return icon
+
     def create_icon(self):
-        try:
-            icon = gtk.gdk.pixbuf_new_from_file(self.icon_path)
-            self.icon = icon.scale_simple(appconsts.THUMB_WIDTH, appconsts.THUMB_HEIGHT, \
-                                          gtk.gdk.INTERP_BILINEAR)
-        except:
-            print "failed to make icon from:", self.icon_path
-            self.icon_path = respaths.IMAGE_PATH + FALLBACK_THUMB
-            icon = gtk.gdk.pixbuf_new_from_file(self.icon_path)
-            self.icon = icon.scale_simple(appconsts.THUMB_WIDTH, appconsts.THUMB_HEIGHT, \
-                                          gtk.gdk.INTERP_BILINEAR)
+        # Icon is loaded again from thumbnail file when next needed
+        iconcache.remove(self.icon_path)
 
     def create_proxy_path(self, proxy_width, proxy_height, file_extesion):
         proxy_md_key = self.path + str(proxy_width) + str(proxy_height)
@@ -355,6 +429,13 @@ class MediaFile:
         proxy_path = self.create_proxy_path(proxy_width, proxy_height, file_extesion)
         self.add_proxy_file(proxy_path)
 
+    def get_proxy_path(self):
+        if self.is_proxy_file:
+            return self.path
+        if self.has_proxy_file:
+            return self.second_file_path
+        return None
+
     def set_as_proxy_media_file(self):
         self.path, self.second_file_path = self.second_file_path, self.path
         self.is_proxy_file = True
@@ -388,6 +469,9 @@ class BinColorClip:
         icon.fill(pixel)
         self.icon = icon
 
+    def get_icon(self):
+        return self.icon
+
 
 class Bin:
     """
@@ -416,11 +500,18 @@ class Thumbnailer:
     
     def write_image(self, file_path):
         """
-        Writes thumbnail image from file producer
+        Writes thumbnail image from file producer, or gets it from media cache.
         """
+        cached = mediacache.get_thumbnail(file_path)
+        if cached != None:
+            thumbnail_path, probe_data = cached
+            return (thumbnail_path, self.get_file_length(file_path))
+
         # Get data
-        md_str = md5.new(file_path).hexdigest()
-        thumbnail_path = editorpersistance.prefs.thumbnail_folder + "/" + md_str +  ".png"
+        thumbnail_path = mediacache.get_thumbnail_write_path(file_path)
+        if thumbnail_path == None: # File cannot be cached, e.g. image sequence
+            md_str = md5.new(file_path).hexdigest()
+            thumbnail_path = editorpersistance.prefs.thumbnail_folder + "/" + md_str +  ".png"
 
         # Create consumer
         consumer = mlt.Consumer(self.profile, "avformat", 
@@ -433,23 +524,35 @@ class Thumbnailer:
         if producer.is_valid() == False:
             raise ProducerNotValidError(file_path)
 
-        length = producer.get_length()
+        probe_data = mediacache.get_probe_data_from_producer(producer, sequence.get_media_type(file_path), self.profile)
+        length = probe_data.get_length(self.profile)
         frame = length / 2
         producer = producer.cut(frame, frame)
 
         # Connect and write image
         consumer.connect(producer)
         consumer.run()
+
+        mediacache.add_probe_data(file_path, probe_data, True)
         
         return (thumbnail_path, length)
 
     def get_file_length(self, file_path):
         # This is used for audio files which don't need a thumbnail written
         # but do need file length known
+        probe_data = mediacache.get_probe_data(file_path)
+        if probe_data != None and probe_data.get_length(self.profile) != None:
+            return probe_data.get_length(self.profile)
 
         # Create one frame producer
         producer = mlt.Producer(self.profile, str(file_path))
-        return producer.get_length()
+        length = producer.get_length()
+        if probe_data != None: # cached with other frame rate
+            mediacache.add_length(file_path, self.profile, length)
+        else:
+            probe_data = mediacache.get_probe_data_from_producer(producer, sequence.get_media_type(file_path), self.profile)
+            mediacache.add_probe_data(file_path, probe_data)
+        return length
 
 
 # ----------------------------------- project and media log events
@@ -0,0 +1,368 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module handles reading and writing project files.
+
+Pickleable project objects created by persistance.py are saved as a container of
+independently pickled sections so that a part of a project can be read without
+unpickling all of it.
+
+File layout, all values little-endian:
+
+    header:         magic (4s), format version (H), section count (H)
+    section table:  name (32s), data offset (Q), data length (Q) for each section
+    data:           pickled section objects
+
+Sections:
+
+    project          Project object without sequences, media files and media log
+    media_files      Project.media_files dict
+    media_log        (Project.media_log, Project.media_log_groups) tuple
+    sequence_names   list of sequence names
+    sequence.<n>     sequence at index n in Project.sequences
+
+Files written before this format are single pickled Project objects, they are read
+with LegacyProjectFile that provides the same interface.
+
+Projects are opened with sequences other than current one as LazySequence placeholders
+that are unpickled when they are first used. Placeholders that are still not loaded when
+project is saved are written back as their unchanged pickled data with PickledSection objects.
+
+Sections can be unpickled with a pickle.Unpickler extending class that replaces application
+classes, headlessproject.py uses this to read projects without importing GUI modules.
+
+Format version is increased when sections change. Sections of older files are migrated
+to current version with functions in _MIGRATIONS when they are read.
+"""
+
+import copy
+import cStringIO
+import os
+import pickle
+import struct
+
+MAGIC = "FLBP"
+FORMAT_VERSION = 1
+
+PROJECT_SECTION = "project"
+MEDIA_FILES_SECTION = "media_files"
+MEDIA_LOG_SECTION = "media_log"
+SEQUENCE_NAMES_SECTION = "sequence_names"
+SEQUENCE_SECTION = "sequence."
+
+TEMP_EXTENSION = ".part"
+
+_HEADER_FORMAT = "<4sHH"
+_SECTION_FORMAT = "<32sQQ"
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+_SECTION_SIZE = struct.calcsize(_SECTION_FORMAT)
+
+# Functions migrating a section from format version n + 1 to n + 2 at index n.
+# Called with section name and section object, return migrated section object.
+_MIGRATIONS = []
+
+
+class ProjectFileFormatError(Exception):
+    pass
+
+
+# --------------------------------------------------- writing
+def write_project(file_path, s_proj):
+    """
+    Writes pickleable project object created by persistance.get_p_project().
+    """
+    write_project_data(file_path, get_project_data(s_proj))
+
+def get_project_data(s_proj):
+    """
+    Returns project file contents for pickleable project object as a string.
+    """
+    s_meta = copy.copy(s_proj)
+    s_meta.sequences = []
+    s_meta.media_files = {}
+    s_meta.media_log = []
+    s_meta.media_log_groups = []
+
+    sections = [(PROJECT_SECTION, s_meta),
+                (MEDIA_FILES_SECTION, s_proj.media_files),
+                (MEDIA_LOG_SECTION, (s_proj.media_log, s_proj.media_log_groups)),
+                (SEQUENCE_NAMES_SECTION, [seq.name for seq in s_proj.sequences])]
+    for i in range(0, len(s_proj.sequences)):
+        sections.append((SEQUENCE_SECTION + str(i), s_proj.sequences[i]))
+
+    datas = [_get_section_data(section) for name, section in sections]
+
+    offset = _HEADER_SIZE + len(sections) * _SECTION_SIZE
+    table = []
+    for i in range(0, len(sections)):
+        table.append(struct.pack(_SECTION_FORMAT, sections[i][0], offset, len(datas[i])))
+        offset += len(datas[i])
+
+    header = struct.pack(_HEADER_FORMAT, MAGIC, FORMAT_VERSION, len(sections))
+    return header + "".join(table) + "".join(datas)
+
+def write_project_data(file_path, data):
+    """
+    Writes project file contents created with get_project_data().
+    """
+    # Write to temp file and rename so that a failed save does not destroy existing file
+    temp_path = file_path + TEMP_EXTENSION
+    f = open(temp_path, "wb")
+    f.write(data)
+    f.close()
+    os.rename(temp_path, file_path)
+
+
+# --------------------------------------------------- reading
+def read_project(file_path):
+    """
+    Returns pickleable project object saved in file in any format.
+    """
+    return open_project_file(file_path).get_project()
+
+def open_project_file(file_path, unpickler_class=None):
+    """
+    Returns ProjectFile or LegacyProjectFile for reading sections of project file.
+    """
+    if is_sectioned_file(file_path):
+        return ProjectFile(file_path, unpickler_class)
+    return LegacyProjectFile(file_path, unpickler_class)
+
+def is_sectioned_file(file_path):
+    f = open(file_path, "rb")
+    magic = f.read(len(MAGIC))
+    f.close()
+    return magic == MAGIC
+
+
+class ProjectFile:
+    """
+    Reads sections of project file when they are requested.
+    """
+    def __init__(self, file_path, unpickler_class=None):
+        self.file_path = file_path
+        self.unpickler_class = unpickler_class # None for pickle default
+        self.sections = {} # name -> (offset, length)
+
+        f = open(file_path, "rb")
+        try:
+            header = f.read(_HEADER_SIZE)
+            if len(header) < _HEADER_SIZE:
+                raise ProjectFileFormatError("File too short: " + file_path)
+            magic, self.version, section_count = struct.unpack(_HEADER_FORMAT, header)
+            if magic != MAGIC:
+                raise ProjectFileFormatError("Not a project file: " + file_path)
+            if self.version > FORMAT_VERSION:
+                raise ProjectFileFormatError("Project file was saved with a newer version: " + file_path)
+
+            table = f.read(section_count * _SECTION_SIZE)
+            if len(table) < section_count * _SECTION_SIZE:
+                raise ProjectFileFormatError("Section table not complete: " + file_path)
+            for i in range(0, section_count):
+                name, offset, length = struct.unpack_from(_SECTION_FORMAT, table, i * _SECTION_SIZE)
+                self.sections[name.rstrip("\0")] = (offset, length)
+        finally:
+            f.close()
+
+    def get_section(self, name):
+        return self.load_section(name, self.get_section_data(name))
+
+    def get_section_data(self, name):
+        """
+        Returns pickled section data that can be unpickled later with load_section()
+        even if file has been overwritten.
+        """
+        offset, length = self.sections[name]
+        f = open(self.file_path, "rb")
+        try:
+            f.seek(offset)
+            data = f.read(length)
+        finally:
+            f.close()
+        return data
+
+    def load_section(self, name, data):
+        section = _unpickle(data, self.unpickler_class)
+        for migrate in _MIGRATIONS[self.version - 1:]:
+            section = migrate(name, section)
+        return section
+
+    def get_metadata(self):
+        """
+        Returns Project object without sequences, media files or media log.
+        """
+        return self.get_section(PROJECT_SECTION)
+
+    def get_media_files(self):
+        return self.get_section(MEDIA_FILES_SECTION)
+
+    def get_sequence_names(self):
+        return self.get_section(SEQUENCE_NAMES_SECTION)
+
+    def get_sequence_count(self):
+        return len([name for name in self.sections if name.startswith(SEQUENCE_SECTION)])
+
+    def get_sequence(self, index):
+        return self.get_section(SEQUENCE_SECTION + str(index))
+
+    def get_project(self):
+        """
+        Returns project object with all sections.
+        """
+        project = self.get_metadata()
+        project.media_files = self.get_media_files()
+        project.media_log, project.media_log_groups = self.get_section(MEDIA_LOG_SECTION)
+        project.sequences = []
+        for i in range(0, self.get_sequence_count()):
+            project.sequences.append(self.get_sequence(i))
+        return project
+
+    def get_lazy_project(self, sequence_loaded_callback):
+        """
+        Returns project object with current sequence and other sequences as LazySequence objects.
+        """
+        project = self.get_metadata()
+        project.media_files = self.get_media_files()
+        project.media_log, project.media_log_groups = self.get_section(MEDIA_LOG_SECTION)
+        names = self.get_sequence_names()
+        project.sequences = []
+        for i in range(0, self.get_sequence_count()):
+            if i == project.c_seq_index:
+                project.sequences.append(self.get_sequence(i))
+            else:
+                name = SEQUENCE_SECTION + str(i)
+                data = self.get_section_data(name)
+                project.sequences.append(LazySequence(self, name, data, names[i], sequence_loaded_callback))
+        return project
+
+
+class LegacyProjectFile:
+    """
+    Project file saved as single pickled Project object, gives sections from unpickled project.
+    """
+    def __init__(self, file_path, unpickler_class=None):
+        self.file_path = file_path
+        f = open(file_path)
+        try:
+            self.project = _unpickle(f.read(), unpickler_class)
+        finally:
+            f.close()
+
+    def get_metadata(self):
+        return self.project
+
+    def get_media_files(self):
+        return self.project.media_files
+
+    def get_sequence_names(self):
+        return [seq.name for seq in self.project.sequences]
+
+    def get_sequence_count(self):
+        return len(self.project.sequences)
+
+    def get_sequence(self, index):
+        return self.project.sequences[index]
+
+    def get_project(self):
+        return self.project
+
+    def get_lazy_project(self, sequence_loaded_callback):
+        # Whole project is already unpickled
+        return self.project
+
+
+class PickledSection:
+    """
+    Already pickled sequence section, written as is in place of a pickleable sequence.
+    """
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+
+
+class LazySequence:
+    """
+    Placeholder for a sequence that is unpickled when any attribute other than name is first read.
+
+    Placeholder turns into the unpickled sequence object in place, so references to it in
+    Project.sequences and elsewhere stay valid. sequence_loaded_callback(seq) is then called
+    to do the same fixes that are done to sequences unpickled on load.
+    """
+    def __init__(self, project_file, section_name, data, name, sequence_loaded_callback):
+        self.name = name # sequences list displays names without loading sequences
+        self.lazy_load_data = (project_file, section_name, data, sequence_loaded_callback, name)
+
+    def __getattr__(self, attr_name):
+        # Python internals look up special methods, those must not load sequence.
+        if attr_name.startswith("__"):
+            raise AttributeError(attr_name)
+        load_lazy_sequence(self)
+        return getattr(self, attr_name)
+
+
+def load_lazy_sequence(seq):
+    """
+    Unpickles LazySequence, does nothing for other sequences.
+    """
+    if not isinstance(seq, LazySequence):
+        return
+    project_file, section_name, data, sequence_loaded_callback, saved_name = seq.lazy_load_data
+    loaded_seq = project_file.load_section(section_name, data)
+
+    name = seq.name # may have been renamed before load
+    seq.__dict__.clear()
+    seq.__dict__.update(loaded_seq.__dict__)
+    seq.__class__ = loaded_seq.__class__
+    seq.name = name
+    sequence_loaded_callback(seq)
+
+def is_lazy_sequence(seq):
+    return isinstance(seq, LazySequence)
+
+def get_lazy_sequence_section(seq):
+    """
+    Returns PickledSection with pickled data of LazySequence that is not loaded yet, or None
+    if sequence is loaded or its data can't be written as is.
+    """
+    if not isinstance(seq, LazySequence):
+        return None
+    project_file, section_name, data, sequence_loaded_callback, saved_name = seq.lazy_load_data
+    # Data of older format versions needs migrating and renamed sequence has old name in data
+    if project_file.version != FORMAT_VERSION or seq.name != saved_name:
+        return None
+    return PickledSection(seq.name, data)
+
+def get_sequence_section(s_seq):
+    """
+    Returns PickledSection for pickleable sequence created by persistance.py.
+    """
+    return PickledSection(s_seq.name, _get_section_data(s_seq))
+
+def _get_section_data(section):
+    if isinstance(section, PickledSection):
+        return section.data
+    return pickle.dumps(section, pickle.HIGHEST_PROTOCOL)
+
+
+def _unpickle(data, unpickler_class):
+    if unpickler_class == None:
+        return pickle.loads(data)
+    return unpickler_class(cStringIO.StringIO(data)).load()
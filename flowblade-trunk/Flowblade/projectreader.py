@@ -0,0 +1,153 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module reads project data from project files without creating any MLT objects.
+
+This is used by tools that need media paths, sequences or proxy state of projects
+but never play them back. Projects and sequences returned here are the pickleable
+objects saved by persistance.py with backwards compability fixes done. They can be
+changed and saved with save_project(), but cannot be opened in editor as they are.
+"""
+
+import appconsts
+import persistance
+import projectfile
+import propertyparse
+import sequence
+
+
+def read_project(file_path):
+    """
+    Returns pickleable project object with all sequences.
+    """
+    project_file = projectfile.open_project_file(file_path)
+    project = project_file.get_project()
+    _fix_project(project)
+    for seq in project.sequences:
+        _fix_sequence(seq, project.SAVEFILE_VERSION)
+    return project
+
+def read_sequence(file_path, index=None):
+    """
+    Returns pickleable sequence at index, or sequence that was current when project was saved.
+    Only reads project metadata and the sequence from sectioned files.
+    """
+    project_file = projectfile.open_project_file(file_path)
+    project = project_file.get_metadata()
+    if index == None:
+        index = project.c_seq_index
+    seq = project_file.get_sequence(index)
+    _fix_sequence(seq, _get_savefile_version(project))
+    return seq
+
+def save_project(project, file_path):
+    """
+    Saves project read with read_project().
+    """
+    project.SAVEFILE_VERSION = appconsts.SAVEFILE_VERSION # file was converted on read
+    projectfile.write_project(file_path, project)
+
+# --------------------------------------------------------- project data
+def get_media_paths(project):
+    """
+    Returns media file paths, clip media paths and wipe luma paths used by project
+    in that order with no duplicates.
+    """
+    paths = []
+    added = set()
+    for media_file in project.media_files.values():
+        if media_file.type != appconsts.PATTERN_PRODUCER:
+            _add_path(media_file.path, paths, added)
+
+    for seq in project.sequences:
+        for path in get_sequence_media_paths(seq):
+            _add_path(path, paths, added)
+
+    return paths
+
+def get_sequence_media_paths(seq):
+    """
+    Returns clip media paths and wipe luma paths used by sequence with no duplicates.
+    """
+    paths = []
+    added = set()
+    for path in get_clip_references(seq):
+        _add_path(path, paths, added)
+    for compositor in seq.compositors:
+        res_path = get_compositor_luma_path(compositor)
+        if res_path != None:
+            _add_path(res_path, paths, added)
+    return paths
+
+def get_clip_references(seq):
+    """
+    Returns dict media path -> list of (track index, clip index) tuples of clips using media.
+    """
+    references = {}
+    for track_index in range(0, len(seq.tracks)):
+        clips = seq.tracks[track_index].clips
+        for clip_index in range(0, len(clips)):
+            clip = clips[clip_index]
+            # Only producer clips have media
+            if clip.is_blanck_clip == False and clip.media_type != appconsts.PATTERN_PRODUCER:
+                try:
+                    references[clip.path].append((track_index, clip_index))
+                except KeyError:
+                    references[clip.path] = [(track_index, clip_index)]
+    return references
+
+def get_compositor_luma_path(compositor):
+    # Wipes may have user lumas
+    if compositor.type_id == "##wipe":
+        return propertyparse.get_property_value(compositor.transition.properties, "resource")
+    if compositor.type_id == "##region":
+        return propertyparse.get_property_value(compositor.transition.properties, "composite.luma")
+    return None
+
+def get_missing_media_paths(paths):
+    return [path for path in paths if sequence.get_media_type(path) == appconsts.FILE_DOES_NOT_EXIST]
+
+def get_proxy_mode(project):
+    return project.proxy_data.proxy_mode
+
+def _add_path(path, paths, added):
+    if not path in added:
+        paths.append(path)
+        added.add(path)
+
+# --------------------------------------------------------- backwards compability
+def _fix_project(project):
+    project.SAVEFILE_VERSION = _get_savefile_version(project)
+    persistance.FIX_MISSING_PROJECT_ATTRS(project)
+    if project.SAVEFILE_VERSION < 4:
+        for media_file in project.media_files.values():
+            persistance.FIX_N_TO_4_MEDIA_FILE_COMPATIBILITY(media_file)
+
+def _fix_sequence(seq, SAVEFILE_VERSION):
+    persistance.FIX_N_TO_3_SEQUENCE_COMPATIBILITY(seq)
+    if SAVEFILE_VERSION < 3:
+        for compositor in seq.compositors:
+            persistance.FIX_N_TO_3_COMPOSITOR_COMPABILITY(compositor, SAVEFILE_VERSION)
+
+def _get_savefile_version(project):
+    if not hasattr(project, "SAVEFILE_VERSION"):
+        return 1 # first save files did not have this
+    return project.SAVEFILE_VERSION
@@ -23,6 +23,7 @@ pygtk.require('2.0');
 import gtk
 
 import mlt
+import multiprocessing
 import os
 import threading
 import time
@@ -46,7 +47,6 @@ manager_window = None
 progress_window = None
 proxy_render_issues_window = None
 
-render_thread = None
 runner_thread = None
 load_thread = None
 
@@ -55,113 +55,159 @@ PROXY_SIZE_FULL = 0
 PROXY_SIZE_HALF = 1
 PROXY_SIZE_QUARTER = 2
 
+# Bit rates for proxy files are counted using 2500kbs for 
+# PAL size image as starting point.
+PAL_PIX_COUNT = 720.0 * 576.0
+PAL_PROXY_RATE = 2500.0
+# There are no practical reasons to have bitrates lower than 500kbs.
+MIN_PROXY_RATE = 500
+
+PROGRESS_UPDATE_INTERVAL = 0.1 # seconds
+
+
+class ProxyRenderJob:
+    """
+    Renders proxy file for a single media file.
+    """
+    def __init__(self, media_file, proxy_profile, proxy_w, proxy_h, proxy_encoding, done_event):
+        self.media_file = media_file
+        self.proxy_file_path = media_file.create_proxy_path(proxy_w, proxy_h, proxy_encoding.extension)
+        self.proxy_profile = proxy_profile
+        self.proxy_w = proxy_w
+        self.proxy_h = proxy_h
+        self.proxy_encoding = proxy_encoding
+        self.done_event = done_event # set when render is done so that runner does not need to wait for next update
+        self.render_thread = None
+        self.aborted = False
+
+    def start(self):
+        consumer = renderconsumer.get_render_consumer_for_encoding(
+                                                    self.proxy_file_path,
+                                                    self.proxy_profile, 
+                                                    self.proxy_encoding)
+        consumer.set("vb", str(_get_proxy_bitrate(self.proxy_w, self.proxy_h)) + "k")
+        consumer.set("rescale", "nearest")
+
+        file_producer = mlt.Producer(self.proxy_profile, str(self.media_file.path))
+        mltrefhold.hold_ref(file_producer)
+        stop_frame = file_producer.get_length() - 1
+
+        self.render_thread = renderconsumer.FileRenderPlayer(None, file_producer, consumer, 0, stop_frame)
+        self.render_thread.render_done_callback = self._render_done
+        self.render_thread.start()
+
+    def _render_done(self, render_thread):
+        self.done_event.set()
+
+    def is_done(self):
+        # FileRenderPlayer sets stopped after consumer has written all frames to disk
+        return self.render_thread.stopped == True and self.aborted == False
+
+    def get_render_fraction(self):
+        return self.render_thread.get_render_fraction()
+
+    def abort(self):
+        self.aborted = True
+        self.render_thread.shutdown()
+
 
 class ProxyRenderRunnerThread(threading.Thread):
+    """
+    Renders proxy files with up to editorpersistance.prefs.proxy_render_jobs renders running at the same time.
+    """
     def __init__(self, proxy_profile, files_to_render, set_as_proxy_immediately):
         threading.Thread.__init__(self)
         self.proxy_profile = proxy_profile
         self.files_to_render = files_to_render
         self.set_as_proxy_immediately = set_as_proxy_immediately
         self.aborted = False
+        self.running_jobs = []
+        self.jobs_lock = threading.Lock()
+        self.job_done_event = threading.Event()
 
-    def run(self):        
-        items = 1
+    def run(self):
         global progress_window
         start = time.time()
-        elapsed = 0
         proxy_w, proxy_h =  _get_proxy_dimensions(self.proxy_profile, editorstate.PROJECT().proxy_data.size)
         proxy_encoding = _get_proxy_encoding()
-        self.current_render_file_path = None
-        
-        print "proxy render started, items: " + str(len(self.files_to_render)) + ", dim: " + str(proxy_w) + "x" + str(proxy_h)
-        
-        for media_file in self.files_to_render:
-            if self.aborted == True:
-                break
-
-            # Create render objects
-            proxy_file_path = media_file.create_proxy_path(proxy_w, proxy_h, proxy_encoding.extension)
-            self.current_render_file_path = proxy_file_path
-            consumer = renderconsumer.get_render_consumer_for_encoding(
-                                                        proxy_file_path,
-                                                        self.proxy_profile, 
-                                                        proxy_encoding)
-
-            # Bit rates for proxy files are counted using 2500kbs for 
-            # PAL size image as starting point.
-            pal_pix_count = 720.0 * 576.0
-            pal_proxy_rate = 2500.0
-            proxy_pix_count = float(proxy_w * proxy_h)
-            proxy_rate = pal_proxy_rate * (proxy_pix_count / pal_pix_count)
-            proxy_rate = int(proxy_rate / 100) * 100 # Make proxy rate even hundred
-            # There are no practical reasons to have bitrates lower than 500kbs.
-            if proxy_rate < 500:
-                proxy_rate = 500
-            consumer.set("vb", str(int(proxy_rate)) + "k")
-
-            consumer.set("rescale", "nearest")
-
-            file_producer = mlt.Producer(self.proxy_profile, str(media_file.path))
-            mltrefhold.hold_ref(file_producer)
-            stop_frame = file_producer.get_length() - 1
-
-            # Create and launch render thread
-            global render_thread 
-            render_thread = renderconsumer.FileRenderPlayer(None, file_producer, consumer, 0, stop_frame)
-            render_thread.start()
-
-            # Render view update loop
-            self.thread_running = True
-            self.aborted = False
-            while self.thread_running:
-                if self.aborted == True:
-                    break
-                render_fraction = render_thread.get_render_fraction()
-                now = time.time()
-                elapsed = now - start
-                gtk.gdk.threads_enter()
-                progress_window.update_render_progress(render_fraction, media_file.name, items, len(self.files_to_render), elapsed)
-                gtk.gdk.threads_leave()
-                render_thread.producer.get_length()
-                if render_thread.producer.frame() >= stop_frame:
-                    self.thread_running = False
-                    media_file.add_proxy_file(proxy_file_path)
-                    if self.set_as_proxy_immediately: # When proxy mode is USE_PROXY_MEDIA all proxy files are used all the time
-                        media_file.set_as_proxy_media_file()
-                    self.current_render_file_path = None
-                else:
-                    time.sleep(0.1)
-
-            if not self.aborted:
-                items = items + 1
-                gtk.gdk.threads_enter()
-                progress_window.update_render_progress(0, media_file.name, items, len(self.files_to_render), elapsed)
-                gtk.gdk.threads_leave()
-            else:
-                print "proxy render aborted"
-                render_thread.shutdown()
-                break
-
-            render_thread.shutdown()
+        max_jobs = _get_proxy_render_jobs_count()
+        items_count = len(self.files_to_render)
+        waiting_files = list(self.files_to_render)
+        done_items = 0
+
+        print "proxy render started, items: " + str(items_count) + ", dim: " + str(proxy_w) + "x" + str(proxy_h) + ", jobs: " + str(max_jobs)
+
+        while (len(waiting_files) > 0 or len(self.running_jobs) > 0) and self.aborted == False:
+            # Cleared before jobs are checked so that a job finishing after check is not missed by wait below
+            self.job_done_event.clear()
+
+            # Launch renders until max jobs are running
+            self.jobs_lock.acquire()
+            while len(waiting_files) > 0 and len(self.running_jobs) < max_jobs and self.aborted == False:
+                job = ProxyRenderJob(waiting_files.pop(0), self.proxy_profile, proxy_w, proxy_h, proxy_encoding, self.job_done_event)
+                job.start()
+                self.running_jobs.append(job)
+            self.jobs_lock.release()
+
+            # Add finished proxy files
+            for job in list(self.running_jobs):
+                if job.is_done() and self._job_done(job):
+                    done_items = done_items + 1
+
+            # Update progress, aggregate fraction counts running renders as partially done items
+            jobs_progress = [(job.media_file.name, job.get_render_fraction()) for job in self.running_jobs]
+            running_fraction = sum([fraction for name, fraction in jobs_progress])
+            total_fraction = (float(done_items) + running_fraction) / float(items_count)
+            elapsed = time.time() - start
+            gtk.gdk.threads_enter()
+            progress_window.update_render_progress(total_fraction, jobs_progress, done_items, items_count, elapsed)
+            gtk.gdk.threads_leave()
+
+            # Finished render wakes runner up to start next file immediately
+            self.job_done_event.wait(PROGRESS_UPDATE_INTERVAL)
+
+        if self.aborted == True:
+            print "proxy render aborted"
 
         gtk.gdk.threads_enter()
         _proxy_render_stopped()
         gtk.gdk.threads_leave()
 
-        # Remove unfinished proxy files
-        if self.current_render_file_path != None:
-            os.remove(self.current_render_file_path)
         # If we're currently proxy editing, we need to update 
         # all the clips on the timeline to use proxy media.
         if editorstate.PROJECT().proxy_data.proxy_mode == appconsts.USE_PROXY_MEDIA:
             _auto_renconvert_after_proxy_render_in_proxy_mode()
         
         print "proxy render done"
-        
+
+    def _job_done(self, job):
+        self.jobs_lock.acquire()
+        if not job in self.running_jobs: # render was aborted
+            self.jobs_lock.release()
+            return False
+        self.running_jobs.remove(job)
+        self.jobs_lock.release()
+
+        media_file = job.media_file
+        media_file.add_proxy_file(job.proxy_file_path)
+        if self.set_as_proxy_immediately: # When proxy mode is USE_PROXY_MEDIA all proxy files are used all the time
+            media_file.set_as_proxy_media_file()
+        editorstate.PROJECT().index_media_file(media_file)
+        return True
+
     def abort(self):
-        render_thread.shutdown()
+        # Stops all running renders and removes their unfinished proxy files
+        self.jobs_lock.acquire()
         self.aborted = True
-        self.thread_running = False
+        for job in self.running_jobs:
+            job.abort()
+            job.render_thread.join()
+            try:
+                os.remove(job.proxy_file_path)
+            except OSError:
+                pass
+        self.running_jobs = []
+        self.jobs_lock.release()
 
 
 class ProxyManagerDialog:
@@ -318,17 +364,18 @@ class ProxyRenderProgressDialog:
         self.items_value = gtk.Label()
         
         est_label = guiutils.get_right_justified_box([guiutils.bold_label(_("Elapsed:"))])
-        current_label = guiutils.get_right_justified_box([guiutils.bold_label(_("Current Media File:"))])
-        items_label = guiutils.get_right_justified_box([guiutils.bold_label(_("Rendering Item:"))])
+        current_label = guiutils.get_right_justified_box([guiutils.bold_label(_("Current Media Files:"))])
+        items_label = guiutils.get_right_justified_box([guiutils.bold_label(_("Rendered Items:"))])
         
         est_label.set_size_request(250, 20)
         current_label.set_size_request(250, 20)
+        self.current_render_value.set_alignment(0.0, 0.0)
         items_label.set_size_request(250, 20)
 
         info_vbox = gtk.VBox(False, 0)
         info_vbox.pack_start(guiutils.get_left_justified_box([est_label, self.elapsed_value]), False, False, 0)
-        info_vbox.pack_start(guiutils.get_left_justified_box([current_label, self.current_render_value]), False, False, 0)
         info_vbox.pack_start(guiutils.get_left_justified_box([items_label, self.items_value]), False, False, 0)
+        info_vbox.pack_start(guiutils.get_left_justified_box([current_label, self.current_render_value]), False, False, 0)
 
         progress_vbox = gtk.VBox(False, 2)
         progress_vbox.pack_start(info_vbox, False, False, 0)
@@ -345,11 +392,12 @@ class ProxyRenderProgressDialog:
         self.dialog.connect('response', self.stop_pressed)
         self.dialog.show()
 
-    def update_render_progress(self, fraction, media_file_name, current_item, items, elapsed):
+    def update_render_progress(self, fraction, jobs_progress, done_items, items, elapsed):
         elapsed_str= "  " + utils.get_time_str_for_sec_float(elapsed)
         self.elapsed_value .set_text(elapsed_str)
-        self.current_render_value.set_text(" " + media_file_name)
-        self.items_value.set_text( " " + str(current_item) + "/" + str(items))
+        jobs_lines = [" " + name + "  " + str(int(job_fraction * 100)) + " %" for name, job_fraction in jobs_progress]
+        self.current_render_value.set_text("\n".join(jobs_lines))
+        self.items_value.set_text( " " + str(done_items) + "/" + str(items))
         self.render_progress_bar.set_fraction(fraction)
         self.render_progress_bar.set_text(str(int(fraction * 100)) + " %")
 
@@ -440,6 +488,7 @@ class ProxyRenderIssuesWindow:
                     f.add_existing_proxy_file(self.proxy_w, self.proxy_h, self.proxy_file_extension)
                     if editorstate.PROJECT().proxy_data.proxy_mode == appconsts.USE_PROXY_MEDIA:
                         f.set_as_proxy_media_file()
+                    editorstate.PROJECT().index_media_file(f)
         
             else: # Rerender All Possible
                 # We can't mess existing proxy files that are used by other projects
@@ -560,6 +609,23 @@ def _get_proxy_encoding():
     enc_index = editorstate.PROJECT().proxy_data.encoding
     return renderconsumer.proxy_encodings[enc_index]
 
+def _get_proxy_render_jobs_count():
+    jobs = editorpersistance.prefs.proxy_render_jobs
+    if jobs == editorpersistance.PROXY_RENDER_JOBS_AUTO:
+        try:
+            jobs = max(1, min(multiprocessing.cpu_count() / 2, editorpersistance.PROXY_RENDER_JOBS_MAX))
+        except NotImplementedError:
+            jobs = 2
+    return jobs
+
+def _get_proxy_bitrate(proxy_w, proxy_h):
+    proxy_pix_count = float(proxy_w * proxy_h)
+    proxy_rate = PAL_PROXY_RATE * (proxy_pix_count / PAL_PIX_COUNT)
+    proxy_rate = int(proxy_rate / 100) * 100 # Make proxy rate even hundred
+    if proxy_rate < MIN_PROXY_RATE:
+        proxy_rate = MIN_PROXY_RATE
+    return proxy_rate
+
 def _get_proxy_dimensions(project_profile, proxy_size):
     # Get new dimension that are about half of previous and diviseble by eight
     if proxy_size == PROXY_SIZE_FULL:
@@ -49,6 +49,7 @@ import projectdata
 import projectinfogui
 import renderconsumer
 import rendergui
+import segmentrender
 import sequence
 import utils
 
@@ -63,6 +64,9 @@ progress_window = None
 
 aborted = False
 
+# Segment rendering
+segment_render_thread = None
+
 # Motion clip rendering
 motion_renderer = None
 motion_progress_update = None
@@ -164,15 +168,95 @@ def _do_rendering():
                                                        
     set_render_gui()
 
+    if widgets.segments_check.get_active() == True and _start_segment_rendering(start_frame, end_frame):
+        return
+
     render_launch = RenderLauncher(render_consumer, start_frame, end_frame)
     render_launch.start()
 
 def _render_cancel_callback(dialog, response_id):
-    global aborted
+    global aborted, segment_render_thread
     aborted = True
     dialog.destroy()
+    if segment_render_thread != None:
+        segment_render_thread.abort()
+        segment_render_thread = None
+        return
     PLAYER().consumer.stop()
     PLAYER().producer.set_speed(0)
+
+# -------------------------------------------------- segment rendering
+def _start_segment_rendering(start_frame, end_frame):
+    """
+    Returns False if current render can not be done in segments and should be rendered normally.
+    """
+    if end_frame == -1:
+        end_frame = current_sequence().get_length() - 1
+    if widgets.render_type_panel.type_combo.get_active() == 1: # Preset encodings
+        encoding_option = renderconsumer.non_user_encodings[widgets.render_type_panel.presets_selector.widget.get_active()]
+        if encoding_option.type == "img_seq": # Image sequences are not joined
+            return False
+    if not segmentrender.can_render_in_segments(start_frame, end_frame):
+        print "segment render not possible, rendering in single process"
+        return False
+    args_vals_list = get_args_vals_list_for_current_selections()
+    if args_vals_list == None:
+        return False
+
+    work_dir = utils.get_hidden_user_dir_path() + segmentrender.SEGMENTS_DIR
+    segmentrender.create_work_dir(work_dir)
+    profile_path = work_dir + segmentrender.PROFILE_FILE
+    segmentrender.write_profile_file(get_current_profile(), profile_path)
+
+    cut_frames = segmentrender.get_cut_frames(current_sequence())
+    segments = segmentrender.get_segments(cut_frames, start_frame, end_frame,
+                                          segmentrender.WORKERS_COUNT * segmentrender.SEGMENTS_PER_WORKER,
+                                          segmentrender.get_gop_size(args_vals_list))
+
+    global segment_render_thread
+    segment_render_thread = segmentrender.SegmentRenderThread(work_dir,
+                                                              work_dir + segmentrender.SEQUENCE_XML,
+                                                              profile_path,
+                                                              get_file_path(),
+                                                              args_vals_list,
+                                                              segments,
+                                                              _segment_render_progress,
+                                                              _segment_render_done)
+    save_render_start_time()
+
+    # Sequence XML is written using app player, segment render is started after that
+    xml_render = renderconsumer.XMLRenderPlayer(work_dir + segmentrender.SEQUENCE_XML,
+                                                _segment_xml_written,
+                                                segment_render_thread)
+    xml_render.start()
+    return True
+
+def _segment_xml_written(render_thread):
+    if render_thread == segment_render_thread:
+        render_thread.start()
+    else: # render was aborted while writing xml
+        segmentrender.remove_work_dir(render_thread.work_dir)
+
+def _segment_render_progress(fraction):
+    gtk.gdk.threads_enter()
+    if progress_window != None:
+        set_render_progress_gui(fraction)
+    gtk.gdk.threads_leave()
+
+def _segment_render_done(error):
+    global segment_render_thread
+    segment_render_thread = None
+
+    gtk.gdk.threads_enter()
+    if error != None:
+        global progress_window
+        progress_window.destroy()
+        progress_window = None
+        dialogutils.warning_message(_("Render failed"), error, gui.editor_window.window)
+    else:
+        exit_render_gui()
+        maybe_open_rendered_file_in_bin()
+    gtk.gdk.threads_leave()
     
 # -------------------------------------------------- render consumer
 def get_render_consumer():
@@ -219,9 +303,8 @@ def get_args_vals_list_for_current_selections():
     quality_option_index = widgets.encoding_panel.quality_selector.widget.get_active()
         
     if widgets.render_type_panel.type_combo.get_active() == 1: # Preset encodings
-        args_vals_list = renderconsumer.get_args_vals_tuples_list_for_encoding_and_quality( profile, 
-                                                                                            encoding_option_index, 
-                                                                                            -1)
+        encoding_option = renderconsumer.non_user_encodings[widgets.render_type_panel.presets_selector.widget.get_active()]
+        args_vals_list = encoding_option.get_args_vals_tuples_list(profile)
     elif widgets.args_panel.use_args_check.get_active() == False: # User encodings
         args_vals_list = renderconsumer.get_args_vals_tuples_list_for_encoding_and_quality( profile, 
                                                                                             encoding_option_index, 
@@ -268,6 +351,9 @@ def create_widgets(normal_height):
     widgets.reset_button.connect("clicked", lambda w: set_default_values_for_widgets())
     widgets.queue_button = gtk.Button(_("To Queue"))
     widgets.queue_button.set_tooltip_text(_("Save Project in Render Queue"))
+    widgets.segments_check = gtk.CheckButton()
+    widgets.segments_check.set_tooltip_text(_("Render segments of range in parallel processes and join them without re-encoding"))
+    widgets.segments_check.set_sensitive(segmentrender.segment_render_available())
     
     # Tooltips
     widgets.range_cb.set_tooltip_text(_("Select render range"))
@@ -496,20 +582,15 @@ def _render_frame_buffer_clip_dialog_callback(dialog, response_id, fb_widgets, m
         # start and end frames
         start_frame = 0
         end_frame = motion_producer.get_length() - 1
-        wait_for_producer_stop = True
         if range_selection == 1:
             start_frame = int(float(media_file.mark_in) * (1.0 / speed))
-            end_frame = int(float(media_file.mark_out + 1) * (1.0 / speed)) + int(1.0 / speed) #+ 40 # I'm unable to get this frame perfect.
-                                                                                                    # +40 is to make sure rendering stops after mark out.
+            end_frame = int(float(media_file.mark_out + 1) * (1.0 / speed)) - 1 # last motion frame before frame after mark out
             if end_frame > motion_producer.get_length() - 1:
                 end_frame = motion_producer.get_length() - 1
-            
-            wait_for_producer_stop = False # consumer wont stop automatically and needs to stopped explicitly
 
         # Launch render
         global motion_renderer, motion_progress_update
         motion_renderer = renderconsumer.FileRenderPlayer(write_file, seq.tractor, consumer, start_frame, end_frame)
-        motion_renderer.wait_for_producer_end_stop = wait_for_producer_stop
         motion_renderer.start()
 
         title = _("Rendering Motion Clip")
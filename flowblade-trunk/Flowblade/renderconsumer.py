@@ -39,6 +39,9 @@ from editorstate import PROJECT
 # File describing existing encoding and quality options
 RENDER_ENCODING_FILE = "/res/render/renderencoding.xml"
 
+RENDER_STOP_POLL_INTERVAL = 0.02 # seconds
+PROGRESS_UPDATE_INTERVAL = 0.33 # seconds
+
 # Node, attribute names.
 NAME = "name"
 TYPE = "type"
@@ -357,6 +360,14 @@ def _parse_line(line_start, line_end, buf):
 
 
 class FileRenderPlayer(threading.Thread):
+    """
+    Renders producer range start_frame - stop_frame, both inclusive, into consumer.
+
+    Producer is limited to render range with in and out points for the duration of the render,
+    so consumer stops by itself after it has written the last frame of range. Thread waits for
+    consumer to stop, sets 'stopped' and 'done' and calls 'render_done_callback' if it is set.
+    Callback is called from this thread. Original producer in and out points are restored after render.
+    """
     def __init__(self, file_name, producer, consumer, start_frame, stop_frame):
         self.file_name = file_name
         self.producer = producer
@@ -364,45 +375,36 @@ class FileRenderPlayer(threading.Thread):
         self.start_frame = start_frame
         self.stop_frame = stop_frame
         self.stopped = False
-        self.wait_for_producer_end_stop = True
         self.running = False
         self.has_started_running = False
+        self.done = threading.Event() # set when render has stopped, also after abort
+        self.render_done_callback = None # render_done_callback(file_render_player), not called after abort
         print "FileRenderPlayer started, start frame: " + str(self.start_frame) + ", stop frame: " + str(self.stop_frame)
-        self.consumer_pos_stop_add = 1 # HACK!!! File renders work then this one, screenshot render requires this to be 2 to work 
         threading.Thread.__init__(self)
 
     def run(self):
         self.running = True
         self.has_started_running = True
+        orig_in = self.producer.get_in()
+        orig_out = self.producer.get_out()
         self.connect_and_start()
 
-        while self.running: # set false at shutdown() for abort
-            if self.producer.frame() >= self.stop_frame:
-                # This method of stopping makes sure that whole producer is rendered and written to disk
-                # Used when producer out frame is last frame.
-                if self.wait_for_producer_end_stop:
-                    while self.producer.get_speed() > 0:
-                        time.sleep(0.2)
-                    while not self.consumer.is_stopped():
-                        time.sleep(0.2)
-                # This method of stopping stops producer
-                # and waits for consumer to reach that frame.
-                # Used when producer out frame is NOT last frame.
-                else:
-                    self.producer.set_speed(0)
-                    last_frame = self.producer.frame()
-                    while self.consumer.position() + self.consumer_pos_stop_add < last_frame:
-                        time.sleep(0.2)
-
-                    self.consumer.stop()
-                                        
-                self.running = False
-
-            time.sleep(0.1)
+        # Consumer stops when producer reaches out point, is_stopped() is cheap enough
+        # to be checked often and short renders finish without extra delay.
+        while self.running and not self.consumer.is_stopped(): # running set false at shutdown() for abort
+            time.sleep(RENDER_STOP_POLL_INTERVAL)
 
+        aborted = (self.running == False)
+        self.consumer.stop()
+        self.producer.set_speed(0)
         print "FileRenderPlayer stopped, producer frame: " + str(self.producer.frame())
+        self.producer.set_in_and_out(orig_in, orig_out)
+        self.running = False
 
         self.stopped = True
+        self.done.set()
+        if self.render_done_callback != None and not aborted:
+            self.render_done_callback(self)
                 
     def shutdown(self):
         self.consumer.stop()
@@ -412,17 +414,19 @@ class FileRenderPlayer(threading.Thread):
     def connect_and_start(self):
         self.consumer.connect(self.producer)
         self.producer.set_speed(0)
-        self.producer.seek(self.start_frame)
+        self.producer.set_in_and_out(self.start_frame, self.stop_frame)
+        self.producer.seek(0) # positions are relative to in point
         self.producer.set_speed(1)
         self.consumer.start()
 
     def get_render_fraction(self):
+        if self.stopped:
+            return 1.0
+        if self.running == False:
+            return 0.0
         render_length = self.stop_frame - self.start_frame + 1
-        if (self.producer.get_length() - 1) < 1:
-            render_fraction = 1.0
-        else:
-            current_frame = self.producer.frame() - self.start_frame
-            render_fraction = (float(current_frame)) / (float(render_length))
+        current_frame = self.producer.frame() - self.start_frame # frame() is not relative to in point
+        render_fraction = float(current_frame) / float(render_length)
         if render_fraction > 1.0:
             render_fraction = 1.0
         return render_fraction
@@ -508,5 +512,6 @@ class ProgressWindowThread(threading.Thread):
                 self.callback(self.dialog, 0)
                 gtk.gdk.threads_leave()
                 self.running = False
-
-            time.sleep(0.33)
+            else:
+                # Returns immediately when render stops
+                self.clip_renderer.done.wait(PROGRESS_UPDATE_INTERVAL)
@@ -430,6 +430,13 @@ def get_render_panel_right(render_widgets, render_clicked_cb, to_queue_clicked_c
     bin_row.pack_start(render_widgets.args_panel.open_in_bin,  False, False, 0)
     bin_row.pack_start(gtk.Label(), True, True, 0)
 
+    segments_row = gtk.HBox()
+    segments_row.pack_start(guiutils.get_pad_label(10, 8),  False, False, 0)
+    segments_row.pack_start(gtk.Label(_("Render Segments in Parallel:")),  False, False, 0)
+    segments_row.pack_start(guiutils.get_pad_label(10, 2),  False, False, 0)
+    segments_row.pack_start(render_widgets.segments_check,  False, False, 0)
+    segments_row.pack_start(gtk.Label(), True, True, 0)
+
     range_row = gtk.HBox()
     range_row.pack_start(guiutils.get_pad_label(10, 8),  False, False, 0)
     range_row.pack_start(gtk.Label(_("Render Range:")),  False, False, 0)
@@ -456,6 +463,7 @@ def get_render_panel_right(render_widgets, render_clicked_cb, to_queue_clicked_c
     render_panel.pack_start(opts_panel, True, True, 0)
     render_panel.pack_start(guiutils.get_pad_label(10, 22), False, False, 0)
     render_panel.pack_start(bin_row, False, False, 0)
+    render_panel.pack_start(segments_row, False, False, 0)
     render_panel.pack_start(range_row, False, False, 0)
     render_panel.pack_start(guiutils.get_pad_label(10, 12), False, False, 0)
     render_panel.pack_start(buttons_panel, False, False, 0)
@@ -0,0 +1,351 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module renders timeline range as segments in parallel processes and joins them.
+
+Sequence is saved as MLT XML and render range is split into segments at cut points.
+Each segment is rendered without audio by a separate headless render process launched
+with launch/flowbladerender, audio for the whole range is rendered by one more process. Segments and audio are then joined into the output file with ffmpeg concat
+demuxer without re-encoding.
+
+Every segment is a separate encode and starts with a key frame. When no cut is near
+a segment boundary it is aligned to encoding GOP size if encoding args set one.
+
+This module does not import gtk, callers update GUI in callbacks.
+"""
+
+import distutils.spawn
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import threading
+
+import headlessrender
+import respaths
+
+SEGMENTS_DIR = "segmentrender/" # in user hidden dir
+SEQUENCE_XML = "sequence.mlt"
+PROFILE_FILE = "profile"
+SEGMENTS_LIST = "segments.txt"
+SEGMENT_FILE = "segment_"
+AUDIO_FILE = "audio"
+
+VIDEO_SEGMENT = "video"
+AUDIO_SEGMENT = "audio"
+
+FFMPEG_EXECUTABLE = "ffmpeg"
+
+MIN_SEGMENT_LENGTH = 250 # frames, shorter renders gain little from parallel processes
+SEGMENTS_PER_WORKER = 2 # more segments than workers evens out differences in segment render speeds
+CUT_SNAP_FRACTION = 0.25 # segment boundary moves to cut closer than this fraction of segment length
+
+PROGRESS_UPDATE_INTERVAL = 0.25 # seconds
+
+try:
+    WORKERS_COUNT = max(1, min(multiprocessing.cpu_count(), 8))
+except NotImplementedError:
+    WORKERS_COUNT = 2
+
+
+# --------------------------------------------------- availability
+def get_ffmpeg_path():
+    return distutils.spawn.find_executable(FFMPEG_EXECUTABLE)
+
+def segment_render_available():
+    return get_ffmpeg_path() != None
+
+def can_render_in_segments(start_frame, end_frame):
+    """
+    Returns True if range is long enough to be split and encoding output can be concatenated.
+    """
+    if not segment_render_available():
+        return False
+    if end_frame - start_frame + 1 < MIN_SEGMENT_LENGTH * 2:
+        return False
+    return True
+
+
+# --------------------------------------------------- segments
+def get_cut_frames(seq):
+    """
+    Returns sorted list of timeline frames where clips start or end on editable tracks.
+    """
+    cut_frames = set()
+    for track in seq.tracks[1:len(seq.tracks) - 1]:
+        frame = 0
+        for clip in track.clips:
+            if clip.is_blanck_clip == False:
+                cut_frames.add(frame)
+            frame = frame + clip.clip_out - clip.clip_in + 1
+            cut_frames.add(frame)
+    return sorted(cut_frames)
+
+def get_segments(cut_frames, start_frame, end_frame, segments_count, gop_size=0):
+    """
+    Returns list of (in_frame, out_frame) tuples, out inclusive, covering range.
+    """
+    length = end_frame - start_frame + 1
+    segments_count = max(1, min(segments_count, length / MIN_SEGMENT_LENGTH))
+    segment_length = float(length) / segments_count
+    snap_distance = segment_length * CUT_SNAP_FRACTION
+
+    boundaries = [start_frame]
+    for i in range(1, segments_count):
+        target = start_frame + int(i * segment_length)
+        boundary = _get_closest_cut(cut_frames, target, snap_distance)
+        if boundary == None:
+            boundary = target
+            if gop_size > 0:
+                boundary = start_frame + int(round(float(target - start_frame) / gop_size)) * gop_size
+        # Boundaries must stay in order and segments must not get too short
+        if boundary - boundaries[-1] >= MIN_SEGMENT_LENGTH / 2 and end_frame + 1 - boundary >= MIN_SEGMENT_LENGTH / 2:
+            boundaries.append(boundary)
+    boundaries.append(end_frame + 1)
+
+    return [(boundaries[i], boundaries[i + 1] - 1) for i in range(0, len(boundaries) - 1)]
+
+def get_gop_size(args_vals_list):
+    for arg, val in args_vals_list:
+        if arg == "g":
+            try:
+                return int(val)
+            except ValueError:
+                return 0
+    return 0
+
+def _get_closest_cut(cut_frames, target, snap_distance):
+    closest = None
+    for frame in cut_frames:
+        if abs(frame - target) <= snap_distance:
+            if closest == None or abs(frame - target) < abs(closest - target):
+                closest = frame
+    return closest
+
+
+# --------------------------------------------------- rendering
+class SegmentRenderJob:
+    """
+    Worker process rendering a range of sequence XML into a file.
+    """
+    def __init__(self, segment_type, in_frame, out_frame, file_path, done_event):
+        self.segment_type = segment_type
+        self.in_frame = in_frame
+        self.out_frame = out_frame
+        self.file_path = file_path
+        self.done_event = done_event # set when process exits
+        self.process = None
+        self.fraction = 0.0
+        self.reader_thread = None
+
+    def start(self, xml_path, profile_path, args_vals_list):
+        args = [sys.executable, respaths.LAUNCH_DIR + "flowbladerender",
+                "--profile", profile_path, "--output", self.file_path,
+                "--in", str(self.in_frame), "--out", str(self.out_frame)]
+        for arg, val in args_vals_list:
+            args += ["--arg", str(arg) + "=" + str(val)]
+        if self.segment_type == VIDEO_SEGMENT:
+            args += ["--arg", "an=1"]
+        else:
+            args += ["--arg", "vn=1"]
+        args.append(xml_path)
+
+        FNULL = open(os.devnull, 'w')
+        self.process = subprocess.Popen(args, stdin=FNULL, stdout=subprocess.PIPE, stderr=FNULL)
+        self.reader_thread = threading.Thread(target=self._read_progress)
+        self.reader_thread.daemon = True
+        self.reader_thread.start()
+
+    def _read_progress(self):
+        for line in iter(self.process.stdout.readline, ""):
+            if line.startswith(headlessrender.PROGRESS_LINE):
+                try:
+                    self.fraction = float(line[len(headlessrender.PROGRESS_LINE):])
+                except ValueError:
+                    pass
+        # stdout closes when process exits, this thread is the only one waiting for process
+        self.process.wait()
+        self.done_event.set()
+
+    def get_length(self):
+        return self.out_frame - self.in_frame + 1
+
+    def is_running(self):
+        return self.reader_thread != None and self.reader_thread.is_alive()
+
+    def succeeded(self):
+        return self.process != None and self.process.returncode == 0 and os.path.exists(self.file_path)
+
+    def abort(self):
+        if self.is_running():
+            self.process.terminate()
+            self.reader_thread.join()
+
+
+class SegmentRenderThread(threading.Thread):
+    """
+    Renders segments in parallel processes and joins them into output file.
+
+    progress_callback(fraction) is called while rendering and done_callback(error)
+    when done, error is None if render succeeded.
+    """
+    def __init__(self, work_dir, xml_path, profile_path, render_path, args_vals_list,
+                 segments, progress_callback, done_callback):
+        threading.Thread.__init__(self)
+        self.work_dir = work_dir
+        self.xml_path = xml_path
+        self.profile_path = profile_path
+        self.render_path = render_path
+        self.args_vals_list = args_vals_list
+        self.segments = segments
+        self.progress_callback = progress_callback
+        self.done_callback = done_callback
+        self.aborted = False
+        self.running_jobs = []
+        self.jobs_lock = threading.Lock()
+        self.job_done_event = threading.Event()
+
+    def run(self):
+        work_dir = self.work_dir
+        extension = os.path.splitext(self.render_path)[1]
+        video_frames = sum([out_frame - in_frame + 1 for in_frame, out_frame in self.segments])
+
+        video_jobs = []
+        for i in range(0, len(self.segments)):
+            in_frame, out_frame = self.segments[i]
+            file_path = work_dir + SEGMENT_FILE + "%03d" % i + extension
+            video_jobs.append(SegmentRenderJob(VIDEO_SEGMENT, in_frame, out_frame, file_path, self.job_done_event))
+        audio_job = None
+        if _has_audio(self.args_vals_list):
+            audio_job = SegmentRenderJob(AUDIO_SEGMENT, self.segments[0][0], self.segments[-1][1],
+                                         work_dir + AUDIO_FILE + extension, self.job_done_event)
+
+        # Audio is rendered in its own process next to video workers
+        waiting_jobs = list(video_jobs)
+        if audio_job != None:
+            self._start_job(audio_job)
+
+        error = None
+        while (len(waiting_jobs) > 0 or len(self.running_jobs) > 0) and self.aborted == False:
+            # Cleared before jobs are checked so that a job finishing after check is not missed by wait below
+            self.job_done_event.clear()
+            self.jobs_lock.acquire()
+            for job in list(self.running_jobs):
+                if not job.is_running():
+                    self.running_jobs.remove(job)
+                    if not job.succeeded():
+                        error = "Rendering segment " + os.path.basename(job.file_path) + " failed."
+            running_video_jobs = len([job for job in self.running_jobs if job.segment_type == VIDEO_SEGMENT])
+            while len(waiting_jobs) > 0 and running_video_jobs < WORKERS_COUNT and error == None and self.aborted == False:
+                self._start_job(waiting_jobs.pop(0), False)
+                running_video_jobs += 1
+            self.jobs_lock.release()
+
+            if error != None:
+                # Failed render is reported to user, jobs are stopped without setting aborted
+                self._stop_jobs()
+                break
+
+            frames_done = sum([job.fraction * job.get_length() for job in video_jobs])
+            self.progress_callback(float(frames_done) / float(video_frames))
+
+            # Exiting render process wakes thread up to start next segment immediately
+            self.job_done_event.wait(PROGRESS_UPDATE_INTERVAL)
+
+        if self.aborted == False and error == None:
+            error = self._join_segments(work_dir, video_jobs, audio_job)
+
+        remove_work_dir(work_dir)
+
+        if self.aborted == True: # user cancelled render
+            return
+
+        self.done_callback(error)
+
+    def _start_job(self, job, acquire_lock=True):
+        if acquire_lock:
+            self.jobs_lock.acquire()
+        job.start(self.xml_path, self.profile_path, self.args_vals_list)
+        self.running_jobs.append(job)
+        if acquire_lock:
+            self.jobs_lock.release()
+
+    def _join_segments(self, work_dir, video_jobs, audio_job):
+        # Segment file names are written relative to list file so that concat demuxer accepts them
+        list_file = open(work_dir + SEGMENTS_LIST, "w")
+        for job in video_jobs:
+            list_file.write("file '" + os.path.basename(job.file_path) + "'\n")
+        list_file.close()
+
+        args = [get_ffmpeg_path(), "-y", "-f", "concat", "-i", work_dir + SEGMENTS_LIST]
+        if audio_job != None:
+            args += ["-i", audio_job.file_path, "-map", "0:v", "-map", "1:a"]
+        args += ["-c", "copy", self.render_path]
+
+        FNULL = open(os.devnull, 'w')
+        if subprocess.call(args, stdin=FNULL, stdout=FNULL, stderr=FNULL) != 0:
+            return "Joining rendered segments failed."
+        return None
+
+    def abort(self):
+        self.jobs_lock.acquire()
+        self.aborted = True
+        self.jobs_lock.release()
+        self._stop_jobs()
+
+    def _stop_jobs(self):
+        self.jobs_lock.acquire()
+        for job in self.running_jobs:
+            job.abort()
+        self.running_jobs = []
+        self.jobs_lock.release()
+
+
+def create_work_dir(work_dir):
+    remove_work_dir(work_dir)
+    os.mkdir(work_dir)
+
+def remove_work_dir(work_dir):
+    if os.path.exists(work_dir):
+        shutil.rmtree(work_dir)
+
+def write_profile_file(profile, file_path):
+    file_contents = "description=" + profile.description() + "\n"
+    file_contents += "frame_rate_num=" + str(profile.frame_rate_num()) + "\n"
+    file_contents += "frame_rate_den=" + str(profile.frame_rate_den()) + "\n"
+    file_contents += "width=" + str(profile.width()) + "\n"
+    file_contents += "height=" + str(profile.height()) + "\n"
+    file_contents += "progressive=" + str(profile.progressive()) + "\n"
+    file_contents += "sample_aspect_num=" + str(profile.sample_aspect_num()) + "\n"
+    file_contents += "sample_aspect_den=" + str(profile.sample_aspect_den()) + "\n"
+    file_contents += "display_aspect_num=" + str(profile.display_aspect_num()) + "\n"
+    file_contents += "display_aspect_den=" + str(profile.display_aspect_den()) + "\n"
+
+    profile_file = open(file_path, "w")
+    profile_file.write(file_contents)
+    profile_file.close()
+
+def _has_audio(args_vals_list):
+    for arg, val in args_vals_list:
+        if arg == "an" and str(val) == "1":
+            return False
+    return True
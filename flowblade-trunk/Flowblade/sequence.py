@@ -27,12 +27,15 @@ import mlt
 import os
 
 import appconsts
+import compositorindex
 import edit
 import editorstate
+import mltbuild
 import mltfilters
 import mlttransitions
 import mltrefhold
 import patternproducer
+import producerpool
 import utils
 
 # Media types for tracks or clips
@@ -91,7 +94,7 @@ black_track_clip = None
 MUTE_STATES = [(True, True), (False, True), (True, False), (False, False)]
 
 # Track that all audio is mixed down to combine for output.
-AUDIO_MIX_DOWN_TRACK = 0
+AUDIO_MIX_DOWN_TRACK = mltbuild.AUDIO_MIX_DOWN_TRACK
 
 
 class Sequence:
@@ -107,7 +110,8 @@ class Sequence:
         self.master_audio_gain = 1.0
         self.master_audio_pan = NO_PAN
         self.tracks = []
-        self.compositors = []
+        self.compositors = [] # in stacking order, see sort_compositors()
+        self.compositor_index = None # built when needed, see get_compositor_index()
         self.markers = [] # markers are tuples (name_str, frame_int)
         self.proxyclips = {}
         self.rendered_versions = {} 
@@ -134,9 +138,7 @@ class Sequence:
             self.add_track_pan_filter(self.tractor, self.master_audio_pan)
 
         # Create and ad gain filter
-        gain_filter = mlt.Filter(self.profile, "volume")
-        mltrefhold.hold_ref(gain_filter)
-        gain_filter.set("gain", str(self.master_audio_gain))
+        gain_filter = mltbuild.create_gain_filter(self.profile, self.master_audio_gain)
         self.tractor.attach(gain_filter)
         self.tractor.gain_filter = gain_filter
         
@@ -275,18 +277,11 @@ class Sequence:
 
     def _mix_audio_for_track(self, track):
         # Create and add transition to combine track audios
-        transition = mlt.Transition(self.profile, "mix")
-        mltrefhold.hold_ref(transition)
-        transition.set("a_track", int(AUDIO_MIX_DOWN_TRACK))
-        transition.set("b_track", track.id)
-        transition.set("always_active", 1)
-        transition.set("combine", 1)
+        transition = mltbuild.create_audio_mix_transition(self.profile, track.id)
         self.field.plant_transition(transition, int(AUDIO_MIX_DOWN_TRACK), track.id)
 
         # Create and ad gain filter
-        gain_filter = mlt.Filter(self.profile, "volume")
-        mltrefhold.hold_ref(gain_filter)
-        gain_filter.set("gain", str(track.audio_gain))
+        gain_filter = mltbuild.create_gain_filter(self.profile, track.audio_gain)
         track.attach(gain_filter)
         track.gain_filter = gain_filter
 
@@ -340,9 +335,7 @@ class Sequence:
 
     def add_track_pan_filter(self, track, value):
         # This method is used for master too, and called with tractor then
-        pan_filter = mlt.Filter(self.profile, "panner")
-        mltrefhold.hold_ref(pan_filter)
-        pan_filter.set("start", value)
+        pan_filter = mltbuild.create_pan_filter(self.profile, value)
         track.attach(pan_filter)
         track.pan_filter = pan_filter 
 
@@ -371,12 +364,20 @@ class Sequence:
         return True
 
     # -------------------------------------------------- clips
-    def create_file_producer_clip(self, path, new_clip_name=None):
+    def create_file_producer_clip(self, path, new_clip_name=None, track_id=None):
         """
         Creates MLT Producer and adds attributes to it, but does 
         not add it to track/playlist object.
+
+        Producer is a cut of parent producer shared by clips of media file on track with
+        id track_id, see producerpool.py.
         """
-        producer = mlt.Producer(self.profile, str(path)) # this runs 0.5s+ on some clips
+        media_type = get_media_type(path)
+        if media_type == FILE_DOES_NOT_EXIST:
+            print "file does not exist"
+            return None
+
+        producer = producerpool.get_cut(self.profile, path, track_id)
         mltrefhold.hold_ref(producer)
         producer.path = path
         producer.filters = []
@@ -386,10 +387,7 @@ class Sequence:
         producer.name = name
         if new_clip_name != None:
             producer.name = new_clip_name
-        producer.media_type = get_media_type(path)
-        if producer.media_type == FILE_DOES_NOT_EXIST:
-            print "file does not exist"
-            return None
+        producer.media_type = media_type
 
         self.add_clip_attr(producer)
         
@@ -425,8 +423,8 @@ class Sequence:
         self.add_clip_attr(clip)
         return clip
 
-    def create_rendered_transition_clip(self, path, rendered_type):
-        clip = self.create_file_producer_clip(path)
+    def create_rendered_transition_clip(self, path, rendered_type, track_id=None):
+        clip = self.create_file_producer_clip(path, None, track_id)
         clip.rendered_type = rendered_type
         return clip
     
@@ -454,7 +452,7 @@ class Sequence:
 
     def create_clone_clip(self, clip):
         if clip.media_type != appconsts.PATTERN_PRODUCER:
-            clone_clip = self.create_file_producer_clip(clip.path) # file producer
+            clone_clip = self.create_file_producer_clip(clip.path, None, producerpool.get_track_id(clip)) # file producer
         else:
             clone_clip = self.create_pattern_producer(clip.create_data) # pattern producer
         self.clone_clip_and_filters(clip, clone_clip)
@@ -528,17 +526,29 @@ class Sequence:
         return compositor
 
     def restack_compositors(self):
-        self.sort_compositors()
+        """
+        Plants compositors not yet planted. Compositors after first unplanted one in stacking order
+        need to be planted after it and are replaced with planted clones, compositors before it 
+        are already in correct order in field and are left as they are.
+        """
+        index = self.get_compositor_index()
+
+        first_unplanted = -1
+        for i in range(0, len(self.compositors)):
+            if self.compositors[i].planted == False:
+                first_unplanted = i
+                break
+        if first_unplanted == -1:
+            return
 
-        new_compositors = []
-        for compositor in self.compositors:
+        for i in range(first_unplanted, len(self.compositors)):
+            compositor = self.compositors[i]
             if compositor.planted == False:
                 self._plant_compositor(compositor)
-                new_compositors.append(compositor)
             else:
                 clone_compositor = self._create_and_plant_clone_compositor(compositor)
-                new_compositors.append(clone_compositor)
-        self.compositors = new_compositors
+                index.replace(compositor, clone_compositor)
+                self.compositors[i] = clone_compositor
 
     def _plant_compositor(self, compositor):
         self.field.plant_transition(compositor.transition.mlt_transition, 
@@ -581,11 +591,40 @@ class Sequence:
     def get_compositors(self):
         return self.compositors
 
+    def get_compositor_index(self):
+        """
+        Returns compositorindex.CompositorIndex for compositors, index is rebuilt 
+        if compositors list has been replaced.
+        """
+        try:
+            if self.compositor_index.compositors is self.compositors:
+                return self.compositor_index
+        except AttributeError: # index is None or sequence was loaded from file
+            pass
+
+        self.compositor_index = compositorindex.CompositorIndex(self.compositors)
+        return self.compositor_index
+
     def add_compositor(self, compositor):
-        self.compositors.append(compositor)
+        """
+        Adds compositor last in its track in stacking order, restack_compositors() 
+        needs to be called after this to plant it.
+        """
+        index = self.get_compositor_index()
+        
+        # Compositors on tracks above come first in stacking order
+        insert_pos = 0
+        b_track = compositor.transition.b_track
+        for track_index in index.tracks:
+            if track_index >= b_track:
+                insert_pos += index.get_count(track_index)
+
+        self.compositors.insert(insert_pos, compositor)
+        index.add(compositor)
 
     def remove_compositor(self, old_compositor):
         #edit.old_compositors.append(old_compositor)# HACK. Garbage collecting compositors causes crashes.
+        index = self.get_compositor_index()
         try:
             self.compositors.remove(old_compositor)
         except ValueError: # has been restacked since creation, needs to looked up using destroy_id
@@ -598,9 +637,23 @@ class Sequence:
                     old_compositor = comp
             if found == False:
                 raise ValueError('compositor not found using destroy_id')
-            
+        
+        index.remove(old_compositor)
         self.field.disconnect_service(old_compositor.transition.mlt_transition)
 
+    def set_compositor_in_and_out(self, compositor, in_frame, out_frame):
+        index = self.get_compositor_index()
+        index.remove(compositor)
+        compositor.set_in_and_out(in_frame, out_frame)
+        index.add(compositor)
+
+    def move_compositors(self, compositors, delta):
+        index = self.get_compositor_index()
+        for compositor in compositors:
+            index.remove(compositor)
+            compositor.move(delta)
+            index.add(compositor)
+
     def get_compositor_for_destroy_id(self, destroy_id):
         for comp in self.compositors:
             if comp.destroy_id == destroy_id:
@@ -610,6 +663,8 @@ class Sequence:
     def sort_compositors(self):
         """
         Compositor order must be from top to bottom or will not work.
+        Only needed when compositors list has been replaced, add_compositor() 
+        keeps list in this order.
         """
         self.compositors.sort(_sort_compositors_comparator)
 
@@ -621,6 +676,8 @@ class Sequence:
         pattern_producer_data is MediaFile or AbstractPatternProduer object
         """
         track = self.tracks[-1] # Always last track
+        if getattr(self, "monitor_clip", None) != None: # not set before first display and after load
+            producerpool.release_cut(self.monitor_clip)
         if pattern_producer_data == None:
             self.monitor_clip = self.create_file_producer_clip(path)
         else:
@@ -639,6 +696,8 @@ class Sequence:
         Adds clip to hidden track for trim editing display.
         """
         track = self.tracks[-1] # Always last track
+        for clip in track.clips:
+            producerpool.release_cut(clip)
         track.clear() # # TRIM INIT CRASH HACK, see clear_hidden_track there may be blank clip here
         track.clips = []
 
@@ -756,10 +815,7 @@ class Sequence:
 
     # ---------------------------------------------------- watermark
     def add_watermark(self, watermark_file_path):
-        watermark = mlt.Filter(self.profile, "watermark")
-        mltrefhold.hold_ref(watermark)
-        watermark.set("resource",str(watermark_file_path))
-        watermark.set("composite.always_active", 1)
+        watermark = mltbuild.create_watermark_filter(self.profile, watermark_file_path)
         self.tractor.attach(watermark)
         self.watermark_filter = watermark
         self.watermark_file_path = watermark_file_path
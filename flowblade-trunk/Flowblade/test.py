@@ -134,3 +134,248 @@ typedef struct
 }
 mlt_playlist_clip_info;
 """
+
+"""
+Audio levels tolerance check.
+
+Compares per frame levels from audiolevels.py against MLT "audiolevel" filter
+values read with mlt.frame_get_waveform() the way waveforms were previously
+created, and against levels computed from known tone amplitudes.
+
+Run with: python test.py
+"""
+import math
+import os
+import struct
+import tempfile
+import wave
+
+import mlt
+
+import audiolevels
+
+LEVELS_TOLERANCE = 0.01 # max allowed difference in 0.0 - 1.0 IEC scaled level
+
+TONE_FREQUENCY = 1000
+TONE_SECONDS = 1
+TONE_AMPLITUDES = [0.8, 0.25, 0.05, 0.01] # -1.9dB, -12dB, -26dB, -40dB
+
+def write_tone_file(path):
+    tone_file = wave.open(path, "wb")
+    tone_file.setnchannels(audiolevels.CHANNELS)
+    tone_file.setsampwidth(audiolevels.SAMPLE_WIDTH)
+    tone_file.setframerate(audiolevels.FREQUENCY)
+    for amplitude in TONE_AMPLITUDES:
+        samples = []
+        for i in range(0, audiolevels.FREQUENCY * TONE_SECONDS):
+            val = int(round(amplitude * 32767 * math.sin(2.0 * math.pi * TONE_FREQUENCY * i / audiolevels.FREQUENCY)))
+            samples.extend([val] * audiolevels.CHANNELS)
+        tone_file.writeframes(struct.pack("<" + str(len(samples)) + "h", *samples))
+    tone_file.close()
+
+def get_tone_amplitude(profile, frame):
+    fps = float(profile.frame_rate_num()) / float(profile.frame_rate_den())
+    return TONE_AMPLITUDES[int(frame / fps) / TONE_SECONDS]
+
+def get_audiolevel_filter_levels(profile, path, frame_count):
+    producer = mlt.Producer(profile, str(path))
+    channels = mlt.Filter(profile, "audiochannels")
+    converter = mlt.Filter(profile, "audioconvert")
+    levels = mlt.Filter(profile, "audiolevel")
+    producer.attach(channels)
+    producer.attach(converter)
+    producer.attach(levels)
+
+    filter_levels = []
+    for frame in range(0, frame_count):
+        producer.seek(frame)
+        mlt.frame_get_waveform(producer.get_frame(), 10, 50)
+        val = levels.get("_audio_level.0")
+        if val == None:
+            val = 0.0
+        filter_levels.append(float(val))
+    return filter_levels
+
+def check_levels(profile, path):
+    fps = float(profile.frame_rate_num()) / float(profile.frame_rate_den())
+    frame_count = int(len(TONE_AMPLITUDES) * TONE_SECONDS * fps)
+
+    producer = mlt.Producer(profile, str(path))
+    extractor = audiolevels.AudioLevelsExtractor(profile, producer, frame_count)
+    channel_levels = extractor.extract()
+    filter_levels = get_audiolevel_filter_levels(profile, path, frame_count)
+
+    failed = 0
+    for frame in range(0, frame_count):
+        amplitude = get_tone_amplitude(profile, frame)
+        expected_peak = audiolevels.amplitude_level(amplitude)
+        expected_rms = audiolevels.amplitude_level(amplitude / math.sqrt(2.0))
+        for c in range(0, audiolevels.CHANNELS):
+            peak, rms = channel_levels[c][frame]
+            if abs(peak - expected_peak) > LEVELS_TOLERANCE or abs(rms - expected_rms) > LEVELS_TOLERANCE:
+                print "frame", frame, "channel", c, "tone levels differ:", (peak, rms), (expected_peak, expected_rms)
+                failed += 1
+        if abs(channel_levels[0][frame][0] - filter_levels[frame]) > LEVELS_TOLERANCE:
+            print "frame", frame, "audiolevel filter level differs:", channel_levels[0][frame][0], filter_levels[frame]
+            failed += 1
+
+    print frame_count, "frames checked,", failed, "levels outside tolerance", LEVELS_TOLERANCE
+    return failed == 0
+
+"""
+Project file round trip and format version check.
+
+Writes a project with projectfile.py and checks that it reads back the same, that
+sequences other than current one are loaded lazily and stay lazy when project is saved,
+that sections of older format versions go through _MIGRATIONS and that files of newer
+versions are rejected.
+"""
+import appconsts
+import persistance
+import projectfile
+
+class CheckProject:
+    pass
+
+class CheckSequence:
+    pass
+
+class CheckTrack:
+    def __init__(self, track_id):
+        self.id = track_id
+        self.clips = []
+
+def get_track_ids(seq):
+    return [track.id for track in seq.tracks]
+
+def get_check_project():
+    project = CheckProject()
+    project.name = "check"
+    project.media_files = {1:"media_1", 2:"media_2"}
+    project.media_log = ["log_event"]
+    project.media_log_groups = []
+    project.sequences = []
+    for i in range(0, 3):
+        seq = CheckSequence()
+        seq.name = "sequence_" + str(i)
+        seq.tracks = [CheckTrack(i), CheckTrack(i + 1)]
+        project.sequences.append(seq)
+    project.c_seq_index = 1
+    return project
+
+def _migrate_check_section(name, section):
+    if name.startswith(projectfile.SEQUENCE_SECTION):
+        section.migrated = True
+    return section
+
+def check_lazy_project_save(path):
+    failed = []
+    loaded = []
+    def sequence_loaded(seq):
+        loaded.append(seq)
+        seq.mlt_build_pending = True # check sequences have no MLT objects
+
+    project = projectfile.open_project_file(path).get_lazy_project(sequence_loaded)
+    project.c_seq = project.sequences[project.c_seq_index]
+    project.c_seq.mlt_build_pending = True
+    project.proxy_data = CheckProject()
+    project.proxy_data.proxy_mode = appconsts.USE_ORIGINAL_MEDIA
+    project.media_files = {}
+
+    save_path = path + ".save"
+    try:
+        persistance.save_project(project, save_path)
+        if len(loaded) != 0 or not projectfile.is_lazy_sequence(project.sequences[0]) \
+            or not projectfile.is_lazy_sequence(project.sequences[2]):
+            failed.append("saving project loaded lazy sequences")
+        saved_project = projectfile.read_project(save_path)
+        if [(seq.name, get_track_ids(seq)) for seq in saved_project.sequences] != [("sequence_0", [0, 1]), ("sequence_1", [1, 2]), ("sequence_2", [2, 3])]:
+            failed.append("lazy sequences were not saved unchanged")
+
+        # Renamed sequence has old name in its pickled data and is loaded for save
+        project.sequences[2].name = "renamed"
+        persistance.save_project(project, save_path)
+        if loaded != [project.sequences[2]] or projectfile.read_project(save_path).sequences[2].name != "renamed":
+            failed.append("renamed lazy sequence was not saved with new name")
+    finally:
+        if os.path.exists(save_path):
+            os.remove(save_path)
+    return failed
+
+def check_project_file(path):
+    failed = []
+    project = get_check_project()
+    projectfile.write_project(path, project)
+
+    # Round trip
+    read_project = projectfile.read_project(path)
+    if read_project.name != project.name or read_project.media_files != project.media_files \
+        or read_project.media_log != project.media_log or read_project.c_seq_index != project.c_seq_index:
+        failed.append("project attributes differ after round trip")
+    if [(seq.name, get_track_ids(seq)) for seq in read_project.sequences] != [(seq.name, get_track_ids(seq)) for seq in project.sequences]:
+        failed.append("sequences differ after round trip")
+
+    # Lazy sequences
+    loaded = []
+    lazy_project = projectfile.open_project_file(path).get_lazy_project(lambda seq: loaded.append(seq))
+    lazy_flags = [projectfile.is_lazy_sequence(seq) for seq in lazy_project.sequences]
+    if lazy_flags != [True, False, True]:
+        failed.append("only current sequence should be loaded, got lazy flags " + str(lazy_flags))
+    lazy_seq = lazy_project.sequences[0]
+    if lazy_seq.name != "sequence_0" or len(loaded) != 0:
+        failed.append("reading lazy sequence name loaded it")
+    if get_track_ids(lazy_seq) != [0, 1] or loaded != [lazy_seq] or projectfile.is_lazy_sequence(lazy_seq):
+        failed.append("lazy sequence was not loaded in place on first use")
+    if lazy_project.sequences.index(lazy_project.sequences[2]) != 2 or len(loaded) != 1:
+        failed.append("comparing lazy sequence loaded it")
+
+    # Saving keeps sequences lazy and writes their data unchanged
+    failed.extend(check_lazy_project_save(path))
+
+    # Older format versions are migrated, newer ones rejected
+    saved_version = projectfile.FORMAT_VERSION
+    saved_migrations = projectfile._MIGRATIONS
+    try:
+        projectfile.FORMAT_VERSION = saved_version + 1
+        projectfile._MIGRATIONS = saved_migrations + [_migrate_check_section]
+        migrated = projectfile.read_project(path)
+        if not all([getattr(seq, "migrated", False) for seq in migrated.sequences]):
+            failed.append("sections of version " + str(saved_version) + " file were not migrated")
+
+        projectfile.write_project(path, project)
+        current = projectfile.read_project(path)
+        if any([getattr(seq, "migrated", False) for seq in current.sequences]):
+            failed.append("sections of current version file were migrated")
+    finally:
+        projectfile.FORMAT_VERSION = saved_version
+        projectfile._MIGRATIONS = saved_migrations
+    try:
+        projectfile.read_project(path)
+        failed.append("file of newer format version was read")
+    except projectfile.ProjectFileFormatError:
+        pass
+
+    for fail in failed:
+        print "project file check failed:", fail
+    print "project file checked,", len(failed), "failures"
+    return len(failed) == 0
+
+if __name__ == "__main__":
+    import sys
+
+    project_path = tempfile.mktemp(prefix="flowblade_check", suffix=".flb")
+    try:
+        passed = check_project_file(project_path)
+    finally:
+        if os.path.exists(project_path):
+            os.remove(project_path)
+
+    mlt.Factory().init()
+    tone_path = tempfile.mktemp(prefix="flowblade_tone", suffix=".wav")
+    write_tone_file(tone_path)
+    try:
+        passed = check_levels(mlt.Profile(), tone_path) and passed
+    finally:
+        os.remove(tone_path)
+    if not passed:
+        sys.exit(1)
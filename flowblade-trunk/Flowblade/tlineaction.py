@@ -57,9 +57,9 @@ transition_render_data = None
 
 
 # --------------------------- module funcs
-def _get_new_clip_from_clip_monitor():
+def _get_new_clip_from_clip_monitor(track):
     """
-    Creates and returns new clip from current clip monitor clip
+    Creates and returns new clip for track from current clip monitor clip
     with user set in and out points.
     """
     if MONITOR_MEDIA_FILE() == None:
@@ -67,7 +67,7 @@ def _get_new_clip_from_clip_monitor():
         return
     
     if MONITOR_MEDIA_FILE().type != appconsts.PATTERN_PRODUCER:
-        new_clip = current_sequence().create_file_producer_clip(MONITOR_MEDIA_FILE().path)
+        new_clip = current_sequence().create_file_producer_clip(MONITOR_MEDIA_FILE().path, None, track.id)
     else:
         new_clip = current_sequence().create_pattern_producer(MONITOR_MEDIA_FILE())
         
@@ -212,7 +212,7 @@ def insert_button_pressed():
 
     tline_pos =_current_tline_frame()
     
-    new_clip = _get_new_clip_from_clip_monitor()
+    new_clip = _get_new_clip_from_clip_monitor(track)
     if new_clip == None:
         no_monitor_clip_info(gui.editor_window.window)
         return
@@ -228,7 +228,7 @@ def append_button_pressed():
 
     tline_pos = track.get_length()
     
-    new_clip = _get_new_clip_from_clip_monitor()
+    new_clip = _get_new_clip_from_clip_monitor(track)
     if new_clip == None:
         no_monitor_clip_info(gui.editor_window.window)
         return
@@ -255,7 +255,7 @@ def three_point_overwrite_pressed():
     range_end_frame = out_start + out_clip.clip_out - out_clip.clip_in
     range_length = range_end_frame - range_start_frame + 1 # calculated end is incl.
 
-    over_clip = _get_new_clip_from_clip_monitor()
+    over_clip = _get_new_clip_from_clip_monitor(track)
     if over_clip == None:
         no_monitor_clip_info(gui.editor_window.window)
         return
@@ -302,7 +302,7 @@ def range_overwrite_pressed():
         return
 
     # Get over clip and check it overwrite range area
-    over_clip = _get_new_clip_from_clip_monitor()
+    over_clip = _get_new_clip_from_clip_monitor(track)
     if over_clip == None:
         no_monitor_clip_info(gui.editor_window.window)
         return
@@ -527,7 +527,7 @@ def _transition_render_complete(clip_path):
     global transition_render_data
     transition_index, from_clip, to_clip, track, from_in, to_out, transition_type = transition_render_data
 
-    transition_clip = current_sequence().create_rendered_transition_clip(clip_path, transition_type)
+    transition_clip = current_sequence().create_rendered_transition_clip(clip_path, transition_type, track.id)
     
     data = {"transition_clip":transition_clip,
             "transition_index":transition_index,
@@ -650,7 +650,7 @@ def _fade_render_complete(clip_path):
     global transition_render_data
     clip_index, fade_type, clip, track, length = transition_render_data
 
-    fade_clip = current_sequence().create_rendered_transition_clip(clip_path, fade_type)
+    fade_clip = current_sequence().create_rendered_transition_clip(clip_path, fade_type, track.id)
     
     data = {"fade_clip":fade_clip,
             "index":clip_index,
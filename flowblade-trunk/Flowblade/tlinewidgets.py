@@ -22,6 +22,7 @@
 Module contains GUI components for displayingand  editing clips in timeline.
 Global display position and scale information is in this module.
 """
+import bisect
 import cairo
 import pygtk
 pygtk.require('2.0');
@@ -60,11 +61,16 @@ HEIGHT = 260 # defines window min height together with editorwindow.TOP_ROW_HEIG
 TEXT_MIN = 12 # if clip shorter, no text
 EMBOSS_MIN = 8 # if clip shorter, no emboss
 FILL_MIN = 1 # if clip shorter, no fill
+WAVEFORM_MIN = 8 # if clip shorter, no audio levels
+LOD_CLIP_MIN = 2.0 # if clip shorter, clip is drawn merged with its neighbours into pixel wide spans, see LODSpan
+LOD_CUT_SHADE = 0.25 # how much each cut darkens pixel wide span
+LOD_CUT_COLOR = (0.3, 0.3, 0.3)
 TEXT_X = 6 # pos for clip text
 TEXT_Y = 29 
 TEXT_Y_SMALL = 17
 WAVEFORM_PAD_LARGE = 9
 WAVEFORM_PAD_SMALL = 4
+WAVEFORM_MIN_BAR_WIDTH = 2.0 # level bars are drawn from waveform pyramid level that gives at least this width
 MARK_PAD = 6
 MARK_LINE_WIDTH = 4
 
@@ -263,6 +269,10 @@ fake_current_frame = None
 # Used to draw indicators that tell if more frames are available while trimming
 trim_status = appconsts.ON_BETWEEN_FRAME
 
+# Precomputed track y positions shared by all timeline drawing and hit testing, 
+# see TrackLayout.
+track_layout = None
+
 # ------------------------------------------------------------------- module functions
 def load_icons():
     global FULL_LOCK_ICON, FILTER_CLIP_ICON, VIEW_SIDE_ICON,\
@@ -314,6 +324,27 @@ def set_ref_line_y(allocation):
     centerered_tracks_bottom_y = (panel_height / 2.0) + (total_h / 2.0)
     global REF_LINE_Y
     REF_LINE_Y = centerered_tracks_bottom_y - below_ref_h
+    
+    # Track heights may have changed too
+    invalidate_track_layout()
+
+def invalidate_track_layout():
+    """
+    Makes next track position query rebuild track layout. Needs to be called
+    when track heights change, this is done in set_ref_line_y().
+    """
+    global track_layout
+    track_layout = None
+
+def _get_track_layout():
+    global track_layout
+    seq = current_sequence()
+    if (track_layout == None 
+        or track_layout.seq != seq
+        or track_layout.track_count != len(seq.tracks)
+        or track_layout.ref_line_y != REF_LINE_Y):
+        track_layout = TrackLayout(seq, REF_LINE_Y)
+    return track_layout
 
 def get_pos_for_tline_centered_to_current_frame():
     current_frame = PLAYER().current_frame()
@@ -336,21 +367,10 @@ def get_track(panel_y):
     """
     Returns track object for y or None
     """
-    audio_add = 0
-    for i in range(1, current_sequence().first_video_index):
-        audio_add = audio_add + current_sequence().tracks[i].height
-
-    bottom_line = REF_LINE_Y + audio_add
-    if panel_y > bottom_line:
+    track_index = _get_track_layout().get_track_index(panel_y)
+    if track_index == -1:
         return None
-        
-    tracks_height = bottom_line;
-    for i in range(1, len(current_sequence().tracks)):
-        tracks_height = tracks_height - current_sequence().tracks[i].height
-        if tracks_height < panel_y:
-            return current_sequence().tracks[i]
-    
-    return None
+    return current_sequence().tracks[track_index]
 
 def get_clip_track_and_index_for_pos(x, y):
     # Returns tuple (clip, track, index)
@@ -370,16 +390,7 @@ def _get_track_y(track_index):
     NOTE: NOT REALLY INTERNAL TO MODULE, HAS OUTSIDE USERS.
     Returns y pos in canvas for track index. y is top most pixel in track 
     """
-    audio_add = 0
-    for i in range(1, current_sequence().first_video_index):
-        audio_add = audio_add + current_sequence().tracks[i].height
-
-    bottom_line = REF_LINE_Y + audio_add
-    tracks_height = 0;
-    for i in range(1, track_index + 1):
-        tracks_height = tracks_height + current_sequence().tracks[i].height
-    
-    return bottom_line - tracks_height
+    return _get_track_layout().track_y[track_index]
     
 def _get_frame_x(frame):
     """
@@ -389,7 +400,7 @@ def _get_frame_x(frame):
     disp_frame = frame - pos
     return disp_frame * pix_per_frame
 
-def compositor_hit(frame, y, sorted_compositors):
+def compositor_hit(frame, y):
     """
     Returns compositor hit with mouse press x,y or None if nothing hit.
     """
@@ -401,29 +412,21 @@ def compositor_hit(frame, y, sorted_compositors):
         
     # Test if compositor hit on track top, so compositor hit on dest track side
     if y >= track_top and y < track_top + (COMPOSITOR_HEIGHT - COMPOSITOR_HEIGHT_OFF):
-       return _comp_hit_on_below_track(frame, track, sorted_compositors)
+       return _comp_hit_on_below_track(frame, track)
        
     # Test if compositor hit on track bottom, so compositor hit on source track side      
     elif y >= (track_top + track.height - COMPOSITOR_HEIGHT_OFF) and y <=(track_top + track.height):
-       return _comp_hit_on_source_track(frame, track, sorted_compositors)
+       return _comp_hit_on_source_track(frame, track)
 
     # Hit y is on he stripe where no compositors can be hit
     else:
         return None
 
-def _comp_hit_on_below_track(frame, track, sorted_compositors):
-    for comp in sorted_compositors:
-        if comp.transition.b_track - 1 == track.id:
-            if comp.clip_in <= frame and comp.clip_out >= frame:
-                return comp
-    return None
-
-def _comp_hit_on_source_track(frame, track, sorted_compositors):
-    for comp in sorted_compositors:
-        if comp.transition.b_track == track.id:
-            if comp.clip_in <= frame and comp.clip_out >= frame:
-                return comp
-    return None
+def _comp_hit_on_below_track(frame, track):
+    return current_sequence().get_compositor_index().get_at(track.id + 1, frame)
+
+def _comp_hit_on_source_track(frame, track):
+    return current_sequence().get_compositor_index().get_at(track.id, frame)
     
 # --------------------------------------- edit mode overlay draw handling
 def set_edit_mode(data, draw_func):
@@ -880,6 +883,135 @@ def _draw_view_icon(cr, x, y):
     cr.set_source_pixbuf(VIEW_SIDE_ICON, x, y)
     cr.paint()
 
+# ------------------------------- TRACK LAYOUT
+class TrackLayout:
+    """
+    Vertical positions of tracks in timeline canvas and column.
+    
+    Tracks are laid out upwards from bottom line so that track index 1 is lowest and
+    track at first_video_index has its bottom on REF_LINE_Y.
+    """
+    def __init__(self, seq, ref_line_y):
+        self.seq = seq
+        self.track_count = len(seq.tracks)
+        self.ref_line_y = ref_line_y
+        
+        audio_add = 0
+        for i in range(1, seq.first_video_index):
+            audio_add = audio_add + seq.tracks[i].height
+        bottom_line = ref_line_y + audio_add
+
+        # Top y for every track index, index 0 black track has no height
+        # and its "top" is the bottom line.
+        self.track_y = [bottom_line]
+        for i in range(1, len(seq.tracks)):
+            self.track_y.append(self.track_y[i - 1] - seq.tracks[i].height)
+
+        # Same values in ascending order for bisecting
+        self.ascending_y = list(reversed(self.track_y))
+
+    def get_track_index(self, y):
+        """
+        Returns index of track with top < y <= bottom, or -1 if there is no such track.
+        """
+        i = bisect.bisect_left(self.ascending_y, y)
+        if i == 0 or i == len(self.ascending_y):
+            return -1
+        return self.track_count - i
+
+
+# ------------------------------- LEVEL OF DETAIL
+class LODSpan:
+    """
+    Consecutive clips too short to be drawn individually when zoomed out.
+    
+    Clips are merged into pixel wide columns that get color mixed from colors of clips
+    in them weighted by clip widths, darkened by number of cuts in column.
+    """
+    def __init__(self, first_x):
+        self.first_column = int(math.floor(first_x))
+        self.coverage = [] # summed width of clips in column
+        self.colors = [] # summed r, g, b of clips in column, weighted with width 
+        self.cuts = [] # number of clips starting in column
+
+    def add(self, color, x, width):
+        column = int(math.floor(x))
+        self._add_columns(column)
+        self.cuts[column - self.first_column] += 1
+
+        end = x + width
+        r, g, b = color
+        while x < end:
+            next_x = min(column + 1, end)
+            w = next_x - x
+            self._add_columns(column)
+            i = column - self.first_column
+            self.coverage[i] += w
+            sum_r, sum_g, sum_b = self.colors[i]
+            self.colors[i] = (sum_r + r * w, sum_g + g * w, sum_b + b * w)
+            x = next_x
+            column += 1
+
+    def _add_columns(self, column):
+        while len(self.coverage) <= column - self.first_column:
+            self.coverage.append(0.0)
+            self.colors.append((0.0, 0.0, 0.0))
+            self.cuts.append(0)
+
+    def draw(self, cr, y, height):
+        # Columns with same color are drawn together
+        run_start = 0
+        run_color = None
+        for i in range(0, len(self.coverage)):
+            color = self._get_column_color(i)
+            if color == run_color:
+                continue
+            self._draw_run(cr, run_color, run_start, i, y, height)
+            run_start = i
+            run_color = color
+
+        self._draw_run(cr, run_color, run_start, len(self.coverage), y, height)
+
+    def _get_column_color(self, i):
+        coverage = self.coverage[i]
+        if coverage <= 0.0:
+            return None
+        r, g, b = self.colors[i]
+        shade = min(1.0, self.cuts[i] * LOD_CUT_SHADE)
+        cut_r, cut_g, cut_b = LOD_CUT_COLOR
+        r = (r / coverage) * (1.0 - shade) + cut_r * shade
+        g = (g / coverage) * (1.0 - shade) + cut_g * shade
+        b = (b / coverage) * (1.0 - shade) + cut_b * shade
+        alpha = min(1.0, coverage) # partially covered columns at span ends
+        return (round(r, 2), round(g, 2), round(b, 2), round(alpha, 2))
+
+    def _draw_run(self, cr, color, first, last, y, height):
+        if color == None:
+            return
+        cr.set_source_rgba(*color)
+        cr.rectangle(self.first_column + first, y, last - first, height)
+        cr.fill()
+
+def _get_lod_color(clip, track):
+    if clip.color != None:
+        return clip.color
+    if clip.is_blanck_clip:
+        if clip.selected:
+            return BLANK_CLIP_COLOR_SELECTED_GRAD[1:4]
+        return BLANK_CLIP_COLOR_GRAD[1:4]
+    if track.type == sequence.VIDEO:
+        if clip.media_type == sequence.VIDEO:
+            if clip.selected:
+                return CLIP_SELECTED_COLOR
+            return CLIP_COLOR_GRAD[1:4]
+        if clip.selected:
+            return IMAGE_CLIP_SELECTED_COLOR
+        return IMAGE_CLIP_COLOR_GRAD[1:4]
+    if clip.selected:
+        return AUDIO_CLIP_SELECTED_COLOR
+    return AUDIO_CLIP_COLOR_GRAD[1:4]
+
+
 # ------------------------------- WIDGETS
 class TimeLineCanvas:
     """
@@ -913,6 +1045,14 @@ class TimeLineCanvas:
         
         # Drag state
         self.drag_on = False
+
+        # Clips, compositors and sync relations are drawn on a cached background layer
+        # that is only redrawn when invalidated or when view position, scale or size changes.
+        self.background_surface = None
+        self.background_key = None
+        self.background_valid = False
+        self.damage = {} # track id -> first frame, areas of background that need to be redrawn
+        self.last_pointer_x = None
                 
         # for edit mode setting
         global canvas_widget
@@ -955,7 +1095,7 @@ class TimeLineCanvas:
 
     def set_pointer_context(self, x, y):
         frame = get_frame(x)
-        hit_compositor = compositor_hit(frame, y, current_sequence().compositors)
+        hit_compositor = compositor_hit(frame, y)
         if hit_compositor != None:
             print "comp"
             return
@@ -979,18 +1119,116 @@ class TimeLineCanvas:
             return
 
     #----------------------------------------- DRAW
+    def invalidate_background(self):
+        """
+        Makes next draw recreate cached clips, compositors and sync relations layer.
+        """
+        self.background_valid = False
+
+    def add_damage(self, damage):
+        """
+        Queues redraw for track areas changed by an edit.
+        damage is dict track id -> first changed frame, tracks are redrawn from that frame
+        to right edge of canvas.
+        """
+        # Whole background will be drawn anyway.
+        if self.background_valid == False:
+            self.widget.queue_draw()
+            return
+
+        x, y, w, h = self.widget.allocation
+        for track_id, frame in damage.iteritems():
+            try:
+                if frame < self.damage[track_id]:
+                    self.damage[track_id] = frame
+            except KeyError:
+                self.damage[track_id] = frame
+
+            rect = self._get_damage_rect(track_id, frame, w)
+            if rect != None:
+                self.widget.queue_draw_area(*rect)
+
+    def _get_damage_rect(self, track_id, frame, w):
+        tracks = current_sequence().tracks
+        if track_id < 1 or track_id > len(tracks) - 2: # black and hidden tracks are not drawn
+            return None
+
+        # Clip edges are stroked half a pixel right from clip start
+        x = max(int(math.floor((frame - pos) * pix_per_frame)) - 1, 0)
+        if x >= w:
+            return None
+        return (x, _get_track_y(track_id), w - x, tracks[track_id].height)
+
+    def queue_playhead_draw(self):
+        """
+        Queues redraw for previous and current frame pointer positions only.
+        """
+        # Trim mode overlays follow current frame and need to be fully redrawn.
+        if not editorstate.current_is_move_mode() or self.last_pointer_x == None:
+            self.widget.queue_draw()
+            return
+
+        x, y, w, h = self.widget.allocation
+        frame_x = self._get_pointer_x()
+        if frame_x == self.last_pointer_x:
+            return
+        self.widget.queue_draw_area(int(self.last_pointer_x) - 1, 0, 3, h)
+        self.widget.queue_draw_area(int(frame_x) - 1, 0, 3, h)
+
     def _draw(self, event, cr, allocation):
         x, y, w, h = allocation
 
+        # This can get called during loads by unwanted expose events
+        if editorstate.project_is_loading == True:
+            cr.set_source_rgb(*BG_COLOR)
+            cr.rectangle(0, 0, w, h)
+            cr.fill()
+            self.background_valid = False
+            return
+
+        # Draw background layer
+        background_key = (w, h, pos, pix_per_frame, REF_LINE_Y, current_sequence())
+        if self.background_valid == False or background_key != self.background_key:
+            self.background_surface = cr.get_target().create_similar(cairo.CONTENT_COLOR, w, h)
+            self._draw_background(cairo.Context(self.background_surface), w, h)
+            self.background_key = background_key
+            self.background_valid = True
+            self.damage = {}
+        elif len(self.damage) > 0:
+            self._draw_damage(cairo.Context(self.background_surface), w)
+
+        cr.set_source_surface(self.background_surface, 0, 0)
+        cr.paint()
+
+        # Exit displaying from fake_current_pointer for SLIDE_TRIM mode if last displayed 
+        # was from fake_pointer but this is not anymore
+        global fake_current_frame
+        if EDIT_MODE() != editorstate.SLIDE_TRIM and fake_current_frame != None:
+            PLAYER().seek_frame(fake_current_frame)
+            fake_current_frame = None
+            
+        # Draw frame pointer layer
+        if timeline_visible():
+            cr.set_source_rgb(0, 0, 0)
+        else:
+            cr.set_source_rgb(*SHADOW_POINTER_COLOR)
+        frame_x = self._get_pointer_x()
+        cr.move_to(frame_x, 0)
+        cr.line_to(frame_x, h)
+        cr.set_line_width(1.0)
+        cr.stroke()
+        self.last_pointer_x = frame_x
+
+        # Draw edit mode overlay layer
+        if self.edit_mode_overlay_draw_func != None:
+            self.edit_mode_overlay_draw_func(cr,self.edit_mode_data)
+
+    def _draw_background(self, cr, w, h):
         # Draw bg
         cr.set_source_rgb(*BG_COLOR)
         cr.rectangle(0, 0, w, h)
         cr.fill()
 
-        # This can get called during loads by unwanted expose events
-        if editorstate.project_is_loading == True:
-            return
-
         # Init sync draw structures
         self.parent_positions = {}
         self.sync_children = []
@@ -1002,17 +1240,30 @@ class TimeLineCanvas:
                             ,_get_track_y(i)
                             ,w)
 
-        self.draw_compositors(cr)
+        self.draw_compositors(cr, w)
         self.draw_sync_relations(cr)
 
-        # Exit displaying from fake_current_pointer for SLIDE_TRIM mode if last displayed 
-        # was from fake_pointer but this is not anymore
-        global fake_current_frame
-        if EDIT_MODE() != editorstate.SLIDE_TRIM and fake_current_frame != None:
-            PLAYER().seek_frame(fake_current_frame)
-            fake_current_frame = None
-            
-        # Draw frame pointer
+    def _draw_damage(self, cr, w):
+        """
+        Redraws changed track areas on background layer.
+        """
+        for track_id, frame in self.damage.iteritems():
+            rect = self._get_damage_rect(track_id, frame, w)
+            if rect == None:
+                continue
+
+            cr.save()
+            cr.rectangle(*rect)
+            cr.clip()
+            cr.set_source_rgb(*BG_COLOR)
+            cr.paint()
+            self.draw_track(cr, current_sequence().tracks[track_id], rect[1], w)
+            self.draw_compositors(cr, w)
+            cr.restore()
+
+        self.damage = {}
+
+    def _get_pointer_x(self):
         if EDIT_MODE() != editorstate.SLIDE_TRIM or PLAYER().looping():
             current_frame = PLAYER().tracktor_producer.frame()
         else:
@@ -1020,20 +1271,10 @@ class TimeLineCanvas:
 
         if timeline_visible():
             pointer_frame = current_frame
-            cr.set_source_rgb(0, 0, 0)
         else:
             pointer_frame = editorstate.tline_shadow_frame
-            cr.set_source_rgb(*SHADOW_POINTER_COLOR)
         disp_frame = pointer_frame - pos
-        frame_x = math.floor(disp_frame * pix_per_frame) + 0.5
-        cr.move_to(frame_x, 0)
-        cr.line_to(frame_x, h)
-        cr.set_line_width(1.0)
-        cr.stroke()
-
-        # Draw edit mode overlay
-        if self.edit_mode_overlay_draw_func != None:
-            self.edit_mode_overlay_draw_func(cr,self.edit_mode_data)
+        return math.floor(disp_frame * pix_per_frame) + 0.5
 
     def draw_track(self, cr, track, y, width):
         """
@@ -1073,6 +1314,12 @@ class TimeLineCanvas:
 
         proxy_paths = current_proxy_media_paths()
 
+        # Clip gradients are created once for each draw
+        gradients = {}
+        
+        # Consecutive clips too short to be drawn individually are collected here
+        lod_span = None
+
         # Draw clips in draw range
         for i in range(start, end):
 
@@ -1088,6 +1335,19 @@ class TimeLineCanvas:
             # Collect positions for drawing sync relations 
             if collect_positions:
                 self.parent_positions[clip.id] = scale_in
+
+            # Short clips are only added to span that is drawn when span ends
+            if scale_length < LOD_CLIP_MIN:
+                if lod_span == None:
+                    lod_span = LODSpan(scale_in)
+                lod_span.add(_get_lod_color(clip, track), scale_in, scale_length)
+                if clip.sync_data != None and not clip.is_blanck_clip:
+                    self.sync_children.append((clip, track, scale_in))
+                clip_start_frame += clip_length
+                continue
+            elif lod_span != None:
+                lod_span.draw(cr, y, track_height)
+                lod_span = None
             
             # Fill clip bg 
             if scale_length > FILL_MIN:
@@ -1098,21 +1358,15 @@ class TimeLineCanvas:
                     clip_bg_col = clip.color
                 elif clip.is_blanck_clip:
                     if clip.selected:
-                        grad = cairo.LinearGradient (0, y, 0, y + track_height)
-                        grad.add_color_stop_rgba(*BLANK_CLIP_COLOR_SELECTED_GRAD)
-                        grad.add_color_stop_rgba(*BLANK_CLIP_COLOR_SELECTED_GRAD_L)
+                        grad = self._get_clip_gradient(gradients, y, track_height, BLANK_CLIP_COLOR_SELECTED_GRAD, BLANK_CLIP_COLOR_SELECTED_GRAD_L)
                         cr.set_source(grad)
                     else:
-                        grad = cairo.LinearGradient (0, y, 0, y + track_height)
-                        grad.add_color_stop_rgba(*BLANK_CLIP_COLOR_GRAD)
-                        grad.add_color_stop_rgba(*BLANK_CLIP_COLOR_GRAD_L)
+                        grad = self._get_clip_gradient(gradients, y, track_height, BLANK_CLIP_COLOR_GRAD, BLANK_CLIP_COLOR_GRAD_L)
                         cr.set_source(grad)
                 elif track.type == sequence.VIDEO:
                     if clip.media_type == sequence.VIDEO:
                         if not clip.selected:
-                            grad = cairo.LinearGradient (0, y, 0, y + track_height)
-                            grad.add_color_stop_rgba(*CLIP_COLOR_GRAD)
-                            grad.add_color_stop_rgba(*CLIP_COLOR_GRAD_L)
+                            grad = self._get_clip_gradient(gradients, y, track_height, CLIP_COLOR_GRAD, CLIP_COLOR_GRAD_L)
                             clip_bg_col = CLIP_COLOR_GRAD[1:4]
                             cr.set_source(grad)
                         else:
@@ -1120,9 +1374,7 @@ class TimeLineCanvas:
                             clip_bg_col = CLIP_SELECTED_COLOR
                     else: # IMAGE type
                         if not clip.selected:
-                            grad = cairo.LinearGradient (0, y, 0, y + track_height)
-                            grad.add_color_stop_rgba(*IMAGE_CLIP_COLOR_GRAD)
-                            grad.add_color_stop_rgba(*IMAGE_CLIP_COLOR_GRAD_L)
+                            grad = self._get_clip_gradient(gradients, y, track_height, IMAGE_CLIP_COLOR_GRAD, IMAGE_CLIP_COLOR_GRAD_L)
                             clip_bg_col = IMAGE_CLIP_COLOR_GRAD[1:4]
                             cr.set_source(grad)
                         else:
@@ -1130,9 +1382,7 @@ class TimeLineCanvas:
                             clip_bg_col = IMAGE_CLIP_SELECTED_COLOR
                 else:
                     if not clip.selected:
-                        grad = cairo.LinearGradient (0, y, 0, y + track_height)
-                        grad.add_color_stop_rgba(*AUDIO_CLIP_COLOR_GRAD)
-                        grad.add_color_stop_rgba(*AUDIO_CLIP_COLOR_GRAD_L)
+                        grad = self._get_clip_gradient(gradients, y, track_height, AUDIO_CLIP_COLOR_GRAD, AUDIO_CLIP_COLOR_GRAD_L)
                         clip_bg_col = AUDIO_CLIP_COLOR_GRAD[1:4]
                         cr.set_source(grad)
                     else:
@@ -1224,12 +1474,15 @@ class TimeLineCanvas:
                     dy = y + track_height - SYNC_STRIPE_HEIGHT
                     saw_points = []
                     saw_points.append((dx, dy))
-                    saw_delta = SYNC_SAW_HEIGHT
-                    for i in range(0, int((scale_length - 2) / SYNC_SAW_WIDTH) + 1):
-                        dx += SYNC_SAW_WIDTH
-                        dy += saw_delta
-                        saw_points.append((dx, dy))
-                        saw_delta = -(saw_delta)
+                    if scale_length > EMBOSS_MIN:
+                        saw_delta = SYNC_SAW_HEIGHT
+                        for i in range(0, int((scale_length - 2) / SYNC_SAW_WIDTH) + 1):
+                            dx += SYNC_SAW_WIDTH
+                            dy += saw_delta
+                            saw_points.append((dx, dy))
+                            saw_delta = -(saw_delta)
+                    else: # no room for saw
+                        saw_points.append((scale_in + scale_length - 1, dy))
 
                     px = scale_in + 1 + scale_length - 2
                     py = y + track_height
@@ -1286,7 +1539,7 @@ class TimeLineCanvas:
                 self.sync_children.append((clip, track, scale_in))
 
             # Draw audio level data
-            if clip.waveform_data != None and scale_length > FILL_MIN:
+            if clip.waveform_data != None and scale_length > WAVEFORM_MIN:
                 r, g, b = clip_bg_col
                 cr.set_source_rgb(r * 0.7, g * 0.7, b * 0.7)
 
@@ -1298,16 +1551,10 @@ class TimeLineCanvas:
                     y_pad = WAVEFORM_PAD_SMALL
                     bar_height = 20.0
                 
-                # Draw all frames only if pixels per frame > 2, otherwise
-                # draw only every other or fewer frames
-                draw_pix_per_frame = pix_per_frame
-                if draw_pix_per_frame < 2:
-                    draw_pix_per_frame = 2
-                    step = int(2 / pix_per_frame)
-                    if step < 1:
-                        step = 1
-                else:
-                    step = 1
+                # Use pyramid level with level bars at least WAVEFORM_MIN_BAR_WIDTH pixels wide
+                level = clip.waveform_data.get_level(WAVEFORM_MIN_BAR_WIDTH / pix_per_frame)
+                decimation = level.decimation
+                bar_width = decimation * pix_per_frame
 
                 # Draw only frames in display
                 draw_first = clip_in
@@ -1319,14 +1566,18 @@ class TimeLineCanvas:
 
                 # Get media frame 0 position in screen pixels
                 media_start_pos_pix = scale_in - clip_in * pix_per_frame
-                
-                # Draw level bar for each frame in draw range
-                for i in range(draw_first, draw_last, step):
-                    x = media_start_pos_pix + i * pix_per_frame
-                    h = bar_height * clip.waveform_data[i]
+
+                # Draw level bar for each bucket in draw range
+                first_bucket = draw_first / decimation
+                last_bucket = (draw_last - 1) / decimation + 1
+                peaks = clip.waveform_data.get_peaks(level, first_bucket, last_bucket)
+                x = media_start_pos_pix + first_bucket * bar_width
+                for peak in peaks:
+                    h = bar_height * peak
                     if h < 1:
                         h = 1
-                    cr.rectangle(x, y + y_pad + (bar_height - h), draw_pix_per_frame, h)
+                    cr.rectangle(x, y + y_pad + (bar_height - h), bar_width, h)
+                    x += bar_width
 
                 cr.fill()
 
@@ -1406,6 +1657,9 @@ class TimeLineCanvas:
             # Get next draw position
             clip_start_frame += clip_length
 
+        if lod_span != None:
+            lod_span.draw(cr, y, track_height)
+
         # Fill rest of track with bg color if needed
         scale_in = clip_start_frame  * pix_per_frame
         if scale_in < width:
@@ -1413,50 +1667,69 @@ class TimeLineCanvas:
             cr.set_source_rgb(*BG_COLOR)  
             cr.fill()
 
-    def draw_compositors(self, cr):
-        compositors = current_sequence().get_compositors()
-        for comp in compositors:
-            # compositor clip and edge
-            track = current_sequence().tracks[comp.transition.b_track]
-            target_track =  current_sequence().tracks[comp.transition.a_track]
-            
-            y = _get_track_y(track.id) + track.height - COMPOSITOR_HEIGHT_OFF
-            target_y = _get_track_y(target_track.id) + target_track.height - COMPOSITOR_HEIGHT_OFF
+    def _get_clip_gradient(self, gradients, y, track_height, grad_stop, grad_stop_l):
+        try:
+            return gradients[grad_stop]
+        except KeyError:
+            grad = cairo.LinearGradient (0, y, 0, y + track_height)
+            grad.add_color_stop_rgba(*grad_stop)
+            grad.add_color_stop_rgba(*grad_stop_l)
+            gradients[grad_stop] = grad
+            return grad
+
+    def draw_compositors(self, cr, width):
+        """
+        Draws compositors in view, tracks on top first.
+        """
+        start = int(pos)
+        end = int(pos + width / pix_per_frame)
+        compositor_index = current_sequence().get_compositor_index()
+        for track_index in range(len(current_sequence().tracks) - 2, 0, -1):
+            for comp in compositor_index.get_range(track_index, start, end):
+                self.draw_compositor(cr, comp)
+
+    def draw_compositor(self, cr, comp):
+        # compositor clip and edge
+        track = current_sequence().tracks[comp.transition.b_track]
+        target_track =  current_sequence().tracks[comp.transition.a_track]
+        
+        y = _get_track_y(track.id) + track.height - COMPOSITOR_HEIGHT_OFF
+        target_y = _get_track_y(target_track.id) + target_track.height - COMPOSITOR_HEIGHT_OFF
 
-            scale_in = (comp.clip_in - pos) * pix_per_frame
-            scale_length = (comp.clip_out - comp.clip_in + 1) * pix_per_frame # +1, out inclusive
-            if comp.selected == False:
-                color = COMPOSITOR_CLIP
-            else:
-                color = COMPOSITOR_CLIP_SELECTED
-            cr.set_source_rgba(*color)
+        scale_in = (comp.clip_in - pos) * pix_per_frame
+        scale_length = (comp.clip_out - comp.clip_in + 1) * pix_per_frame # +1, out inclusive
+        if comp.selected == False:
+            color = COMPOSITOR_CLIP
+        else:
+            color = COMPOSITOR_CLIP_SELECTED
+        cr.set_source_rgba(*color)
 
-            _create_compositor_cairo_path(cr, scale_in, scale_length, y, target_y)
+        _create_compositor_cairo_path(cr, scale_in, scale_length, y, target_y)
 
-            cr.fill_preserve()
+        cr.fill_preserve()
 
-            cr.set_source_rgb(0, 0, 0)
-            cr.set_line_width(1.0)
-            cr.stroke()
+        cr.set_source_rgb(0, 0, 0)
+        cr.set_line_width(1.0)
+        cr.stroke()
 
-            # text
-            cr.save()
+        # text
+        cr.save()
 
-            cr.rectangle(scale_in + 0.5,
-                         y + 0.5, scale_length, 
-                         COMPOSITOR_HEIGHT)
-            cr.clip()
-            cr.new_path()
-            cr.set_source_rgb(1, 1, 1)
-            cr.select_font_face ("sans-serif",
-                                 cairo.FONT_SLANT_NORMAL,
-                                 cairo.FONT_WEIGHT_NORMAL)
-
-            cr.set_font_size(11)
-            cr.move_to(scale_in + COMPOSITOR_TEXT_X, y + COMPOSITOR_TEXT_Y)
-            cr.show_text(comp.name.upper())
-            
-            cr.restore()
+        cr.rectangle(scale_in + 0.5,
+                     y + 0.5, scale_length, 
+                     COMPOSITOR_HEIGHT)
+        cr.clip()
+        cr.new_path()
+        cr.set_source_rgb(1, 1, 1)
+        cr.select_font_face ("sans-serif",
+                             cairo.FONT_SLANT_NORMAL,
+                             cairo.FONT_WEIGHT_NORMAL)
+
+        cr.set_font_size(11)
+        cr.move_to(scale_in + COMPOSITOR_TEXT_X, y + COMPOSITOR_TEXT_Y)
+        cr.show_text(comp.name.upper())
+        
+        cr.restore()
 
     def draw_sync_relations(self, cr):
         parent_y = _get_track_y(current_sequence().first_video_index)
@@ -1516,17 +1789,7 @@ class TimeLineColumn:
 
     # ------------------------------- MOUSE EVENTS
     def init_listeners(self):
-        self.track_testers = []
-        
-        # Add track click testers
-        # track zero is ignored black bg track
-        for i in range(1, len(current_sequence().tracks) - 1): # black and hidden tracks are ignored
-            start =  _get_track_y(i)
-            end = start + current_sequence().tracks[i].height
-            tester = ValueTester(start, end, self.track_hit)
-            tester.data.track = i
-            self.track_testers.append(tester)
-        
+        # Tracks are hit tested with track layout. 
         # Add switch click testers
         self.switch_testers = []
 
@@ -1546,10 +1809,15 @@ class TimeLineColumn:
         Mouse button callback
         """
         self.event = event
-        for tester in self.track_testers:
-            tester.data.x = event.x # pack x value to go
-            tester.data.event = event
-            tester.call_listener_if_hit(event.y)
+        track = get_track(event.y)
+        if track == None or track.id == len(current_sequence().tracks) - 1: # hidden track is not displayed
+            return
+
+        data = utils.EmptyClass()
+        data.track = track.id
+        data.x = event.x
+        data.event = event
+        self.track_hit(data)
 
     def track_hit(self, data):
         """
@@ -30,6 +30,7 @@ from dbus.mainloop.glib import DBusGMainLoop
 import mlt
 import md5
 import locale
+import multiprocessing
 import os
 from os import listdir
 from os.path import isfile, join
@@ -46,11 +47,13 @@ import dialogutils
 import editorstate
 import editorpersistance
 import guiutils
+import headlessrender
 import mltenv
 import mltprofiles
 import mlttransitions
 import mltfilters
 import persistance
+import projectreader
 import respaths
 import renderconsumer
 import translations
@@ -63,6 +66,8 @@ PROJECTS_DIR = "batchrender/projects/"
 
 PID_FILE = "batchrenderingpid"
 
+PROGRESS_UPDATE_INTERVAL = 0.33 # seconds
+
 WINDOW_WIDTH = 800
 QUEUE_HEIGHT = 400
 
@@ -71,10 +76,10 @@ RENDERING = 1
 RENDERED = 2
 UNQUEUED = 3
 ABORTED = 4
+FAILED = 5
 
 render_queue = []
 batch_window = None
-render_thread = None
 queue_runner_thread = None
 
 timeout_id = None
@@ -82,106 +87,144 @@ timeout_id = None
 _dbus_service = None
 
 # -------------------------------------------------------- render thread
+class BatchRenderJob:
+    """
+    Headless render process rendering a single queue item.
+    """
+    def __init__(self, render_item, threads, done_event):
+        self.render_item = render_item
+        self.threads = threads
+        self.done_event = done_event # set when process exits so that runner does not need to wait for next update
+        self.process = None
+        self.fraction = 0.0
+        self.reader_thread = None
+
+    def start(self):
+        FNULL = open(os.devnull, 'w')
+        item_path = get_datafiles_dir() + self.render_item.generate_identifier() + ".renderitem"
+        self.process = subprocess.Popen([sys.executable, respaths.LAUNCH_DIR + "flowbladerender",
+                                         "--threads", str(self.threads), item_path],
+                                         stdin=FNULL, stdout=subprocess.PIPE, stderr=FNULL)
+        self.reader_thread = threading.Thread(target=self._read_progress)
+        self.reader_thread.daemon = True
+        self.reader_thread.start()
+
+    def _read_progress(self):
+        for line in iter(self.process.stdout.readline, ""):
+            if line.startswith(headlessrender.PROGRESS_LINE):
+                try:
+                    self.fraction = float(line[len(headlessrender.PROGRESS_LINE):])
+                except ValueError:
+                    pass
+        # stdout closes when process exits, this thread is the only one waiting for process
+        self.process.wait()
+        self.done_event.set()
+
+    def is_running(self):
+        return self.reader_thread.is_alive()
+
+    def succeeded(self):
+        return self.process.returncode == 0
+
+    def abort(self):
+        if self.is_running():
+            self.process.terminate()
+            self.reader_thread.join()
+
+
 class QueueRunnerThread(threading.Thread):
+    """
+    Renders queued items in worker processes, number of simultaneous renders is read
+    from preferences every update so that it can be changed while rendering.
+    """
     def __init__(self):
         threading.Thread.__init__(self)
-    
+        self.running_jobs = []
+        self.jobs_lock = threading.Lock()
+        self.job_done_event = threading.Event()
+        self.aborted = False
+
     def run(self):        
-        self.running = True
-        items = 0
         global render_queue, batch_window
-        for render_item in render_queue.queue:
-            if self.running == False:
+        items = 0
+        waiting_items = [render_item for render_item in render_queue.queue if render_item.render_this_item == True]
+        items_count = len(waiting_items)
+        start_time = time.time()
+
+        while (len(waiting_items) > 0 or len(self.running_jobs) > 0) and self.aborted == False:
+            # Cleared before jobs are checked so that a job finishing after check is not missed by wait below
+            self.job_done_event.clear()
+            self.jobs_lock.acquire()
+            if self.aborted == True:
+                self.jobs_lock.release()
                 break
-            if render_item.render_this_item == False:
-                continue
-            
-            current_render_time = 0
-
-            # Create render objects
-            identifier = render_item.generate_identifier()
-            project_file_path = get_projects_dir() + identifier + ".flb"
-            persistance.show_messages = False
-
-            project = persistance.load_project(project_file_path, False)
-
-            producer = project.c_seq.tractor
-            consumer = renderconsumer.get_mlt_render_consumer(render_item.render_path, 
-                                                              project.profile,
-                                                              render_item.args_vals_list)
-
-            # Get render range
-            start_frame, end_frame, wait_for_stop_render = get_render_range(render_item)
-            
-            # Create and launch render thread
-            global render_thread 
-            render_thread = renderconsumer.FileRenderPlayer(None, producer, consumer, start_frame, end_frame) # None == file name not needed this time when using FileRenderPlayer because callsite keeps track of things
-            render_thread.wait_for_producer_end_stop = wait_for_stop_render
-            render_thread.start()
-
-            # Set render start time and item state
-            render_item.render_started()
 
+            # Finished and crashed jobs
+            for job in list(self.running_jobs):
+                if not job.is_running():
+                    self.running_jobs.remove(job)
+                    if job.succeeded():
+                        job.render_item.render_completed()
+                    else:
+                        print "Render worker failed for item " + job.render_item.get_display_name()
+                        job.render_item.render_failed()
+                    items = items + 1
+
+            # Launch new jobs within jobs budget
+            jobs_count = get_render_jobs_count()
+            while len(waiting_items) > 0 and len(self.running_jobs) < jobs_count:
+                render_item = waiting_items.pop(0)
+                job = BatchRenderJob(render_item, get_threads_per_job(jobs_count), self.job_done_event)
+                job.start()
+                render_item.render_started()
+                self.running_jobs.append(job)
+
+            for job in self.running_jobs:
+                job.render_item.render_fraction = job.fraction
+            running_names = [job.render_item.get_display_name() for job in self.running_jobs]
+            running_fraction = sum([job.fraction for job in self.running_jobs])
+            self.jobs_lock.release()
+
+            fraction = (float(items) + running_fraction) / float(max(items_count, 1))
             gtk.gdk.threads_enter()
-            batch_window.update_queue_view()
-            batch_window.current_render.set_text("  " + render_item.get_display_name())
+            batch_window.update_render_progress(fraction, items, running_names, time.time() - start_time)
+            batch_window.queue_view.update_status_cells(render_queue)
             gtk.gdk.threads_leave()
 
-            # Make sure that render thread is actually running before
-            # testing render_thread.running value later
-            while render_thread.has_started_running == False:
-                time.sleep(0.05)
-
-            # View update loop
-            self.thread_running = True
-            self.aborted = False
-            while self.thread_running:
-                if self.aborted == True:
-                    break        
-                render_fraction = render_thread.get_render_fraction()
-                now = time.time()
-                current_render_time = now - render_item.start_time
-                
-                gtk.gdk.threads_enter()
-                batch_window.update_render_progress(render_fraction, items, render_item.get_display_name(), current_render_time)
-                gtk.gdk.threads_leave()
-                
-                if render_thread.running == False: # Rendering has reached end
-                    self.thread_running = False
-                    
-                    gtk.gdk.threads_enter()
-                    batch_window.render_progress_bar.set_fraction(1.0)
-                    gtk.gdk.threads_leave()
-                                    
-                    render_item.render_completed()
-                else:
-                    time.sleep(0.33)
-                    
-            if not self.aborted:
-                items = items + 1
-                gtk.gdk.threads_enter()
-                batch_window.update_render_progress(0, items, render_item.get_display_name(), 0)
-                gtk.gdk.threads_leave()
-            else:
-                if render_item != None:
-                    render_item.render_aborted()
-                    break
-            render_thread.shutdown()
-        
+            # Exiting render process wakes runner up to start next item immediately
+            self.job_done_event.wait(PROGRESS_UPDATE_INTERVAL)
+
         # Update view for render end
         gtk.gdk.threads_enter()
         batch_window.reload_queue() # item may havee added to queue while rendering
         batch_window.render_queue_stopped()
         gtk.gdk.threads_leave()
-                    
+
     def abort(self):
-        render_thread.shutdown()
-        # It may be that 'aborted' and 'running' could combined into single flag, but whatevaar
+        self.jobs_lock.acquire()
         self.aborted = True
-        self.running = False
-        self.thread_running = False
-        
-        batch_window.reload_queue() # item may havee added to queue while rendering
+        for job in self.running_jobs:
+            job.abort()
+            job.render_item.render_aborted()
+        self.running_jobs = []
+        self.jobs_lock.release()
+
+
+def get_render_jobs_count():
+    jobs = editorpersistance.prefs.batch_render_jobs
+    if jobs == editorpersistance.BATCH_RENDER_JOBS_AUTO:
+        try:
+            jobs = max(1, min(multiprocessing.cpu_count() / 2, editorpersistance.BATCH_RENDER_JOBS_MAX))
+        except NotImplementedError:
+            jobs = 1
+    return jobs
+
+def get_threads_per_job(jobs_count):
+    # Encoder threads are divided between jobs so that simultaneous renders do not exceed processor count
+    try:
+        return max(1, multiprocessing.cpu_count() / jobs_count)
+    except NotImplementedError:
+        return 1
 
 
 class BatchRenderDBUSService(dbus.service.Object):
@@ -301,6 +344,32 @@ def main(root_path, force_launch=False):
     can_run = True
     init_dirs_if_needed()
 
+    _init_app_modules(root_path)
+
+    # Init gtk threads
+    gtk.gdk.threads_init()
+    gtk.gdk.threads_enter()
+
+    global render_queue
+    render_queue = RenderQueue()
+    render_queue.load_render_items()
+
+    global batch_window
+    batch_window = BatchRenderWindow()
+
+    if render_queue.error_status != None:
+        primary_txt = _("Error loading render queue items!")
+        secondary_txt = _("Message:\n") + render_queue.get_error_status_message()
+        dialogutils.warning_message(primary_txt, secondary_txt, batch_window.window)
+
+    DBusGMainLoop(set_as_default=True)
+    global _dbus_service
+    _dbus_service = BatchRenderDBUSService()
+
+    gtk.main()
+    gtk.gdk.threads_leave()
+
+def _init_app_modules(root_path):
     editorstate.gtk_version = gtk.gtk_version
     try:
         editorstate.mlt_version = mlt.LIBMLT_VERSION
@@ -318,10 +387,6 @@ def main(root_path, force_launch=False):
     # Load editor prefs and list of recent projects
     editorpersistance.load()
 
-    # Init gtk threads
-    gtk.gdk.threads_init()
-    gtk.gdk.threads_enter()
-
     repo = mlt.Factory().init()
 
     # Set numeric locale to use "." as radix, MLT initilizes this to OS locale and this causes bugs 
@@ -338,25 +403,6 @@ def main(root_path, force_launch=False):
     # Create list of available mlt profiles
     mltprofiles.load_profile_list()
 
-    global render_queue
-    render_queue = RenderQueue()
-    render_queue.load_render_items()
-
-    global batch_window
-    batch_window = BatchRenderWindow()
-
-    if render_queue.error_status != None:
-        primary_txt = _("Error loading render queue items!")
-        secondary_txt = _("Message:\n") + render_queue.get_error_status_message()
-        dialogutils.warning_message(primary_txt, secondary_txt, batch_window.window)
-
-    DBusGMainLoop(set_as_default=True)
-    global _dbus_service
-    _dbus_service = BatchRenderDBUSService()
-
-    gtk.main()
-    gtk.gdk.threads_leave()
-
 def _show_single_instance_info():
     global timeout_id
     timeout_id = gobject.timeout_add(200, _display_single_instance_window)
@@ -425,7 +471,8 @@ class RenderQueue:
                     self.error_status = []
                 self.error_status.append((data_file_name,  _(" datafile load failed with ") + str(e)))
             try:
-                render_file = open(render_item.get_project_filepath())
+                # Reads only project metadata and rendered sequence without creating MLT objects
+                projectreader.read_sequence(render_item.get_project_filepath())
             except Exception as e:
                 if self.error_status == None:
                     self.error_status = []
@@ -475,6 +522,18 @@ class RenderQueue:
         
         return same_paths
 
+    def check_for_missing_media(self):
+        missing_media = {}
+        for render_item in self.queue:
+            if render_item.status != IN_QUEUE or render_item.render_this_item == False:
+                continue
+            seq = projectreader.read_sequence(render_item.get_project_filepath())
+            missing_paths = projectreader.get_missing_media_paths(projectreader.get_sequence_media_paths(seq))
+            if len(missing_paths) > 0:
+                missing_media[render_item.get_display_name()] = missing_paths
+        
+        return missing_media
+
         
 class BatchRenderItemData:
     def __init__(self, project_name, sequence_name, render_path, sequence_index, \
@@ -520,6 +579,7 @@ class BatchRenderItemData:
     def render_started(self):
         self.status = RENDERING 
         self.start_time = time.time() 
+        self.render_fraction = 0.0
         
     def render_completed(self):
         self.status = RENDERED
@@ -533,19 +593,23 @@ class BatchRenderItemData:
         self.render_time = -1
         self.save()
 
-        global queue_runner_thread, render_thread
-        render_thread = None
-        queue_runner_thread = None      
+    def render_failed(self):
+        self.status = FAILED
+        self.render_this_item = False
+        self.render_time = -1
+        self.save()
 
     def get_status_string(self):
         if self.status == IN_QUEUE:
             return _("Queued")
         elif self.status == RENDERING:
-            return _("Rendering")
+            return _("Rendering") + " " + str(int(self.render_fraction * 100)) + " %"
         elif self.status == RENDERED:
             return _("Finished")
         elif self.status == UNQUEUED:
             return _("Unqueued")
+        elif self.status == FAILED:
+            return _("Failed")
         else:
             return _("Aborted")
 
@@ -601,9 +665,11 @@ class BatchRenderWindow:
 
         self.est_time_left = gtk.Label()
         self.current_render = gtk.Label()
+        self.current_render.set_ellipsize(pango.ELLIPSIZE_END)
+        self.current_render.set_size_request(WINDOW_WIDTH - 300, -1)
         self.current_render_time = gtk.Label()
         est_r = guiutils.get_right_justified_box([guiutils.bold_label(_("Estimated Left:"))])
-        current_r = guiutils.get_right_justified_box([guiutils.bold_label(_("Current Render:"))])
+        current_r = guiutils.get_right_justified_box([guiutils.bold_label(_("Current Renders:"))])
         current_r_t = guiutils.get_right_justified_box([guiutils.bold_label(_("Elapsed:"))])
         est_r.set_size_request(250, 20)
         current_r.set_size_request(250, 20)
@@ -614,6 +680,16 @@ class BatchRenderWindow:
         info_vbox.pack_start(guiutils.get_left_justified_box([current_r_t, self.current_render_time]), False, False, 0)
         info_vbox.pack_start(guiutils.get_left_justified_box([est_r, self.est_time_left]), False, False, 0)
         
+        self.jobs_select = gtk.combo_box_new_text()
+        self.jobs_select.append_text(_("Automatic"))
+        for i in range(1, editorpersistance.BATCH_RENDER_JOBS_MAX + 1):
+            self.jobs_select.append_text(str(i))
+        self.jobs_select.set_active(editorpersistance.prefs.batch_render_jobs)
+        self.jobs_select.connect("changed", lambda w: self.jobs_count_changed(w.get_active()))
+        jobs_r = guiutils.get_right_justified_box([guiutils.bold_label(_("Simultaneous Renders:"))])
+        jobs_r.set_size_request(250, 20)
+        info_vbox.pack_start(guiutils.get_left_justified_box([jobs_r, self.jobs_select]), False, False, 0)
+
         self.items_rendered = gtk.Label()
         items_r = gtk.Label(_("Items Rendered:"))
         self.render_started_label = gtk.Label()
@@ -755,6 +831,17 @@ class BatchRenderWindow:
             dialogutils.warning_message(primary_txt, secondary_txt, batch_window.window)
             return
 
+        missing_media = render_queue.check_for_missing_media()
+        if len(missing_media) > 0:
+            primary_txt = _("Media files used by queued items not found!")
+            
+            secondary_txt = _("Items with missing media cannot be rendered.\n") + \
+                            _("Relink media with Media Re-linker or unqueue items:\n\n")
+            for k,v in missing_media.iteritems():
+                secondary_txt = secondary_txt + str(k) + _(" missing ") + str(len(v)) + _(" files, first: ") + str(v[0]) + "\n"
+            dialogutils.warning_message(primary_txt, secondary_txt, batch_window.window)
+            return
+
         # GUI pattern for rendering
         self.render_button.set_sensitive(False)
         self.reload_button.set_sensitive(False)
@@ -771,7 +858,11 @@ class BatchRenderWindow:
         queue_runner_thread = QueueRunnerThread()
         queue_runner_thread.start()
 
-    def update_render_progress(self, fraction, items, current_name, current_render_time_passed):
+    def jobs_count_changed(self, jobs_index):
+        editorpersistance.prefs.batch_render_jobs = jobs_index # 0 is auto, other indexes are jobs count
+        editorpersistance.save()
+
+    def update_render_progress(self, fraction, items, current_names, current_render_time_passed):
         self.render_progress_bar.set_fraction(fraction)
 
         progress_str = str(int(fraction * 100)) + " %"
@@ -792,6 +883,7 @@ class BatchRenderWindow:
         self.current_render_time.set_text(current_str)
         
         self.items_rendered.set_text("  " + str(items))
+        self.current_render.set_text("  " + ", ".join(current_names))
 
     def abort_render(self):
         global queue_runner_thread
@@ -807,8 +899,7 @@ class BatchRenderWindow:
         self.remove_selected.set_sensitive(True)
         self.remove_finished.set_sensitive(True)
 
-        global queue_runner_thread, render_thread
-        render_thread = None
+        global queue_runner_thread
         queue_runner_thread = None        
 
 
@@ -930,6 +1021,11 @@ class RenderQueueView(gtk.VBox):
             if file_name != None:
                 copy_project(render_item, file_name)
 
+    def update_status_cells(self, render_queue):
+        # Status column is updated in place to keep selection while rendering
+        for i in range(0, min(len(render_queue.queue), len(self.storemodel))):
+            self.storemodel[i][2] = render_queue.queue[i].get_status_string()
+
     def fill_data_model(self, render_queue):
         self.storemodel.clear()        
         
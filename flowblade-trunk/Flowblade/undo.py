@@ -26,6 +26,7 @@ import editorstate
 
 set_post_undo_redo_edit_mode = None # This is set at startup to avoid circular imports
 repaint_tline = None
+edit_done_listener = None # Called with EditAction after it is done, undone or redone. This is set at startup.
 
 # Max stack size
 MAX_UNDOS = 35
@@ -75,6 +76,8 @@ def register_edit(undo_edit):
     # Add to stack and grow index
     undo_stack.append(undo_edit);
     index = index + 1
+
+    _edit_done(undo_edit)
     
     save_item.set_sensitive(True) # Disabled at load and save, first edit enables
     undo_item.set_sensitive(True)
@@ -107,6 +110,7 @@ def do_undo():
     index = index - 1
     undo_edit = undo_stack[index]
     undo_edit.undo()
+    _edit_done(undo_edit)
     
     if index == 0:
         undo_item.set_sensitive(False)
@@ -133,12 +137,17 @@ def do_redo():
     redo_edit = undo_stack[index]
     redo_edit.redo()
     index = index + 1
+    _edit_done(redo_edit)
 
     if index == len(undo_stack):
         redo_item.set_sensitive(False)
 
     undo_item.set_sensitive(True)
 
+def _edit_done(edit_action):
+    if edit_done_listener != None:
+        edit_done_listener(edit_action)
+
 def _set_post_edit_mode():
     if editorstate.edit_mode != editorstate.INSERT_MOVE:
         set_post_undo_redo_edit_mode()
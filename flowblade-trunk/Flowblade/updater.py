@@ -143,9 +143,30 @@ def repaint_tline():
     """
     Repaints timeline canvas and scale
     """
+    gui.tline_canvas.invalidate_background()
     gui.tline_canvas.widget.queue_draw()
     gui.tline_scale.widget.queue_draw()
 
+def repaint_tline_damage(damage):
+    """
+    Repaints timeline canvas areas changed by an edit.
+    damage is dict track id -> first changed frame, or None if all of timeline
+    needs to be repainted.
+    """
+    if damage == None:
+        repaint_tline()
+        return
+
+    gui.tline_canvas.add_damage(damage)
+    gui.tline_scale.widget.queue_draw()
+
+def repaint_tline_overlay():
+    """
+    Repaints timeline canvas edit mode overlay on top of cached clips display.
+    Used when only edit mode data has changed.
+    """
+    gui.tline_canvas.widget.queue_draw()
+
 # --- SCROLL AND LENGTH EVENTS
 def update_tline_scrollbar():
     """
@@ -488,7 +509,7 @@ def update_frame_displayers(frame):
     gui.pos_bar.set_normalized_pos(norm_pos)
 
     gui.tline_scale.widget.queue_draw()
-    gui.tline_canvas.widget.queue_draw()
+    gui.tline_canvas.queue_playhead_draw()
     gui.big_tc.widget.queue_draw()
     clipeffectseditor.display_kfeditors_tline_frame(frame)
     compositeeditor.display_kfeditors_tline_frame(frame)
@@ -268,13 +268,6 @@ def hex_to_rgb(value):
 def int_to_hex(n):
     return hex(n)[2:]
 
-def gdk_color_str_to_mlt_color_str(gdk_color_str):
-    raw_r, raw_g, raw_b = hex_to_rgb(gdk_color_str)
-    val_str = "#" + int_to_hex(int((float(raw_r) * 255.0) / 65535.0)) + \
-                    int_to_hex(int((float(raw_g) * 255.0) / 65535.0)) + \
-                    int_to_hex(int((float(raw_b) * 255.0) / 65535.0))
-    return val_str
-
 def gdk_color_str_to_int(gdk_color_str):
     # returned int is 32-bit RGBA, alpha is 00 
     raw_r, raw_g, raw_b = hex_to_rgb(gdk_color_str)
@@ -0,0 +1,219 @@
+"""
+    Flowblade Movie Editor is a nonlinear video editor.
+    Copyright 2012 Janne Liljeblad.
+
+    This file is part of Flowblade Movie Editor <http://code.google.com/p/flowblade>.
+
+    Flowblade Movie Editor is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    Flowblade Movie Editor is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with Flowblade Movie Editor.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+"""
+Module handles writing and reading multi-resolution audio level files.
+
+Audio levels for a media file are saved as a pyramid of min/max/RMS values at
+several decimation levels for each audio channel. Level 0 has one bucket per frame
+and each following level combines PYRAMID_FACTOR buckets of the level below into one.
+
+File layout, all values little-endian:
+
+    header:       magic (4s), version (H), level count (H), frame count (I), channel count (H)
+    level table:  decimation (I), bucket count (I), data offset (I) for each level
+    data:         min (H), max (H), rms (H) for each channel of each bucket of each level
+
+Level values are in range 0.0 - 1.0 and are saved scaled to range 0 - 65535.
+
+Files are memory-mapped when opened so that timeline drawing only touches
+pages for buckets that are actually displayed.
+"""
+
+import math
+import mmap
+import os
+import struct
+
+MAGIC = "FBWP"
+VERSION = 2
+
+PYRAMID_FACTOR = 4 # buckets of level n combined into one bucket of level n + 1
+MAX_LEVELS = 8
+
+_HEADER_FORMAT = "<4sHHIH"
+_LEVEL_FORMAT = "<III"
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+_LEVEL_SIZE = struct.calcsize(_LEVEL_FORMAT)
+_BUCKET_SIZE = struct.calcsize("<HHH")
+
+_SCALE = 65535.0
+
+
+class PyramidFormatError(Exception):
+    pass
+
+
+# --------------------------------------------------- writing
+def write_pyramid(file_path, channel_values):
+    """
+    Writes pyramid file for list of channels with a list of per frame values for each channel.
+    Values can be floats or (peak, rms) tuples.
+    """
+    channels_levels = [build_levels(frame_values) for frame_values in channel_values]
+    channel_count = len(channels_levels)
+    frame_count = len(channel_values[0])
+    level_count = len(channels_levels[0])
+    bucket_size = _BUCKET_SIZE * channel_count
+
+    offset = _HEADER_SIZE + level_count * _LEVEL_SIZE
+    table = []
+    for decimation, buckets in channels_levels[0]:
+        table.append(struct.pack(_LEVEL_FORMAT, decimation, len(buckets), offset))
+        offset += len(buckets) * bucket_size
+
+    # Write to temp file and rename so that readers never see partial files
+    temp_path = file_path + ".part"
+    f = open(temp_path, "wb")
+    f.write(struct.pack(_HEADER_FORMAT, MAGIC, VERSION, level_count, frame_count, channel_count))
+    f.write("".join(table))
+    for i in range(0, level_count):
+        values = []
+        channels_buckets = [levels[i][1] for levels in channels_levels]
+        for b in range(0, len(channels_buckets[0])):
+            for buckets in channels_buckets:
+                values.extend(buckets[b])
+        f.write(struct.pack("<%dH" % len(values), *[_to_short(v) for v in values]))
+    f.close()
+    os.rename(temp_path, file_path)
+
+def build_levels(frame_values):
+    """
+    Returns list of (decimation, buckets) tuples where buckets is list of (min, max, rms) tuples.
+    """
+    base = []
+    for value in frame_values:
+        if isinstance(value, tuple):
+            peak, rms = value
+        else:
+            peak = rms = value
+        base.append((peak, peak, rms))
+
+    levels = [(1, base)]
+    decimation = 1
+    buckets = base
+    while len(buckets) > 1 and len(levels) < MAX_LEVELS:
+        decimation = decimation * PYRAMID_FACTOR
+        buckets = _decimate(buckets)
+        levels.append((decimation, buckets))
+
+    return levels
+
+def _decimate(buckets):
+    decimated = []
+    for i in range(0, len(buckets), PYRAMID_FACTOR):
+        children = buckets[i:i + PYRAMID_FACTOR]
+        b_min = min([child[0] for child in children])
+        b_max = max([child[1] for child in children])
+        square_sum = sum([child[2] * child[2] for child in children])
+        b_rms = math.sqrt(square_sum / float(len(children)))
+        decimated.append((b_min, b_max, b_rms))
+    return decimated
+
+def _to_short(value):
+    value = int(value * _SCALE + 0.5)
+    if value < 0:
+        return 0
+    if value > 65535:
+        return 65535
+    return value
+
+
+# --------------------------------------------------- reading
+class PyramidLevel:
+    def __init__(self, decimation, bucket_count, data_offset):
+        self.decimation = decimation
+        self.bucket_count = bucket_count
+        self.data_offset = data_offset
+
+
+class WaveformPyramid:
+    """
+    Memory-mapped read access to pyramid file.
+    """
+    def __init__(self, file_path):
+        f = open(file_path, "rb")
+        try:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+
+        if len(self.data) < _HEADER_SIZE:
+            raise PyramidFormatError("File too short: " + file_path)
+        magic, version, level_count, self.frame_count, self.channels = struct.unpack_from(_HEADER_FORMAT, self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise PyramidFormatError("Not a supported waveform pyramid file: " + file_path)
+
+        self.levels = []
+        for i in range(0, level_count):
+            decimation, bucket_count, data_offset = struct.unpack_from(_LEVEL_FORMAT, self.data, _HEADER_SIZE + i * _LEVEL_SIZE)
+            self.levels.append(PyramidLevel(decimation, bucket_count, data_offset))
+
+    def get_level(self, min_frames_per_bucket):
+        """
+        Returns level with smallest decimation that is at least min_frames_per_bucket
+        or the most decimated level if none is.
+        """
+        for level in self.levels:
+            if level.decimation >= min_frames_per_bucket:
+                return level
+        return self.levels[-1]
+
+    def get_buckets(self, level, first, last, channel=0):
+        """
+        Returns list of (min, max, rms) tuples of channel for buckets in range first - last, last exclusive.
+        """
+        values = self._get_values(level, first, last)
+        buckets = []
+        for i in range(channel * 3, len(values), self.channels * 3):
+            buckets.append((values[i] / _SCALE, values[i + 1] / _SCALE, values[i + 2] / _SCALE))
+        return buckets
+
+    def get_peaks(self, level, first, last):
+        """
+        Returns list of max values of all channels for buckets in range first - last, last exclusive.
+        """
+        values = self._get_values(level, first, last)
+        if self.channels == 1:
+            return [v / _SCALE for v in values[1::3]]
+
+        stride = self.channels * 3
+        peaks = []
+        for i in range(0, len(values), stride):
+            peaks.append(max(values[i + 1:i + stride:3]) / _SCALE)
+        return peaks
+
+    def _get_values(self, level, first, last):
+        first, last = self._clamp_range(level, first, last)
+        count = (last - first) * self.channels
+        if count <= 0:
+            return ()
+        offset = level.data_offset + first * _BUCKET_SIZE * self.channels
+        return struct.unpack_from("<%dH" % (count * 3), self.data, offset)
+
+    def _clamp_range(self, level, first, last):
+        if first < 0:
+            first = 0
+        if last > level.bucket_count:
+            last = level.bucket_count
+        return (first, last)
+
+    def close(self):
+        self.data.close()